@@ -7,6 +7,8 @@ from typing import Callable, Optional, Dict
 
 import shioaji as sj
 
+from strategy.core.contracts import contract_spec
+
 log = logging.getLogger("ShioajiBroker")
 ORDER_LOGGER = logging.getLogger("OrderExec")
 
@@ -69,11 +71,12 @@ class ShioajiBroker:
         key = f"{symbol}:{code or 'nearest'}"
         if key in self._contracts_cache:
             return self._contracts_cache[key]
-        cbook = getattr(self.api.Contracts.Futures, symbol)
+        root = contract_spec(symbol).root
+        cbook = getattr(self.api.Contracts.Futures, root)
         if code:
             c = cbook[code]
         else:
-            keys = sorted([k for k in dir(cbook) if k.startswith(symbol)])
+            keys = sorted([k for k in dir(cbook) if k.startswith(root)])
             if not keys:
                 raise RuntimeError(f"No contract for {symbol}")
             c = cbook[keys[0]]
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+回測績效指標（批次）：多條 equity 曲線排成 2-D 陣列（runs × time，共用 ts 格點），一次算完所有 run 的指標；
+交易指標以 run 編號 + bincount 分組，不逐 run 建 DataFrame。BacktestEngine.results() / summarize 只是 R=1 的包裝。
+ts 一律為 int64 epoch ns（台北當地 naive，與 EquityRecorder 相同）。
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+_NS_PER_DAY = 86400 * 1_000_000_000
+_ANN = np.sqrt(252)
+
+def align(curves: Sequence[Tuple[np.ndarray, np.ndarray]], start_cash) -> Tuple[np.ndarray, np.ndarray]:
+    """各 run 的 (ts, equity) → 聯集格點上的 (ts, E[runs, time])；格點上沒有紀錄就沿用前值，第一筆之前 = start_cash。"""
+    cash = np.broadcast_to(np.asarray(start_cash, dtype="f8"), (len(curves),))
+    grid = np.unique(np.concatenate([np.asarray(t, dtype="i8") for t, _ in curves])) if curves else np.zeros(0, "i8")
+    E = np.empty((len(curves), len(grid)), dtype="f8")
+    for r, (t, e) in enumerate(curves):
+        idx = np.searchsorted(np.asarray(t, dtype="i8"), grid, side="right") - 1
+        E[r] = np.where(idx >= 0, np.asarray(e, dtype="f8")[np.maximum(idx, 0)], cash[r])
+    return grid, E
+
+def daily_returns(ts: np.ndarray, E: np.ndarray) -> np.ndarray:
+    """每個日曆日最後一筆 equity 的日報酬（與 resample("1D").last().dropna().pct_change() 相同）→ [runs, days-1]。"""
+    if E.shape[1] == 0:
+        return np.zeros((E.shape[0], 0))
+    day = ts // _NS_PER_DAY
+    last = np.r_[np.flatnonzero(day[1:] != day[:-1]), len(day) - 1]
+    d = E[:, last]
+    return d[:, 1:] / d[:, :-1] - 1.0
+
+def curve_metrics(ts: np.ndarray, E: np.ndarray, start_cash) -> Dict[str, np.ndarray]:
+    """
+    equity 曲線指標（每個 run 一個值）：
+    end_equity / total_return、sharpe_daily / sortino_daily（年化 √252）、
+    max_drawdown（最深回撤比例，負值）與 max_dd_days（離前高最久的日曆天數）。
+    """
+    ts = np.asarray(ts, dtype="i8")
+    E = np.atleast_2d(np.asarray(E, dtype="f8"))
+    R, T = E.shape
+    cash = np.broadcast_to(np.asarray(start_cash, dtype="f8"), (R,))
+    out = {"end_equity": cash.copy(), "total_return": np.zeros(R), "sharpe_daily": np.zeros(R),
+           "sortino_daily": np.zeros(R), "max_drawdown": np.zeros(R), "max_dd_days": np.zeros(R)}
+    if T == 0:
+        return out
+    out["end_equity"] = E[:, -1].copy()
+    out["total_return"] = E[:, -1] / cash - 1.0
+
+    r = daily_returns(ts, E)
+    n = r.shape[1]
+    if n:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = r.sum(axis=1) / n
+            std = np.sqrt(((r - mean[:, None]) ** 2).sum(axis=1) / (n - 1))
+            down = np.sqrt((np.minimum(r, 0.0) ** 2).sum(axis=1) / n)
+            out["sharpe_daily"] = mean / (std + 1e-12) * _ANN
+            out["sortino_daily"] = mean / (down + 1e-12) * _ANN
+
+    peak = np.maximum.accumulate(E, axis=1)
+    out["max_drawdown"] = (E / peak - 1.0).min(axis=1)
+    # 回撤期間：每個時點距「最近一次創高」的時間，取最大
+    last_peak = np.maximum.accumulate(np.where(E >= peak, np.arange(T), 0), axis=1)
+    out["max_dd_days"] = (ts[None, :] - ts[last_peak]).max(axis=1) / _NS_PER_DAY
+    return out
+
+def trade_metrics(run: np.ndarray, pnl: np.ndarray, entry_ns: np.ndarray, exit_ns: np.ndarray, n_runs: int,
+                  span: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+    """
+    交易指標（run = 每筆交易所屬的 run 編號）：num_trades、win_rate、avg_trade_pnl、total_trade_pnl、
+    profit_factor（總獲利 / 總虧損；無虧損時為 inf，無交易為 0）、
+    exposure（持倉時間聯集 / span；span = 每個 run 的 (起, 迄) ns，未平倉交易算到迄）。
+    """
+    run = np.asarray(run, dtype="i8")
+    pnl = np.asarray(pnl, dtype="f8")
+    cnt = np.bincount(run, minlength=n_runs)
+    total = np.bincount(run, pnl, minlength=n_runs)
+    wins = np.bincount(run, pnl > 0, minlength=n_runs)
+    gp = np.bincount(run, np.maximum(pnl, 0.0), minlength=n_runs)
+    gl = -np.bincount(run, np.minimum(pnl, 0.0), minlength=n_runs)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = {"num_trades": cnt,
+               "win_rate": np.where(cnt > 0, wins / np.maximum(cnt, 1), 0.0),
+               "avg_trade_pnl": np.where(cnt > 0, total / np.maximum(cnt, 1), 0.0),
+               "total_trade_pnl": total,
+               "profit_factor": np.where(gl > 0, gp / gl, np.where(gp > 0, np.inf, 0.0))}
+    out["exposure"] = np.zeros(n_runs)
+    if span is None or not len(run):
+        return out
+
+    # 持倉區間聯集：依 (run, 進場) 排序，各 run 內「之前最晚出場」以位移到互不重疊的秒數做 running max
+    lo, hi = (np.broadcast_to(np.asarray(a, dtype="i8"), (n_runs,)) for a in span)
+    a = np.clip(np.asarray(entry_ns, dtype="i8"), lo[run], hi[run])
+    b = np.clip(np.asarray(exit_ns, dtype="i8"), lo[run], hi[run])
+    width = (hi - lo).astype("f8") / 1e9
+    base = np.r_[0.0, np.cumsum(width + 1.0)[:-1]]
+    fa = (a - lo[run]) / 1e9 + base[run]
+    fb = (b - lo[run]) / 1e9 + base[run]
+    order = np.lexsort((fa, run))
+    fa, fb, rs = fa[order], fb[order], run[order]
+    prev = np.r_[-np.inf, np.maximum.accumulate(fb)[:-1]]
+    held = np.maximum(fb - np.maximum(fa, prev), 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["exposure"] = np.where(width > 0, np.bincount(rs, held, minlength=n_runs) / width, 0.0)
+    return out
+
+def _trade_arrays(trades_df: pd.DataFrame, default_exit: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if not len(trades_df):
+        z = np.zeros(0)
+        return z, z.astype("i8"), z.astype("i8")
+    entry = pd.DatetimeIndex(pd.to_datetime(trades_df["entry_ts"])).as_unit("ns").asi8
+    exit_ = pd.DatetimeIndex(pd.to_datetime(trades_df["exit_ts"])).as_unit("ns")
+    exit_ = np.where(exit_.isna(), default_exit, exit_.asi8)
+    return trades_df["pnl"].to_numpy("f8"), entry, exit_
+
+def summarize_runs(start_cash, curves: Sequence[Tuple[np.ndarray, np.ndarray]],
+                   trades: Sequence[pd.DataFrame]) -> List[Dict[str, float]]:
+    """多個 run 一次算：curves = [(ts ns, equity)]、trades = 各 run 的 trades_df；回傳每個 run 的指標 dict。"""
+    R = len(curves)
+    ts, E = align(curves, start_cash)
+    m = curve_metrics(ts, E, start_cash)
+    # 各 run 的 span 取自己的第一筆 / 最後一筆紀錄（格點聯集會把較短的 run 拉長）
+    lo = np.array([int(t[0]) if len(t) else 0 for t, _ in curves], dtype="i8")
+    hi = np.array([int(t[-1]) if len(t) else 0 for t, _ in curves], dtype="i8")
+    parts = [_trade_arrays(tr, int(hi[r])) for r, tr in enumerate(trades)]
+    run = np.repeat(np.arange(R), [len(p[0]) for p in parts])
+    cat = [np.concatenate([p[k] for p in parts]) if parts else np.zeros(0) for k in range(3)]
+    m.update(trade_metrics(run, cat[0], cat[1], cat[2], R, span=(lo, hi)))
+    cash = np.broadcast_to(np.asarray(start_cash, dtype="f8"), (R,))
+    return [{"start_cash": float(cash[r]), **{k: (int(v[r]) if k == "num_trades" else float(v[r])) for k, v in m.items()}}
+            for r in range(R)]
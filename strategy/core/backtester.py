@@ -1,22 +1,17 @@
-import os
-from dotenv import load_dotenv
-load_dotenv()
-TAX_RATE = float(os.getenv('TAX_RATE','0'))
-FEE_RATE = float(os.getenv('FEE_RATE','0'))
-
 # -*- coding: utf-8 -*-
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import pandas as pd
 import numpy as np
 from strategy.core.events import Bar, Tick, Signal
-from strategy.config import MULTIPLIER, TIMEZONE
-from strategy.core.calendar import is_third_wed_1329
+from strategy.core.analytics import summarize_runs
+from strategy.config import TIMEZONE, BAR_FRAME
+from strategy.core.barbuilder import _ts_ns
+from strategy.core.calendar import get_calendar
+from strategy.core.contracts import contract_spec
+from strategy.core.equity import EquityRecorder
 import pytz
 
-SLIPPAGE = float(os.getenv('SLIPPAGE', '0.0'))
-FEE_PER_CONTRACT = float(os.getenv('FEE_PER_CONTRACT', '0.0'))
-
 @dataclass
 class Position:
     side: int = 0
@@ -36,39 +31,80 @@ class Trade:
     bars_held: int
 
 class BacktestEngine:
-    def __init__(self, start_cash: float = 1_000_000.0):
+    def __init__(self, start_cash: float = 1_000_000.0, equity_resolution: str = "tick",
+                 equity_max_rows: Optional[int] = None, equity_spill_dir: Optional[str] = None):
         self.start_cash = float(start_cash)
         self.equity = self.start_cash
         self.positions: Dict[str, Position] = {}
         self.last_close: Dict[str, float] = {}
         self.trades: List[Trade] = []
-        self.equity_records: List[Dict] = []
+        # equity 曲線：欄式 int64/float64 陣列；resolution = tick / minute / bar / change，可設記憶體上限後 spill 到磁碟
+        self.equity_rec = EquityRecorder(equity_resolution, bar_frame=BAR_FRAME,
+                                         max_rows=equity_max_rows, spill_dir=equity_spill_dir)
         self.open_trade_idx: Dict[str, int] = {}
         self.tz = pytz.timezone(TIMEZONE)
+        self.calendar = get_calendar()
+
+    def __getstate__(self):
+        # 快照不帶交易日曆（全程式共用一份，還原時重取）
+        d = self.__dict__.copy()
+        d.pop("calendar", None)
+        return d
+
+    def __setstate__(self, d):
+        self.__dict__.update(d)
+        self.calendar = get_calendar()
 
     def _mult(self, symbol: str) -> float:
-        for k, v in MULTIPLIER.items():
-            if symbol.startswith(k):
-                return float(v)
-        return 1.0
+        return contract_spec(symbol).multiplier
 
-    def _close_trade(self, sym: str, ts: pd.Timestamp, price: float):
+    def _close_trade(self, sym: str, ts: pd.Timestamp, price: float) -> Optional[float]:
+        """平掉 sym 的未平倉交易；回傳計入 equity 的損益（無未平倉回傳 None）。"""
         if sym not in self.open_trade_idx:
-            return
+            return None
         idx = self.open_trade_idx.pop(sym)
         tr = self.trades[idx]
-        mult = self._mult(sym)
+        spec = contract_spec(sym)
         sign = 1 if tr.side == "LONG" else -1
-        pnl = (price - tr.entry_price) * sign * tr.qty * mult
-        pnl -= FEE_PER_CONTRACT * tr.qty
+        pnl = (price - tr.entry_price) * sign * tr.qty * spec.multiplier
+        pnl -= spec.close_cost(tr.entry_price, price, tr.qty)
         tr.exit_ts = ts
         tr.exit_price = price
         tr.pnl = pnl
         self.equity += pnl
         self.positions[sym] = Position()
+        return pnl
+
+    def _auto_close(self, sym: str, ts: pd.Timestamp, price: float) -> Optional[float]:
+        pos = self.positions.get(sym, Position())
+        if pos.side != 0:
+            return self._close_trade(sym, ts, price)
+        return None
+
+    def _apply_signal(self, sym: str, ts: pd.Timestamp, price: float, sig: Signal) -> Tuple[bool, Optional[float]]:
+        """依訊號調整部位；回傳 (此次呼叫是否寫 equity 紀錄, 平倉實現損益)。FLAT 訊號不寫紀錄，維持原行為。"""
+        target_side = 1 if sig.side.upper() == "BUY" else -1 if sig.side.upper() == "SELL" else 0
+        qty = int(sig.qty or 1)
+        fill_price = price + (contract_spec(sym).slippage * (1 if target_side>0 else -1 if target_side<0 else 0))
+        cur = self.positions.get(sym, Position())
+        realized = None
+        if cur.side != 0 and target_side != 0 and cur.side != target_side:
+            realized = self._close_trade(sym, ts, fill_price)
+        if target_side == 0:
+            if cur.side != 0:
+                realized = self._close_trade(sym, ts, fill_price)
+            return False, realized
+        if sym in self.open_trade_idx:
+            realized = self._close_trade(sym, ts, fill_price)
+        side_str = "LONG" if target_side == 1 else "SHORT"
+        self.trades.append(Trade(sym, side_str, qty, ts, fill_price, pd.NaT, np.nan, 0.0, 0))
+        self.open_trade_idx[sym] = len(self.trades)-1
+        self.positions[sym] = Position(side=target_side, qty=qty, avg_price=fill_price)
+        return True, realized
 
     def on_tick(self, tick: Tick, signal_from_strategy: Optional[Signal] = None):
         sym = tick.symbol
+        ns = _ts_ns(tick.ts)
         mult = self._mult(sym)
         prev_close = self.last_close.get(sym)
         if prev_close is not None:
@@ -77,32 +113,18 @@ class BacktestEngine:
             self.equity += pos.side * pos.qty * dprice * mult
         self.last_close[sym] = tick.price
 
-        # 自動平倉（每月第三個週三 13:29）
-        if is_third_wed_1329(tick.ts.to_pydatetime() if hasattr(tick.ts, 'to_pydatetime') else tick.ts):
-            pos = self.positions.get(sym, Position())
-            if pos.side != 0:
-                self._close_trade(sym, tick.ts, tick.price)
+        # 自動平倉（結算日 13:29；日曆預先算好，查表即可）
+        changed = False
+        if self.calendar.is_auto_close(ns):
+            changed = self._auto_close(sym, pd.Timestamp(ns), tick.price) is not None
 
         sig = signal_from_strategy
         if sig:
-            target_side = 1 if sig.side.upper() == "BUY" else -1 if sig.side.upper() == "SELL" else 0
-            qty = int(sig.qty or 1)
-            fill_price = tick.price + (SLIPPAGE * (1 if target_side>0 else -1 if target_side<0 else 0))
-            cur = self.positions.get(sym, Position())
-            if cur.side != 0 and target_side != 0 and cur.side != target_side:
-                self._close_trade(sym, tick.ts, fill_price)
-            if target_side == 0:
-                if cur.side != 0:
-                    self._close_trade(sym, tick.ts, fill_price)
+            if not self._apply_signal(sym, pd.Timestamp(ns), tick.price, sig)[0]:
                 return
-            if sym in self.open_trade_idx:
-                self._close_trade(sym, tick.ts, fill_price)
-            side_str = "LONG" if target_side == 1 else "SHORT"
-            self.trades.append(Trade(sym, side_str, qty, tick.ts, fill_price, pd.NaT, np.nan, 0.0, 0))
-            self.open_trade_idx[sym] = len(self.trades)-1
-            self.positions[sym] = Position(side=target_side, qty=qty, avg_price=fill_price)
+            changed = True
 
-        self.equity_records.append({"ts": tick.ts, "equity": self.equity})
+        self.equity_rec.record(ns, self.equity, changed)
 
     def on_bar_signal(self, bar: Bar, signal_from_strategy: Optional[Signal] = None):
         if not signal_from_strategy:
@@ -110,35 +132,23 @@ class BacktestEngine:
         tick_like = Tick(bar.symbol, bar.ts, bar.c, bar.v)
         self.on_tick(tick_like, signal_from_strategy)
 
-    def close_all(self, ts: pd.Timestamp):
+    def close_all(self, ts):
+        ts = pd.Timestamp(ts)
         for sym in list(self.open_trade_idx.keys()):
             last_price = self.last_close.get(sym)
             if last_price is None: continue
             self._close_trade(sym, ts, last_price)
 
     def results(self) -> Dict:
-        eq = pd.DataFrame(self.equity_records).drop_duplicates("ts").set_index("ts").sort_index()
-        eq["ret"] = eq["equity"].pct_change().fillna(0.0)
-        daily = eq["equity"].resample("1D").last().dropna()
-        daily_ret = daily.pct_change().dropna()
-        sharpe = (daily_ret.mean() / (daily_ret.std() + 1e-12)) * np.sqrt(252) if len(daily_ret) else 0.0
-        roll_max = eq["equity"].cummax() if len(eq) else pd.Series(dtype=float)
-        dd = eq["equity"] / roll_max - 1.0 if len(eq) else pd.Series(dtype=float)
-        max_dd = dd.min() if len(dd) else 0.0
-        trades_df = pd.DataFrame([t.__dict__ for t in self.trades])
-        win_rate = float((trades_df["pnl"] > 0).mean()) if len(trades_df) else 0.0
-        avg_pnl = float(trades_df["pnl"].mean()) if len(trades_df) else 0.0
-        total_pnl = float(trades_df["pnl"].sum()) if len(trades_df) else 0.0
-        return {
-            "start_cash": self.start_cash,
-            "end_equity": float(eq["equity"].iloc[-1]) if len(eq) else self.start_cash,
-            "total_return": float(eq["equity"].iloc[-1] / self.start_cash - 1.0) if len(eq) else 0.0,
-            "sharpe_daily": float(sharpe),
-            "max_drawdown": float(max_dd),
-            "num_trades": int(len(trades_df)),
-            "win_rate": float(win_rate),
-            "avg_trade_pnl": float(avg_pnl),
-            "total_trade_pnl": float(total_pnl),
-            "equity_df": eq.reset_index(),
-            "trades_df": trades_df,
-        }
+        return summarize(self.start_cash, self.equity_rec.to_frame(), self.trades)
+
+def summarize(start_cash: float, eq: pd.DataFrame, trades) -> Dict:
+    """由 equity（index=ts, 欄 equity）與交易紀錄（Trade list 或 trades_df）計算回測摘要；
+    指標由 analytics.summarize_runs 計算（單一 run），事件迴圈、向量化引擎與 walk-forward 共用。"""
+    eq["ret"] = eq["equity"].pct_change().fillna(0.0)
+    trades_df = trades if isinstance(trades, pd.DataFrame) else pd.DataFrame([t.__dict__ for t in trades])
+    ts = pd.DatetimeIndex(eq.index).as_unit("ns").asi8
+    res, = summarize_runs(start_cash, [(ts, eq["equity"].to_numpy("f8"))], [trades_df])
+    res["equity_df"] = eq.reset_index()
+    res["trades_df"] = trades_df
+    return res
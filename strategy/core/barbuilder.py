@@ -1,36 +1,306 @@
 # -*- coding: utf-8 -*-
-from collections import defaultdict
-from datetime import datetime
-from typing import Dict, List
-from strategy.core.events import Tick, Bar
+import re
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from strategy.core.events import Tick, Bar, BarBatch
 
-def _floor_key(ts: datetime, frame: str) -> datetime:
-    f = frame.lower()
-    if f in ("1h", "60min", "hour", "1hour"):
-        return ts.replace(minute=0, second=0, microsecond=0)
-    return ts.replace(second=0, microsecond=0)  # 1min
+_NS_PER_MIN = 60 * 1_000_000_000
+_UNIT_NS = {"min": _NS_PER_MIN, "m": _NS_PER_MIN, "h": 60 * _NS_PER_MIN, "hour": 60 * _NS_PER_MIN, "d": 1440 * _NS_PER_MIN}
+_FRAME_RE = re.compile(r"^(\d*)\s*(min|m|hour|h|d)$")
+_ACTIVITY_RE = re.compile(r"^(vol|tick|range):\s*(\d+(?:\.\d+)?)$")
+_NO_BARS: Sequence[Bar] = ()
 
-class BarBuilder:
-    def __init__(self, frame: str = "1min"):
-        self.frame = frame
-        self.state: Dict[str, Dict[datetime, Dict[str, float]]] = defaultdict(dict)
-
-    def on_tick(self, t: Tick):
-        key = _floor_key(t.ts, self.frame)
-        bucket = self.state[t.symbol].get(key)
-        if not bucket:
-            self.state[t.symbol][key] = bucket = {"o": t.price, "h": t.price, "l": t.price, "c": t.price, "v": t.vol}
+def _frame_ns(frame: str) -> int:
+    """'1min' / '5min' / '1H' / '60min' / '1D' → 每根 bar 的 ns 長度。"""
+    m = _FRAME_RE.match(frame.strip().lower().replace("hour", "h"))
+    if not m:
+        raise ValueError(f"不支援的 frame: {frame}")
+    return int(m.group(1) or 1) * _UNIT_NS[m.group(2)]
+
+def _activity_spec(frame: str):
+    """'vol:500'（每 500 口）/ 'tick:100'（每 100 筆）/ 'range:20'（高低差達 20 點）→ (kind, size)；時間 frame 回傳 None。"""
+    m = _ACTIVITY_RE.match(frame.strip().lower())
+    if not m:
+        return None
+    kind, size = m.group(1), float(m.group(2))
+    if size <= 0:
+        raise ValueError(f"activity frame 大小需 > 0: {frame}")
+    return kind, (size if kind == "range" else int(size))
+
+def is_activity_frame(frame: str) -> bool:
+    return _activity_spec(frame) is not None
+
+def _ts_ns(ts) -> int:
+    """Tick 時間 → epoch ns（events 已是 int ns 直接回傳；pd.Timestamp 取 .value）。"""
+    if ts.__class__ is int:
+        return ts
+    v = getattr(ts, "value", None)
+    if v is not None:
+        return v
+    return pd.Timestamp(ts).value
+
+class _OpenBar:
+    """每商品每個 frame 唯一一根「尚未封口」的 bar；原地更新，不為每個 tick 配置新物件。"""
+    __slots__ = ("key", "o", "h", "l", "c", "v", "empty")
+
+    def reset(self, key: int, price: float, vol: int):
+        self.key = key
+        self.o = self.h = self.l = self.c = price
+        self.v = vol
+        self.empty = False
+
+    def merge(self, key: int, b: Bar):
+        """把下一層封口的 bar 併入本層（本層為空時以它開新棒）。"""
+        if self.empty:
+            self.key = key
+            self.o, self.h, self.l, self.c, self.v = b.o, b.h, b.l, b.c, b.v
+            self.empty = False
+            return
+        if b.h > self.h: self.h = b.h
+        if b.l < self.l: self.l = b.l
+        self.c = b.c
+        self.v += b.v
+
+class _ActivityBar:
+    """量 / 筆數 / 區間 bar 的 open bar；key 為第一筆 tick 的 ns，cum 為累計成交量（量 bar 分桶用）。"""
+    __slots__ = ("kind", "size", "key", "o", "h", "l", "c", "v", "n", "cum", "empty")
+
+    def __init__(self, kind: str, size):
+        self.kind, self.size = kind, size
+        self.cum = 0
+        self.empty = True
+
+    def add(self, ns: int, price: float, vol: int) -> bool:
+        """併入一筆 tick；回傳此 tick 後是否封口（封口 bar 包含此 tick）。"""
+        if self.empty:
+            self.key = ns
+            self.o = self.h = self.l = self.c = price
+            self.v, self.n, self.empty = vol, 1, False
         else:
-            bucket["h"] = max(bucket["h"], t.price)
-            bucket["l"] = min(bucket["l"], t.price)
-            bucket["c"] = t.price
-            bucket["v"] += t.vol
+            if price > self.h: self.h = price
+            if price < self.l: self.l = price
+            self.c = price
+            self.v += vol
+            self.n += 1
+        before = self.cum
+        self.cum = before + vol
+        if self.kind == "tick":
+            return self.n >= self.size
+        if self.kind == "vol":
+            return self.cum // self.size > before // self.size
+        return self.h - self.l >= self.size
+
+class BarBuilder:
+    """
+    Tick → K 棒聚合器：
+    - 每商品每個 frame 只保留一根 open bar（__slots__），跨桶判斷只需一次 key 比較
+    - 時間 frames 由小到大階層式 rollup：tick 只更新最小 frame，封口的 bar 再往上併（1min → 5min → 1H）
+    - 活動量 frames（vol:N / tick:N / range:R）直接由 tick 驅動，達門檻的那筆 tick 當下封口
+    - 封口的 bar（帶 frame 標籤）由 on_tick 立即回傳，並留一份在固定長度的 ring（history）
+    - pop_closed_bars 供外部時鐘強制封口時間 frame（無新 tick 時）
+    """
+    def __init__(self, frame: str = "1min", ring_size: int = 256, frames: Optional[Sequence[str]] = None,
+                 on_late: Optional[Callable[[Tick, int], None]] = None):
+        names = list(dict.fromkeys(frames)) if frames else [frame]
+        acts = [f for f in names if is_activity_frame(f)]
+        names = sorted((f for f in names if f not in acts), key=_frame_ns)
+        steps = [_frame_ns(f) for f in names]
+        for lo, hi, a, b in zip(steps, steps[1:], names, names[1:]):
+            if hi % lo:
+                raise ValueError(f"frame {b} 不是 {a} 的整數倍，無法 rollup")
+        self.frames: List[str] = names + acts
+        self.steps: List[int] = steps
+        self.activity = [_activity_spec(f) for f in acts]
+        self.frame = self.frames[0]
+        self.step = steps[0] if steps else 0
+        self.ring_size = int(ring_size)
+        self.open: Dict[str, List[_OpenBar]] = {}
+        self.act: Dict[str, List[_ActivityBar]] = {}
+        self.closed: Dict[str, List[Deque[Bar]]] = {}
+        self.late: Dict[str, int] = {}
+        self.on_late = on_late  # (tick, 已封口 bar 的 key ns)；遲到 tick 不回寫 bar，交由呼叫端處理
+
+    def _init_symbol(self, symbol: str):
+        self.open[symbol] = [_OpenBar() for _ in self.steps]
+        for r in self.open[symbol]:
+            r.empty = True
+            r.key = -1
+        self.act[symbol] = [_ActivityBar(k, n) for k, n in self.activity]
+        self.closed[symbol] = [deque(maxlen=self.ring_size) for _ in self.frames]
+        self.late[symbol] = 0
+
+    def _close(self, symbol: str, level: int, rec) -> Bar:
+        bar = Bar(symbol, rec.key, rec.o, rec.h, rec.l, rec.c, int(rec.v), self.frames[level])
+        self.closed[symbol][level].append(bar)
+        rec.empty = True  # 保留 key，之後同桶的 tick 視為遲到
+        return bar
 
-    def pop_closed_bars(self, symbol: str, now_key: datetime) -> List[Bar]:
+    def _rollup(self, symbol: str, recs: List[_OpenBar], children: List[Bar], now_ns: int, out: List[Bar]):
+        """把下層剛封口的 bar 逐層往上併；上層 bar 早於 child 或 now_ns 所在的桶時先封口。"""
+        for lv in range(1, len(recs)):
+            step = self.steps[lv]
+            rec = recs[lv]
+            up: List[Bar] = []
+            for child in children:
+                ck = child.ts // step * step
+                if not rec.empty and ck > rec.key:
+                    up.append(self._close(symbol, lv, rec))
+                rec.merge(ck, child)
+            if not rec.empty and now_ns // step * step > rec.key:
+                up.append(self._close(symbol, lv, rec))
+            out.extend(up)
+            children = up
+
+    def on_tick(self, t: Tick) -> Sequence[Bar]:
+        """更新 open bar；回傳此 tick 造成封口的 bar（時間 frame 小 → 大，其後為活動量 frame）。"""
+        ns = _ts_ns(t.ts)
+        if t.symbol not in self.closed:
+            self._init_symbol(t.symbol)
+        out = self._on_time_tick(t, ns) if self.steps else _NO_BARS
+        if self.activity:
+            base = len(self.steps)
+            for i, rec in enumerate(self.act[t.symbol]):
+                if rec.add(ns, t.price, t.vol):
+                    if not out:
+                        out = []
+                    elif out.__class__ is tuple:
+                        out = list(out)
+                    out.append(self._close(t.symbol, base + i, rec))
+        return out
+
+    def _on_time_tick(self, t: Tick, ns: int) -> Sequence[Bar]:
+        key = ns // self.step * self.step
+        recs = self.open[t.symbol]
+        rec = recs[0]
+        if key == rec.key and not rec.empty:
+            p = t.price
+            if p > rec.h: rec.h = p
+            if p < rec.l: rec.l = p
+            rec.c = p
+            rec.v += t.vol
+            return _NO_BARS
+        if key <= rec.key:
+            # 亂序 / 遲到 tick：所屬 bar 已封口，計數並通知 on_late，不回寫已交付的 bar
+            self.late[t.symbol] += 1
+            if self.on_late is not None:
+                self.on_late(t, key)
+            return _NO_BARS
+        if rec.empty:
+            # 第一筆 tick，或上一根已由 pop_closed_bars 封口；上層若已跨桶也要補封口
+            rec.reset(key, t.price, t.vol)
+            if len(recs) == 1:
+                return _NO_BARS
+            out: List[Bar] = []
+            self._rollup(t.symbol, recs, [], ns, out)
+            return out
+        bar = self._close(t.symbol, 0, rec)
+        rec.reset(key, t.price, t.vol)
+        if len(recs) == 1:
+            return (bar,)
+        out = [bar]
+        self._rollup(t.symbol, recs, out[:], ns, out)
+        return out
+
+    def pop_closed_bars(self, symbol: str, now_key) -> List[Bar]:
+        """把 symbol 早於 now_key 所在桶的時間 frame open bar 強制封口並回傳（每根 bar 只會交付一次）。"""
+        recs = self.open.get(symbol)
+        if not recs:
+            return []
+        now_ns = _ts_ns(now_key)
+        rec = recs[0]
         out: List[Bar] = []
-        buckets = self.state[symbol]
-        for k in sorted(list(buckets.keys())):
-            if k < now_key:
-                s = buckets.pop(k)
-                out.append(Bar(symbol, k, s["o"], s["h"], s["l"], s["c"], int(s["v"])))
+        if not rec.empty and rec.key < now_ns // self.step * self.step:
+            out.append(self._close(symbol, 0, rec))
+        self._rollup(symbol, recs, out[:], now_ns, out)
         return out
+
+    def history(self, symbol: str, frame: Optional[str] = None) -> List[Bar]:
+        """最近封口的 bar（ring，舊 → 新）；frame 預設為第一個 frame。"""
+        rings = self.closed.get(symbol)
+        if not rings:
+            return []
+        return list(rings[self.frames.index(frame) if frame else 0])
+
+
+# ---- 批次（向量化）聚合：回測暖機 / 純 bar 回測用；結果與逐 tick 的 BarBuilder 一致 ----
+def _as_ns(ts) -> np.ndarray:
+    a = np.asarray(ts)
+    if a.dtype.kind == "M":
+        return a.astype("datetime64[ns]").view("i8")
+    return a.astype("i8", copy=False)
+
+def _range_starts(price: np.ndarray, size: float) -> np.ndarray:
+    """區間 bar 切點：每根 bar 內以 accumulate 找第一個 高-低 >= size 的 tick（迴圈次數 = bar 數，不是 tick 數）。"""
+    n = len(price)
+    starts = [0]
+    s, w = 0, 1024
+    while s < n:
+        e = min(n, s + w)
+        seg = price[s:e]
+        hit = (np.maximum.accumulate(seg) - np.minimum.accumulate(seg)) >= size
+        j = int(hit.argmax())
+        if hit[j]:
+            s += j + 1
+            if s < n:
+                starts.append(s)
+        elif e == n:
+            break
+        else:
+            w *= 2
+    return np.asarray(starts, dtype="i8")
+
+def _bucket_starts(ns: np.ndarray, price: np.ndarray, vol: np.ndarray, frame: str):
+    """回傳 (每桶第一列 index, 每桶 bar ts)。"""
+    spec = _activity_spec(frame)
+    if spec is None:
+        step = _frame_ns(frame)
+        keys = ns // step * step
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        return starts, keys[starts]
+    kind, size = spec
+    if kind == "tick":
+        starts = np.arange(0, len(ns), size, dtype="i8")
+    elif kind == "vol":
+        ids = (np.cumsum(vol) - vol) // size
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    else:
+        starts = _range_starts(price, size)
+    return starts, ns[starts]
+
+def aggregate(ts, price, vol, frame: str, o=None, h=None, l=None) -> pd.DataFrame:
+    """
+    已排序的 tick（或低週期 bar）一次聚合成 frame 週期 K：回傳 ts,o,h,l,c,v。
+    - tick：只給 price（= 成交價）/ vol
+    - bar → 高週期：另給 o/h/l，price 當 close（僅限時間 frame）
+    - 活動量 frame（vol:N / tick:N / range:R）的 ts 為該 bar 第一筆 tick 時間
+    bucket 切點以整數運算 / cumsum 求得，OHLCV 用 ufunc.reduceat。
+    """
+    ns = _as_ns(ts)
+    price = np.asarray(price, dtype="f8")
+    vol = np.asarray(vol, dtype="i8")
+    n = len(ns)
+    if n == 0:
+        return pd.DataFrame({"ts": pd.to_datetime(np.array([], dtype="i8")), "o": [], "h": [], "l": [], "c": [], "v": np.array([], dtype="i8")})
+    if (o is not None or h is not None or l is not None) and is_activity_frame(frame):
+        raise ValueError(f"活動量 frame {frame} 需由 tick 聚合，不能由 bar 推得")
+    starts, bar_ts = _bucket_starts(ns, price, vol, frame)
+    ends = np.r_[starts[1:], n] - 1
+    hi = price if h is None else np.asarray(h, dtype="f8")
+    lo = price if l is None else np.asarray(l, dtype="f8")
+    op = price if o is None else np.asarray(o, dtype="f8")
+    return pd.DataFrame({
+        "ts": pd.to_datetime(bar_ts),
+        "o": op[starts],
+        "h": np.maximum.reduceat(hi, starts),
+        "l": np.minimum.reduceat(lo, starts),
+        "c": price[ends],
+        "v": np.add.reduceat(vol, starts),
+    })
+
+def bars_from_df(df: pd.DataFrame, symbol: str, frame: str = "") -> List[Bar]:
+    """ts,o,h,l,c,v 的 DataFrame → Bar 串列（暖機用）。"""
+    if df is None or df.empty:
+        return []
+    return list(BarBatch.from_df(symbol, df, frame))
@@ -1,25 +1,143 @@
 # -*- coding: utf-8 -*-
-from datetime import datetime, date
-import calendar as _cal
+"""
+TAIFEX 交易日曆：交易日、結算日（第三個週三，遇休市順延到下一個交易日）、休市日、各交易時段的開收盤時刻，
+全部預先算成 int64 epoch ns（台北當地 naive，與 tick.ts 同基準），查詢只做 searchsorted。
+整個程式共用一份（get_calendar()），回測引擎、run_live.in_session、MySQL loader 都用它。
+"""
+import os
+from datetime import datetime, date, time
+from typing import Iterable, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
 import pytz
-from strategy.config import TIMEZONE, AUTO_CLOSE_HOUR, AUTO_CLOSE_MINUTE
+from strategy.config import (TIMEZONE, AUTO_CLOSE_ENABLED, AUTO_CLOSE_HOUR, AUTO_CLOSE_MINUTE,
+                             SESSION, HOLIDAYS, CALENDAR_YEARS)
 
-def _to_taipei(ts: datetime) -> datetime:
-    tz = pytz.timezone(TIMEZONE)
-    if ts.tzinfo is None:
-        return tz.localize(ts)
-    return ts.astimezone(tz)
+_NS_PER_MIN = 60 * 1_000_000_000
+_NS_PER_DAY = 1440 * _NS_PER_MIN
+
+def _tod_ns(t: time) -> int:
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000_000
+
+def _day_ns(d) -> np.ndarray:
+    return pd.DatetimeIndex(d).as_unit("ns").asi8
+
+def _holidays_from_env() -> list:
+    """.env HOLIDAY_FILE：一行一個 YYYY-MM-DD（# 之後為註解）。"""
+    path = os.getenv("HOLIDAY_FILE")
+    if not path or not os.path.exists(path):
+        return []
+    out = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            s = line.split("#", 1)[0].strip()
+            if s:
+                out.append(s)
+    return out
+
+class TradingCalendar:
+    def __init__(self, years: Tuple[int, int] = CALENDAR_YEARS, holidays: Iterable = (),
+                 sessions: Sequence[Tuple[time, time]] = SESSION):
+        y0, y1 = years
+        self.sessions = list(sessions)
+        hol = pd.DatetimeIndex(pd.to_datetime(list(holidays))).normalize() if holidays else pd.DatetimeIndex([])
+        self.holidays = np.unique(_day_ns(hol))
+        bdays = pd.bdate_range(f"{y0}-01-01", f"{y1}-12-31")
+        bd = _day_ns(bdays)
+        self.days = bd[~np.isin(bd, self.holidays)]                  # 交易日 00:00
+
+        # 結算日：每月第三個週三；不是交易日就順延到下一個交易日
+        weds = pd.date_range(f"{y0}-01-01", f"{y1}-12-31", freq="WOM-3WED")
+        i = np.searchsorted(self.days, _day_ns(weds), side="left")
+        self.settle_days = np.unique(self.days[i[i < len(self.days)]])
+        self.auto_close = (self.settle_days + (AUTO_CLOSE_HOUR * 60 + AUTO_CLOSE_MINUTE) * _NS_PER_MIN
+                           if AUTO_CLOSE_ENABLED else np.empty(0, dtype="i8"))
+
+        # 交易時段：日盤 [D+s, D+e]；跨午夜的夜盤 [D+s, D+1+e]，歸屬下一個交易日
+        opens, closes, tdays = [], [], []
+        nxt = np.r_[self.days[1:], self.days[-1] + _NS_PER_DAY] if len(self.days) else self.days
+        for s, e in self.sessions:
+            so, eo = _tod_ns(s), _tod_ns(e)
+            opens.append(self.days + so)
+            if s <= e:
+                closes.append(self.days + eo)
+                tdays.append(self.days)
+            else:
+                closes.append(self.days + _NS_PER_DAY + eo)
+                tdays.append(nxt)
+        opens, closes, tdays = np.concatenate(opens), np.concatenate(closes), np.concatenate(tdays)
+        order = np.argsort(opens, kind="stable")
+        self.open_ns, self.close_ns, self.session_day = opens[order], closes[order], tdays[order]
+
+    # ---- 單筆查詢（ns） ----
+    def is_auto_close(self, ns: int) -> bool:
+        """是否為自動平倉那一分鐘（結算日 AUTO_CLOSE_HOUR:AUTO_CLOSE_MINUTE）。"""
+        k = ns - ns % _NS_PER_MIN
+        i = np.searchsorted(self.auto_close, k)
+        return i < len(self.auto_close) and int(self.auto_close[i]) == k
+
+    def is_trading_day(self, ns: int) -> bool:
+        d = ns - ns % _NS_PER_DAY
+        i = np.searchsorted(self.days, d)
+        return i < len(self.days) and int(self.days[i]) == d
+
+    def in_session(self, ns: int) -> bool:
+        """ns 是否落在某個交易時段內（開收盤兩端皆含）。"""
+        i = np.searchsorted(self.close_ns, ns, side="left")
+        return i < len(self.close_ns) and int(self.open_ns[i]) <= ns
+
+    def trading_date(self, ns: int) -> Optional[date]:
+        """ns 所屬交易日：所在時段（或下一個時段）的交易日；夜盤算下一個交易日。"""
+        i = np.searchsorted(self.close_ns, ns, side="left")
+        if i == len(self.close_ns):
+            return None
+        return pd.Timestamp(int(self.session_day[i])).date()
+
+    def next_boundary(self, ns: int) -> Optional[Tuple[int, bool]]:
+        """ns 之後（不含）最近的時段邊界：(時刻 ns, True=開盤 / False=收盤)。"""
+        i = np.searchsorted(self.close_ns, ns, side="right")
+        if i == len(self.close_ns):
+            return None
+        o = int(self.open_ns[i])
+        return (o, True) if o > ns else (int(self.close_ns[i]), False)
+
+    # ---- 向量化查詢（int64 ns 陣列） ----
+    def auto_close_mask(self, ns: np.ndarray) -> np.ndarray:
+        ns = np.asarray(ns, dtype="i8")
+        if len(ns) == 0 or len(self.auto_close) == 0:
+            return np.zeros(len(ns), dtype=bool)
+        k = ns - ns % _NS_PER_MIN
+        i = np.minimum(np.searchsorted(self.auto_close, k), len(self.auto_close) - 1)
+        return self.auto_close[i] == k
+
+    def session_mask(self, ns: np.ndarray) -> np.ndarray:
+        ns = np.asarray(ns, dtype="i8")
+        if len(ns) == 0:
+            return np.zeros(0, dtype=bool)
+        i = np.searchsorted(self.close_ns, ns, side="left")
+        ok = i < len(self.close_ns)
+        return ok & (self.open_ns[np.minimum(i, len(self.open_ns) - 1)] <= ns)
+
+    def day_session(self) -> Optional[Tuple[time, time]]:
+        """日盤時段（不跨午夜的第一個 SESSION），給 loader 的 only_day 過濾用。"""
+        return next(((s, e) for s, e in self.sessions if s <= e), None)
+
+_CAL: Optional[TradingCalendar] = None
+
+def get_calendar() -> TradingCalendar:
+    """全程式共用的日曆（第一次呼叫時建立）。"""
+    global _CAL
+    if _CAL is None:
+        _CAL = TradingCalendar(holidays=list(HOLIDAYS) + _holidays_from_env())
+    return _CAL
+
+def local_ns(ts) -> int:
+    """datetime / Timestamp → 台北當地 naive epoch ns；有時區的先轉台北時間。"""
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert(pytz.timezone(TIMEZONE)).tz_localize(None)
+    return ts.value
 
 def is_third_wed_1329(ts: datetime) -> bool:
-    """是否為台北時間每月第三個星期三 13:29。"""
-    local = _to_taipei(ts)
-    if not (local.hour == AUTO_CLOSE_HOUR and local.minute == AUTO_CLOSE_MINUTE):
-        return False
-    y, m = local.year, local.month
-    cal = _cal.monthcalendar(y, m)  # 5x7
-    # 找當月所有星期三（週一為 0）
-    weds = [week[_cal.WEDNESDAY] for week in cal if week[_cal.WEDNESDAY] != 0]
-    if len(weds) < 3:
-        return False
-    third = date(y, m, weds[2])
-    return local.date() == third
+    """是否為台北時間結算日（每月第三個星期三，遇休市順延）13:29。"""
+    return get_calendar().is_auto_close(local_ns(ts))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Redis tick 訊息的 JSON 編解碼：{"symbol":"TXF","timestamp":"2025-08-05T09:00:01","price":23123,"vol":1}
+timestamp 為台北當地時間（ISO 字串，有時區的先轉台北時間）；Tick.ts 為 epoch ns。
+datafeed（訂閱端）、回放壓測（發佈端）與 benchmark 共用。
+"""
+import json
+from datetime import datetime, timedelta
+from strategy.core.events import Tick
+from strategy.core.calendar import local_ns
+
+_EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+def ts_to_ns(v) -> int:
+    """ISO 字串走 datetime.fromisoformat（C 實作，比 pd.Timestamp 快）；其他格式交給 local_ns。"""
+    if isinstance(v, str):
+        try:
+            dt = datetime.fromisoformat(v)
+        except ValueError:
+            return local_ns(v)
+        if dt.tzinfo is None:
+            return (dt - _EPOCH) // _US * 1000
+        return local_ns(dt)
+    return local_ns(v)
+
+def ns_to_iso(ns: int) -> str:
+    return (_EPOCH + timedelta(microseconds=ns // 1000)).isoformat()
+
+def tick_from_dict(d: dict) -> Tick:
+    return Tick(symbol=d["symbol"], ts=ts_to_ns(d.get("timestamp")), price=float(d["price"]), vol=int(d.get("vol", 0)))
+
+def decode_tick(raw) -> Tick:
+    return tick_from_dict(json.loads(raw))
+
+def encode_tick(t: Tick, **extra) -> bytes:
+    """extra：附加欄位（例如壓測的發送時間），訂閱端不認得的欄位會被忽略。"""
+    return json.dumps({"symbol": t.symbol, "timestamp": ns_to_iso(t.ts), "price": t.price, "vol": t.vol, **extra},
+                      separators=(",", ":")).encode()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+商品規格表：乘數、跳動點、手續費 / 稅率、滑價、交易時段、tick 資料表名。
+啟動時由 config（MULTIPLIER / TICK_SIZE / SESSION）與 .env（FEE_PER_CONTRACT / SLIPPAGE / TAX_RATE / FEE_RATE）
+建一次；商品根（TXF）與合約代碼（TXFR1、TXF202412…）都能查，結果快取，熱迴圈內不再做字串比對。
+"""
+import os
+from dataclasses import dataclass
+from datetime import time
+from functools import lru_cache
+from typing import Dict, Tuple
+from dotenv import load_dotenv
+
+from strategy.config import MULTIPLIER, TICK_SIZE, SESSION
+
+load_dotenv()
+
+@dataclass(frozen=True)
+class ContractSpec:
+    root: str
+    multiplier: float = 1.0
+    tick_size: float = 1.0
+    fee_per_contract: float = 0.0          # 每口（平倉時一次扣）
+    tax_rate: float = 0.0                  # 期交稅率（× 契約價值，進出各一次）
+    fee_rate: float = 0.0                  # 比例手續費（同上）
+    slippage: float = 0.0                  # 成交滑價（點）
+    session: Tuple[Tuple[time, time], ...] = ()
+    table: str = ""                        # MySQL tick 資料表
+
+    def close_cost(self, entry_price: float, exit_price: float, qty: int) -> float:
+        """一筆來回交易的成本（元）；稅率 / 比例費率預設 0 時只剩每口手續費。"""
+        cost = self.fee_per_contract * qty
+        if self.tax_rate or self.fee_rate:
+            cost += (self.tax_rate + self.fee_rate) * (entry_price + exit_price) * self.multiplier * qty
+        return cost
+
+def _env_float(name: str, default: float = 0.0) -> float:
+    return float(os.getenv(name, str(default)))
+
+def _build() -> Dict[str, ContractSpec]:
+    fee, slip = _env_float("FEE_PER_CONTRACT"), _env_float("SLIPPAGE")
+    tax, rate = _env_float("TAX_RATE"), _env_float("FEE_RATE")
+    sess = tuple(SESSION)
+    return {
+        root: ContractSpec(root, float(mult), float(TICK_SIZE.get(root, 1.0)), fee, tax, rate, slip, sess, f"ticks_{root}")
+        for root, mult in MULTIPLIER.items()
+    }
+
+SPECS: Dict[str, ContractSpec] = _build()
+# 長的商品根優先比對（避免短根吃掉長根的前綴）
+_ROOTS = sorted(SPECS, key=len, reverse=True)
+
+@lru_cache(maxsize=None)
+def contract_spec(symbol: str) -> ContractSpec:
+    """商品根或合約代碼 → 規格；未登錄的商品回傳乘數 1、無費用的預設規格（與舊 _mult 行為相同）。"""
+    s = symbol.upper()
+    for root in _ROOTS:
+        if s.startswith(root):
+            return SPECS[root]
+    return ContractSpec(s, fee_per_contract=_env_float("FEE_PER_CONTRACT"), slippage=_env_float("SLIPPAGE"),
+                        tax_rate=_env_float("TAX_RATE"), fee_rate=_env_float("FEE_RATE"),
+                        session=tuple(SESSION), table=f"ticks_{s}")
+
+def root_of(symbol: str) -> str:
+    return contract_spec(symbol).root
@@ -1,22 +1,80 @@
 # -*- coding: utf-8 -*-
-import json
+import queue
+import threading
+import time
+from typing import Dict, Tuple
 import redis
-import pandas as pd
 from strategy.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_CHANNEL_PREFIX
 from strategy.core.events import Tick
+from strategy.core.codec import decode_tick
 
 class RedisTickStream:
-    def __init__(self):
+    def __init__(self, timeout: float = 1.0):
         self.r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
         self.pubsub = self.r.pubsub()
         self.pubsub.psubscribe(f"{REDIS_CHANNEL_PREFIX}*")
+        self.timeout = timeout
 
     def __iter__(self): return self
 
     def __next__(self) -> Tick:
-        msg = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-        if not msg:
+        t = self.poll(self.timeout)
+        if t is None:
             raise StopIteration
-        data = json.loads(msg["data"])
-        ts = pd.to_datetime(data.get("timestamp"))
-        return Tick(symbol=data["symbol"], ts=ts, price=float(data["price"]), vol=int(data.get("vol",0)))
+        return t
+
+    def poll(self, timeout: float) -> Tick | None:
+        """最多等 timeout 秒；無訊息回傳 None（讓呼叫端兼顧時鐘事件）。"""
+        msg = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if not msg:
+            return None
+        return decode_tick(msg["data"])
+
+class BufferedTickStream:
+    """
+    先訂閱、後處理：背景 thread 持續把 inner.poll() 收到的 tick 放進佇列，主執行緒在補播 / 暖機 / 登入期間
+    收到的 tick 不會遺失。skip_through({symbol: (ts, n)})：丟掉該商品 ts 之前、以及 ts 當下前 n 筆的訊息
+    （已由 ticks_* 補播過；同一 ts 還沒進 MySQL 的其餘 tick 照常交出）。
+    """
+    def __init__(self, inner, poll_sec: float = 0.2):
+        self.inner = inner
+        self.poll_sec = poll_sec
+        self.q: "queue.Queue[Tick]" = queue.Queue()
+        self.skip: Dict[str, Tuple[int, int]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tick-reader", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                t = self.inner.poll(self.poll_sec)
+            except Exception as e:
+                print(f"[FEED][ERROR] {e}")
+                time.sleep(1)
+                continue
+            if t is not None:
+                self.q.put(t)
+
+    def skip_through(self, pos: Dict[str, Tuple[int, int]]):
+        """pos：各商品 (最後補播 ts, 該 ts 已補播筆數)，同 live.state_store.Position。"""
+        self.skip = dict(pos)
+
+    def poll(self, timeout: float) -> Tick | None:
+        while True:
+            try:
+                t = self.q.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            lim = self.skip.get(t.symbol)
+            if lim is None or t.ts > lim[0]:
+                return t
+            if t.ts == lim[0]:
+                if not lim[1]:
+                    return t
+                self.skip[t.symbol] = (lim[0], lim[1] - 1)
+            timeout = 0     # 丟掉已補播的 tick，佇列空了就先交還主迴圈
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
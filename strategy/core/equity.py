@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from strategy.core.barbuilder import _frame_ns
+
+RESOLUTIONS = ("tick", "minute", "bar", "change")
+
+class EquityRecorder:
+    """
+    回測 equity 曲線的欄式紀錄（int64 ts ns + float64 equity），預先配置、倍增成長：
+    - resolution="tick"：每筆（同一 ts 只留第一筆，與舊版 drop_duplicates("ts") 相同）
+    - "minute" / "bar"：tick 曲線每分鐘 / 每根 bar 只留最後一筆（bucket 收盤；最後一個 bucket 在 arrays() 補上）
+    - "change"：只在部位變動（開倉 / 平倉）時記錄（第一筆一定記），另補上 tick 曲線的最後一筆
+    各 resolution 的終點都與 tick 相同，summarize 的 end_equity / total_return 不受取樣影響。
+    max_rows：記憶體內最多列數，超過就把目前的區塊 spill 成 .npy 到 spill_dir。
+    """
+    def __init__(self, resolution: str = "tick", bar_frame: str = "1H", capacity: int = 1 << 16,
+                 max_rows: Optional[int] = None, spill_dir: Optional[str] = None):
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution 需為 {RESOLUTIONS}: {resolution}")
+        self.resolution = resolution
+        self.step = {"minute": _frame_ns("1min"), "bar": _frame_ns(bar_frame)}.get(resolution, 0)
+        self.only_changes = resolution == "change"
+        self.max_rows = int(max_rows) if max_rows else None
+        cap = min(int(capacity), self.max_rows) if self.max_rows else int(capacity)
+        self._ts = np.empty(cap, dtype="i8")
+        self._eq = np.empty(cap, dtype="f8")
+        self._n = 0
+        self._last = None           # 上一筆的 ts
+        self._tail: Optional[Tuple[int, float]] = None   # tick 曲線目前最後一筆（minute/bar/change 尚未寫入的終點）
+        self._spill_dir = spill_dir
+        self._spilled: List[Tuple[Path, Path]] = []
+        self.rows = 0               # 累計記錄列數（含已 spill）
+
+    def __len__(self):
+        return self.rows
+
+    def _grow(self):
+        if self.max_rows and len(self._ts) >= self.max_rows:
+            self._spill()
+            return
+        cap = max(len(self._ts) * 2, 1024)     # 快照還原後可能是空陣列
+        if self.max_rows:
+            cap = min(cap, self.max_rows)
+        self._ts = np.resize(self._ts, cap)
+        self._eq = np.resize(self._eq, cap)
+
+    def _spill(self):
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="equity_")
+        d = Path(self._spill_dir)
+        d.mkdir(parents=True, exist_ok=True)
+        k = len(self._spilled)
+        pair = (d / f"equity_{os.getpid()}_{id(self):x}_{k:05d}_ts.npy", d / f"equity_{os.getpid()}_{id(self):x}_{k:05d}_eq.npy")
+        np.save(pair[0], self._ts[:self._n])
+        np.save(pair[1], self._eq[:self._n])
+        self._spilled.append(pair)
+        self._n = 0
+
+    def _append(self, ts: int, equity: float):
+        i = self._n
+        if i == len(self._ts):
+            self._grow()
+            i = self._n
+        self._ts[i] = ts
+        self._eq[i] = equity
+        self._n = i + 1
+        self.rows += 1
+
+    def record(self, ts: int, equity: float, changed: bool = False):
+        """逐 tick 呼叫；依 resolution 決定是否寫入。"""
+        new_ts = ts != self._last
+        self._last = ts
+        if self.step:
+            if not new_ts:
+                return
+            tail = self._tail
+            if tail is not None and tail[0] // self.step != ts // self.step:
+                self._append(*tail)
+            self._tail = (ts, equity)
+        elif self.only_changes:
+            if new_ts:
+                self._tail = (ts, equity)
+            if changed or not self.rows:
+                self._append(ts, equity)
+        elif new_ts:
+            self._append(ts, equity)
+
+    def extend(self, ts: np.ndarray, equity: np.ndarray, changed: Optional[np.ndarray] = None):
+        """批次寫入（向量化引擎用）；篩選規則與逐筆 record 完全相同。"""
+        ts = np.asarray(ts, dtype="i8")
+        equity = np.asarray(equity, dtype="f8")
+        if len(ts) == 0:
+            return
+        first = np.r_[ts[0] != self._last, ts[1:] != ts[:-1]]     # tick 曲線的列（每個 ts 第一筆）
+        self._last = int(ts[-1])
+        if self.step:
+            ts, equity = ts[first], equity[first]
+            if not len(ts):
+                return
+            if self._tail is not None:
+                ts, equity = np.r_[self._tail[0], ts], np.r_[self._tail[1], equity]
+            k = ts // self.step
+            self._tail = (int(ts[-1]), float(equity[-1]))
+            keep = np.flatnonzero(k[1:] != k[:-1])
+        elif self.only_changes:
+            if first.any():
+                j = np.flatnonzero(first)[-1]
+                self._tail = (int(ts[j]), float(equity[j]))
+            keep = np.zeros(len(ts), dtype=bool) if changed is None else np.asarray(changed, dtype=bool).copy()
+            if not self.rows:
+                keep[0] = True
+        else:
+            keep = first
+        ts, equity = ts[keep], equity[keep]
+        while len(ts):
+            room = len(self._ts) - self._n
+            if room == 0:
+                self._grow()
+                continue
+            m = min(room, len(ts))
+            self._ts[self._n:self._n + m] = ts[:m]
+            self._eq[self._n:self._n + m] = equity[:m]
+            self._n += m
+            self.rows += m
+            ts, equity = ts[m:], equity[m:]
+
+    def _written(self) -> Tuple[np.ndarray, np.ndarray]:
+        if not self._spilled:
+            return self._ts[:self._n], self._eq[:self._n]
+        ts = [np.load(a, mmap_mode="r") for a, _ in self._spilled] + [self._ts[:self._n]]
+        eq = [np.load(b, mmap_mode="r") for _, b in self._spilled] + [self._eq[:self._n]]
+        return np.concatenate(ts), np.concatenate(eq)
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """全部紀錄（含 spill 區塊）依寫入順序串接，最後補上尚未寫入的終點。"""
+        ts, eq = self._written()
+        tail = self._tail
+        if tail is not None and (not len(ts) or tail[0] > ts[-1]):
+            ts, eq = np.r_[ts, tail[0]], np.r_[eq, tail[1]]
+        return ts, eq
+
+    def to_frame(self) -> pd.DataFrame:
+        """index=ts（每個 ts 取第一筆、依時間排序），欄 equity。"""
+        ts, eq = self.arrays()
+        uniq, first = np.unique(ts, return_index=True)
+        return pd.DataFrame({"equity": eq[first]}, index=pd.DatetimeIndex(pd.to_datetime(uniq), name="ts"))
+
+    def __getstate__(self):
+        # 快照時把已 spill 的區塊併回記憶體；原 spill 檔在回測結束時會被 cleanup，不能只記路徑
+        d = self.__dict__.copy()
+        ts, eq = self._written()
+        d["_ts"], d["_eq"], d["_n"], d["_spilled"] = np.array(ts), np.array(eq), len(ts), []
+        return d
+
+    def __setstate__(self, d):
+        self.__dict__.update(d)
+        if self.max_rows and self._n > self.max_rows:
+            self._spill()
+            self._ts = np.empty(self.max_rows, dtype="i8")
+            self._eq = np.empty(self.max_rows, dtype="f8")
+
+    def cleanup(self):
+        for a, b in self._spilled:
+            for p in (a, b):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+        self._spilled.clear()
@@ -1,29 +1,131 @@
 # -*- coding: utf-8 -*-
+"""
+事件型別：slots dataclass，ts 一律為 int64 epoch ns（台北當地 naive，與交易日曆同基準），
+熱迴圈不再逐筆建 pd.Timestamp；需要時間物件時用 .dt。
+批次資料用 NumPy structured array（TICK_DTYPE / BAR_DTYPE），TickBatch / BarBatch 逐列取用時才建事件物件。
+"""
 from dataclasses import dataclass
-from typing import Optional
+from typing import Iterator, Optional
+import numpy as np
 import pandas as pd
 
-@dataclass
+@dataclass(slots=True)
 class Tick:
     symbol: str
-    ts: pd.Timestamp
+    ts: int           # epoch ns
     price: float
     vol: int = 0
     is_open: bool = False
 
-@dataclass
+    @property
+    def dt(self) -> pd.Timestamp:
+        return pd.Timestamp(self.ts)
+
+@dataclass(slots=True)
 class Bar:
     symbol: str
-    ts: pd.Timestamp  # bar 開始時間
+    ts: int           # bar 開始時間（epoch ns）
     o: float
     h: float
     l: float
     c: float
     v: int
+    frame: str = ""  # 來源 frame（BarBuilder 多週期 fan-out 時標記）
+
+    @property
+    def dt(self) -> pd.Timestamp:
+        return pd.Timestamp(self.ts)
 
-@dataclass
+@dataclass(slots=True)
 class Signal:
     symbol: str
     side: str    # 'BUY' / 'SELL' / 'FLAT'
     qty: int = 1
     note: Optional[str] = None
+
+TICK_DTYPE = np.dtype([("ts", "i8"), ("price", "f8"), ("vol", "i8"), ("is_open", "?")])
+BAR_DTYPE = np.dtype([("ts", "i8"), ("o", "f8"), ("h", "f8"), ("l", "f8"), ("c", "f8"), ("v", "i8")])
+
+def _ns_col(ts) -> np.ndarray:
+    return pd.DatetimeIndex(ts).as_unit("ns").asi8
+
+class TickBatch:
+    """單一商品的 tick 陣列（TICK_DTYPE）；切片回傳 view，逐筆迭代時才建 Tick。"""
+    __slots__ = ("symbol", "data")
+
+    def __init__(self, symbol: str, data: np.ndarray):
+        self.symbol = symbol
+        self.data = data
+
+    @classmethod
+    def from_minutes(cls, symbol: str, df: pd.DataFrame) -> "TickBatch":
+        """1 分鐘 K → 雙 tick（先 minute open，再 minute close）。"""
+        n = len(df)
+        a = np.empty(2 * n, dtype=TICK_DTYPE)
+        a["ts"] = np.repeat(_ns_col(df["ts"]), 2)
+        a["price"][0::2] = df["o"].to_numpy("f8")
+        a["price"][1::2] = df["c"].to_numpy("f8")
+        a["vol"] = np.repeat(df["v"].to_numpy("i8"), 2) if "v" in df else 0
+        a["is_open"][0::2], a["is_open"][1::2] = True, False
+        return cls(symbol, a)
+
+    @classmethod
+    def from_ticks(cls, symbol: str, df: pd.DataFrame) -> "TickBatch":
+        """原始逐筆（ts, price, vol，已依時間排序）；每分鐘第一筆標 is_open（MC 下一棒開盤成交用）。"""
+        a = np.empty(len(df), dtype=TICK_DTYPE)
+        if len(df):
+            a["ts"] = _ns_col(df["ts"])
+            a["price"] = df["price"].to_numpy("f8")
+            a["vol"] = df["vol"].to_numpy("i8")
+            m = a["ts"] // 60_000_000_000
+            a["is_open"][0] = True
+            a["is_open"][1:] = m[1:] != m[:-1]
+        return cls(symbol, a)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return TickBatch(self.symbol, self.data[i])
+        r = self.data[i]
+        return Tick(self.symbol, int(r["ts"]), float(r["price"]), int(r["vol"]), bool(r["is_open"]))
+
+    def __iter__(self) -> Iterator[Tick]:
+        a, s = self.data, self.symbol
+        for ts, p, v, op in zip(a["ts"].tolist(), a["price"].tolist(), a["vol"].tolist(), a["is_open"].tolist()):
+            yield Tick(s, ts, p, v, op)
+
+class BarBatch:
+    """單一商品、單一 frame 的 K 棒陣列（BAR_DTYPE）。"""
+    __slots__ = ("symbol", "frame", "data")
+
+    def __init__(self, symbol: str, data: np.ndarray, frame: str = ""):
+        self.symbol = symbol
+        self.frame = frame
+        self.data = data
+
+    @classmethod
+    def from_df(cls, symbol: str, df: pd.DataFrame, frame: str = "") -> "BarBatch":
+        a = np.empty(len(df), dtype=BAR_DTYPE)
+        if len(df):
+            a["ts"] = _ns_col(df["ts"])
+            for k in ("o", "h", "l", "c"):
+                a[k] = df[k].to_numpy("f8")
+            a["v"] = df["v"].to_numpy("i8") if "v" in df else 0
+        return cls(symbol, a, frame)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return BarBatch(self.symbol, self.data[i], self.frame)
+        r = self.data[i]
+        return Bar(self.symbol, int(r["ts"]), float(r["o"]), float(r["h"]), float(r["l"]), float(r["c"]), int(r["v"]), self.frame)
+
+    def __iter__(self) -> Iterator[Bar]:
+        a, s, f = self.data, self.symbol, self.frame
+        cols = (a[k].tolist() for k in ("ts", "o", "h", "l", "c", "v"))
+        for ts, o, h, l, c, v in zip(*cols):
+            yield Bar(s, ts, o, h, l, c, v, f)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+交易序列 Monte Carlo：把已平倉交易的損益重抽樣成大量虛擬路徑，看報酬 / 回撤的分布有多寬。
+- bootstrap：有放回抽樣（交易筆數不變），報酬與回撤都會變
+- shuffle：只打亂順序，總損益不變，看的是回撤對交易順序的敏感度
+路徑以 [sims, trades] 2-D 陣列一次算；模擬數切成固定大小的區塊，各區塊用 SeedSequence.spawn 的子種子，
+所以同一個 seed 不論單 process 或幾個 worker，結果都逐位元相同。
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+
+METHODS = ("bootstrap", "shuffle")
+PERCENTILES = (1, 5, 10, 25, 50, 75, 90, 95, 99)
+_BLOCK_CELLS = 2_000_000       # 每個區塊最多 sims × trades 格，控制記憶體
+_POOL_CELLS = 20_000_000       # 總格數超過才開 process pool
+
+def trade_pnl(trades_df: pd.DataFrame) -> np.ndarray:
+    """trades_df → 已平倉交易的損益（依平倉時間排序）。"""
+    if trades_df is None or not len(trades_df):
+        return np.zeros(0)
+    tr = trades_df.dropna(subset=["exit_ts"])
+    order = np.argsort(pd.to_datetime(tr["exit_ts"]).to_numpy(), kind="stable")
+    return tr["pnl"].to_numpy("f8")[order]
+
+def path_stats(paths: np.ndarray, start_cash: float) -> Dict[str, np.ndarray]:
+    """paths = [sims, trades] 的損益序列 → 每條路徑的 total_return、max_drawdown（比例）、max_dd_cash、最長連虧筆數。"""
+    eq = start_cash + np.cumsum(paths, axis=1)
+    peak = np.maximum(np.maximum.accumulate(eq, axis=1), start_cash)
+    dd = eq / peak - 1.0
+    # 最長連虧：每個位置距「最近一筆非虧損交易」的筆數
+    n = paths.shape[1]
+    idx = np.arange(1, n + 1)
+    last_ok = np.maximum.accumulate(np.where(paths >= 0, idx, 0), axis=1)
+    return {
+        "total_return": eq[:, -1] / start_cash - 1.0,
+        "max_drawdown": dd.min(axis=1),
+        "max_dd_cash": (eq - peak).min(axis=1),
+        "max_loss_streak": (idx - last_ok).max(axis=1).astype("f8"),
+    }
+
+def _block(pnl: np.ndarray, method: str, sims: int, seed: np.random.SeedSequence, start_cash: float) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    n = len(pnl)
+    if method == "bootstrap":
+        idx = rng.integers(0, n, size=(sims, n))
+    else:
+        idx = rng.permuted(np.broadcast_to(np.arange(n), (sims, n)), axis=1)
+    return path_stats(pnl[idx], start_cash)
+
+def simulate(pnl: np.ndarray, n_sims: int = 10_000, method: str = "bootstrap", seed: int = 0,
+             start_cash: float = 1_000_000.0, workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    跑 n_sims 條重抽樣路徑，回傳每條路徑的統計（DataFrame，一列一條）。
+    workers：None = 總量夠大才自動開 pool（CPU 核心數）；0 / 1 = 單 process。
+    """
+    if method not in METHODS:
+        raise ValueError(f"method 需為 {METHODS}: {method}")
+    pnl = np.asarray(pnl, dtype="f8")
+    if not len(pnl) or n_sims <= 0:
+        return pd.DataFrame(columns=["total_return", "max_drawdown", "max_dd_cash", "max_loss_streak"])
+    per = max(1, _BLOCK_CELLS // len(pnl))
+    sizes = [min(per, n_sims - i) for i in range(0, n_sims, per)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers is None:
+        workers = (os.cpu_count() or 1) if n_sims * len(pnl) > _POOL_CELLS else 1
+    workers = min(workers, len(sizes))
+    args = [(pnl, method, k, s, start_cash) for k, s in zip(sizes, seeds)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            parts = list(ex.map(_block, *zip(*args)))
+    else:
+        parts = [_block(*a) for a in args]
+    return pd.DataFrame({k: np.concatenate([p[k] for p in parts]) for k in parts[0]})
+
+def percentile_table(sims: pd.DataFrame, actual: Dict[str, float], percentiles: Sequence[int] = PERCENTILES) -> pd.DataFrame:
+    """各統計量的分位數表；另附 mean、實際交易順序的值（actual）與虧損機率（p_loss）。"""
+    rows: List[dict] = [{"stat": f"p{q}", **{k: float(np.percentile(sims[k], q)) for k in sims}} for q in percentiles]
+    rows.append({"stat": "mean", **{k: float(sims[k].mean()) for k in sims}})
+    rows.append({"stat": "actual", **actual})
+    rows.append({"stat": "p_loss", "total_return": float((sims["total_return"] < 0).mean())})
+    return pd.DataFrame(rows)
+
+def report(trades_df: pd.DataFrame, out_dir, n_sims: int = 10_000, methods: Sequence[str] = METHODS, seed: int = 0,
+           start_cash: float = 1_000_000.0, workers: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+    """對 trades_df 跑各 method，分位數表寫成 out_dir/montecarlo_<method>.csv（與 trades.csv 同目錄）。"""
+    pnl = trade_pnl(trades_df)
+    actual = {k: float(v[0]) for k, v in path_stats(pnl[None, :], start_cash).items()} if len(pnl) else {}
+    out = {}
+    for m in methods:
+        tab = percentile_table(simulate(pnl, n_sims, m, seed, start_cash, workers), actual) if len(pnl) else pd.DataFrame()
+        tab.to_csv(os.path.join(out_dir, f"montecarlo_{m}.csv"), index=False, encoding="utf-8-sig")
+        out[m] = tab
+    return out
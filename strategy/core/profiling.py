@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+回測分段計時（run_backtest --profile）：
+- stage(name)：區段的 wall time；巢狀時各 stage 只記「自己」的時間（exclusive），外層另記含子區段的 inclusive
+- wrap(fn, name) / iterate(it, name)：熱迴圈內的呼叫 / 迭代器逐次計時（只有 --profile 才會包，平常零成本）
+- 記憶體：最外層 stage 結束時記 process 的 peak RSS；memory=True 時另以 tracemalloc 記各最外層 stage 的 Python 配置峰值
+報表為 JSON（profile.json），數字皆為秒 / MB / 次。
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def _rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # Linux: KB
+
+class StageProfiler:
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.seconds: Dict[str, float] = {}     # exclusive
+        self.inclusive: Dict[str, float] = {}   # 只記 stage()（含子區段）
+        self.calls: Dict[str, int] = {}
+        self.peak_mb: Dict[str, float] = {}
+        self.rss_mb: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._stack = []
+        self._mark = 0.0
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _enter(self, name: str):
+        now = time.perf_counter()
+        if self._stack:
+            top = self._stack[-1]
+            self.seconds[top] = self.seconds.get(top, 0.0) + now - self._mark
+        self._stack.append(name)
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self._mark = now
+
+    def _exit(self):
+        now = time.perf_counter()
+        top = self._stack.pop()
+        self.seconds[top] = self.seconds.get(top, 0.0) + now - self._mark
+        self._mark = now
+
+    @contextmanager
+    def stage(self, name: str):
+        outer = not self._stack
+        if outer and self.memory:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        self._enter(name)
+        try:
+            yield self
+        finally:
+            self._exit()
+            self.inclusive[name] = self.inclusive.get(name, 0.0) + time.perf_counter() - t0
+            if outer:
+                if self.memory:
+                    self.peak_mb[name] = max(self.peak_mb.get(name, 0.0), tracemalloc.get_traced_memory()[1] / 2**20)
+                rss = _rss_mb()
+                if rss is not None:
+                    self.rss_mb[name] = rss
+
+    def wrap(self, fn: Callable, name: str) -> Callable:
+        enter, exit_ = self._enter, self._exit
+        def timed(*a, **kw):
+            enter(name)
+            try:
+                return fn(*a, **kw)
+            finally:
+                exit_()
+        return timed
+
+    def iterate(self, it: Iterable, name: str) -> Iterator:
+        """逐次計 next() 的時間（資料讀取 / tick 建立 / 合併等延遲產生的串流）；呼叫次數 = 產出筆數 + 1。"""
+        it = iter(it)
+        while True:
+            self._enter(name)
+            try:
+                x = next(it)
+            except StopIteration:
+                return
+            finally:
+                self._exit()
+            yield x
+
+    def count(self, name: str, n: int):
+        self.counts[name] = self.counts.get(name, 0) + int(n)
+
+    def report(self, **meta) -> dict:
+        total = sum(self.seconds.values())
+        stages = {k: {"seconds": round(v, 6), "share": round(v / total, 4) if total else 0.0,
+                      "calls": self.calls.get(k, 0)} for k, v in sorted(self.seconds.items(), key=lambda kv: -kv[1])}
+        for k, v in self.inclusive.items():
+            stages[k]["inclusive_seconds"] = round(v, 6)
+        for k, v in self.peak_mb.items():
+            stages[k]["tracemalloc_peak_mb"] = round(v, 3)
+        for k, v in self.rss_mb.items():
+            stages[k]["rss_peak_mb"] = round(v, 3)
+        replay = self.inclusive.get("replay", 0.0)
+        rates = {f"{k}_per_sec": round(n / replay, 1) for k, n in self.counts.items() if replay}
+        return {**meta, "total_seconds": round(total, 6), "stages": stages, "counts": dict(self.counts), "rates": rates,
+                "rss_peak_mb": _rss_mb(), "tracemalloc": self.memory}
+
+    def write(self, path, **meta) -> dict:
+        rep = self.report(**meta)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rep, f, ensure_ascii=False, indent=2, default=str)
+        return rep
+
+def stage(prof: Optional[StageProfiler], name: str):
+    """prof 為 None 時不計時。"""
+    return prof.stage(name) if prof is not None else nullcontext()
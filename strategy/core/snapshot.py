@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+狀態快照：把一組物件（策略、BarBuilder、BacktestEngine、待成交單…）序列化成帶版本的二進位 blob。
+格式 = MAGIC(4) + 版本(uint16) + zlib(pickle)；版本不符或內容毀損一律 SnapshotError，呼叫端改從頭回放。
+回測 checkpoint（CheckpointStore）與實盤快照共用同一套 dumps / loads。
+"""
+import hashlib
+import json
+import os
+import pickle
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+MAGIC = b"PSNP"
+VERSION = 1
+_HEAD = struct.Struct("<4sH")
+
+class SnapshotError(ValueError):
+    pass
+
+def capture(state: Dict[str, Any]) -> bytes:
+    """只做 pickle（當下狀態的複本）；壓縮與加檔頭交給 pack，可放到背景 thread。"""
+    return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+def pack(raw: bytes) -> bytes:
+    return _HEAD.pack(MAGIC, VERSION) + zlib.compress(raw, 1)
+
+def dumps(state: Dict[str, Any]) -> bytes:
+    return pack(capture(state))
+
+def loads(blob: bytes) -> Dict[str, Any]:
+    if len(blob) < _HEAD.size:
+        raise SnapshotError("快照長度不足")
+    magic, ver = _HEAD.unpack_from(blob)
+    if magic != MAGIC:
+        raise SnapshotError("不是快照檔")
+    if ver != VERSION:
+        raise SnapshotError(f"快照版本 {ver} 與程式版本 {VERSION} 不符")
+    try:
+        return pickle.loads(zlib.decompress(blob[_HEAD.size:]))
+    except Exception as e:
+        raise SnapshotError(f"快照內容毀損：{e}") from e
+
+def write_file(path: Path, blob: bytes):
+    """先寫暫存檔再 rename，中途中斷不會留下半個快照。"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def read_file(path: Path) -> Dict[str, Any]:
+    return loads(Path(path).read_bytes())
+
+def config_key(**cfg) -> str:
+    """設定（參數、商品、起點、frame…）→ 雜湊；任何一項不同就不共用 checkpoint。"""
+    return hashlib.sha1(json.dumps(cfg, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+class CheckpointStore:
+    """
+    回測 checkpoint：root/<config_key>/<ts ns>.snap，ts = 續跑起點 tick 的時間。
+    同一設定延長結束日時，取 ts 不晚於新結束時間的最新一份，之前的資料不必重播。
+    """
+    def __init__(self, root: Path, key: str, keep: int = 0):
+        self.dir = Path(root) / key
+        self.keep = int(keep)
+
+    def _files(self) -> List[Tuple[int, Path]]:
+        if not self.dir.exists():
+            return []
+        out = []
+        for p in self.dir.glob("*.snap"):
+            try:
+                out.append((int(p.stem), p))
+            except ValueError:
+                continue
+        return sorted(out)
+
+    def save(self, ts: int, state: Dict[str, Any]) -> Path:
+        path = self.dir / f"{int(ts)}.snap"
+        write_file(path, dumps(state))
+        if self.keep:
+            for _, old in self._files()[:-self.keep]:
+                old.unlink(missing_ok=True)
+        return path
+
+    def latest(self, end_ns: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """ts <= end_ns 的最新有效 checkpoint；讀不出來的（版本不符 / 毀損）跳過往前找。"""
+        for ts, p in reversed(self._files()):
+            if end_ns is not None and ts > end_ns:
+                continue
+            try:
+                return read_file(p)
+            except (OSError, SnapshotError) as e:
+                print(f"[CKPT] 略過 {p.name}：{e}")
+        return None
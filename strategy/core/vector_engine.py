@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+PSAR 向量化回測引擎（單一商品、1 分鐘 K 雙 tick 近似、MC 下一棒開盤成交）。
+
+與 run_backtest.replay 的事件迴圈逐筆等價，但不為每根 1 分鐘 K 建 Tick、不逐 tick 呼叫策略與引擎：
+1. 策略階段：以小時為段，段內 SAR 固定；用 accumulate / 布林陣列一次找出「下一個會出訊號的 tick」
+   （停損、移動停利、PSAR tick 反轉），只在那幾筆呼叫真正的 strategy.on_tick，其餘 tick 的
+   peak/trough/triggered 以陣列結果回寫；小時封口仍交給 strategy.on_bar（一小時一次）。
+2. 帳務階段：MC 待成交單以 searchsorted 找成交 tick，結算日 13:29 以交易日曆遮罩找出，
+   只在有事件的 tick 走 BacktestEngine 的部位邏輯；逐 tick 的 mark-to-market 以 cumsum 一次算完，
+   加總順序與事件迴圈相同，equity 數值逐位元一致。
+"""
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+from strategy.core.backtester import BacktestEngine, Position
+from strategy.core.barbuilder import _frame_ns, aggregate
+from strategy.core.calendar import get_calendar
+from strategy.core.events import Bar, Tick, Signal
+
+_NS_PER_MIN = 60 * 1_000_000_000
+_NS_PER_HOUR = 60 * _NS_PER_MIN
+
+def _tick_arrays(df: pd.DataFrame):
+    """1 分鐘 K → 雙 tick（open 在前、close 在後）的欄位陣列。"""
+    ts = pd.DatetimeIndex(df["ts"])
+    n = len(ts)
+    order = np.argsort(ts.as_unit("ns").asi8, kind="stable")
+    ts = ts[order]
+    price = np.empty(2 * n, dtype="f8")
+    price[0::2] = df["o"].to_numpy("f8")[order]
+    price[1::2] = df["c"].to_numpy("f8")[order]
+    v = df["v"].to_numpy("i8")[order] if "v" in df else np.zeros(n, dtype="i8")
+    row = np.repeat(np.arange(n), 2)
+    is_open = np.tile(np.array([True, False]), n)
+    return ts, row, price, np.repeat(v, 2), is_open
+
+class _PSARScanner:
+    """策略階段：重現 RiskWrappedPSARHourly.on_tick 的判斷，但只在觸發訊號的 tick 呼叫策略。"""
+    def __init__(self, strat, symbol: str, ns: np.ndarray, price, vol, is_open):
+        self.strat, self.inner, self.s = strat, strat.inner, symbol
+        self.ns, self.price, self.vol, self.is_open = ns, price, vol, is_open
+        self.signals: Dict[int, Signal] = {}
+
+    def _risk_arrays(self, seg: np.ndarray):
+        """部位存在時，回傳 (觸發遮罩, 新 peak/trough 陣列, triggered 陣列)；無部位回傳 None。"""
+        st, s = self.strat, self.s
+        pos = st.pos.get(s, 0)
+        if pos == 0:
+            return None
+        epx = st.entry.get(s, 0.0)
+        trig = np.logical_or.accumulate(((seg - epx) if pos > 0 else (epx - seg)) >= st.trail_trigger)
+        trig |= st.triggered.get(s, False)
+        if pos > 0:
+            ext = np.maximum(np.maximum.accumulate(seg), st.peak.get(s, float('-inf')))
+            sl = seg <= epx - st.sl_points
+            mfe = ext - epx
+            trail = trig & (mfe > 0) & ((ext - seg) >= st.trail_retrace * mfe)
+        else:
+            ext = np.minimum(np.minimum.accumulate(seg), st.trough.get(s, float('inf')))
+            sl = seg >= epx + st.sl_points
+            mfe = epx - ext
+            trail = trig & (mfe > 0) & ((seg - ext) >= st.trail_retrace * mfe)
+        return sl | trail, ext, trig
+
+    def _carry(self, risk, upto: int):
+        """把 [段首, upto] 內無訊號 tick 對 peak/trough/triggered 的更新寫回策略。"""
+        if risk is None or upto < 0:
+            return
+        st, s = self.strat, self.s
+        _, ext, trig = risk
+        if st.pos.get(s, 0) > 0:
+            st.peak[s] = float(ext[upto])
+        else:
+            st.trough[s] = float(ext[upto])
+        st.triggered[s] = bool(trig[upto])
+
+    def scan(self, a: int, b: int):
+        """處理 tick [a, b)：段內 SAR 不變（tick 反轉只改 trend，不改 SAR 值）。"""
+        s = self.s
+        while a < b:
+            seg = self.price[a:b]
+            risk = self._risk_arrays(seg)
+            hit = risk[0].copy() if risk is not None else np.zeros(len(seg), dtype=bool)
+            psar, sar = self.inner.state.get(s), self.inner.cur_sar.get(s)
+            if psar is not None and sar is not None:
+                hit |= (seg <= sar) if psar.trend > 0 else (seg >= sar)
+            j = int(hit.argmax())
+            if not hit[j]:
+                self._carry(risk, len(seg) - 1)
+                return
+            self._carry(risk, j - 1)
+            i = a + j
+            t = Tick(s, int(self.ns[i]), float(self.price[i]), int(self.vol[i]), is_open=bool(self.is_open[i]))
+            sig = self.strat.on_tick(t)
+            if sig is None:
+                raise RuntimeError(f"vector 引擎與策略判斷不一致 @ {t.dt}（策略參數或類別不符？）")
+            self.signals[i] = sig
+            a = i + 1
+
+def run_psar_vectorized(strat, engine: BacktestEngine, symbol: str, df: pd.DataFrame, frame: str = "1H"):
+    """
+    以向量化方式回放 RiskWrappedPSARHourly（strat 需已 on_start）；結果寫入 engine（trades / equity_rec）。
+    回傳最後一筆 tick 的時間（epoch ns，供 close_all），無資料回傳 None。
+    """
+    if not all(hasattr(strat, a) for a in ("inner", "pos", "entry", "peak", "trough", "triggered")):
+        raise TypeError("vector 引擎只支援 RiskWrappedPSARHourly")
+    if df is None or df.empty:
+        return None
+    ts, row, price, vol, is_open = _tick_arrays(df)
+    ns = ts.as_unit("ns").asi8[row]
+    n = len(price)
+
+    # ---- 1) 策略階段：段 = 兩次小時封口之間；封口 tick 本身先走 on_tick 再 on_bar ----
+    step = _frame_ns(frame)
+    bkey = ns // step * step
+    closes = np.flatnonzero(bkey[1:] != bkey[:-1]) + 1
+    bars = aggregate(ns, price, vol, frame)
+    scanner = _PSARScanner(strat, symbol, ns, price, vol, is_open)
+    pendings: List[Tuple[int, Signal]] = []   # (設定時的 tick index, bar 訊號)
+    a = 0
+    b_ns = pd.DatetimeIndex(bars["ts"]).as_unit("ns").asi8
+    b_o, b_h, b_l, b_c = (bars[c].to_numpy("f8") for c in ("o", "h", "l", "c"))
+    b_v = bars["v"].to_numpy("i8")
+    for k, j in enumerate(closes):
+        scanner.scan(a, j + 1)
+        sig_bar = strat.on_bar(Bar(symbol, int(b_ns[k]), float(b_o[k]), float(b_h[k]), float(b_l[k]), float(b_c[k]), int(b_v[k]), frame))
+        if sig_bar:
+            pendings.append((int(j), sig_bar))
+        a = j + 1
+    scanner.scan(a, n)
+
+    # ---- 2) 帳務階段 ----
+    hour_key = ns // _NS_PER_HOUR * _NS_PER_HOUR
+    first_min_open = np.flatnonzero(is_open & ((ns // _NS_PER_MIN) % 60 == 0))
+    fills: Dict[int, Signal] = {}
+    for q, (j, sig_bar) in enumerate(pendings):
+        p = np.searchsorted(first_min_open, j, side="right")
+        if p == len(first_min_open):
+            continue
+        i = int(first_min_open[p])
+        expire = pendings[q + 1][0] if q + 1 < len(pendings) else n
+        if hour_key[i] == hour_key[j] and i <= expire:
+            fills[i] = Signal(symbol, sig_bar.side, int(sig_bar.qty or 1), note="MC next-bar OPEN fill")
+
+    # 自動平倉 tick：交易日曆的結算時刻表一次 searchsorted
+    auto = set(np.flatnonzero(get_calendar().auto_close_mask(ns)).tolist())
+
+    sq = np.zeros(n, dtype="i8")            # 每筆 tick 處理完後的 side*qty
+    pnl_key: List[int] = []                  # 3*i+1 = 成交呼叫內的損益；3*i+2 = 一般呼叫內的損益
+    pnl_val: List[float] = []
+    main_rec = np.ones(n, dtype=bool)        # 一般呼叫是否寫 equity（FLAT 訊號不寫）
+    main_chg = np.zeros(n, dtype=bool)       # 一般呼叫內部位是否變動（equity resolution="change" 用）
+    mult = engine._mult(symbol)
+    last = 0
+    for i in sorted(set(scanner.signals) | set(fills) | auto):
+        if last < i:
+            sq[last:i] = sq[last - 1] if last else 0
+        t_ts, px = pd.Timestamp(int(ns[i])), float(price[i])
+        for stage, sig in ((1, fills.get(i)), (2, scanner.signals.get(i))):
+            if stage == 1 and sig is None:
+                continue
+            if i in auto:
+                pnl = engine._auto_close(symbol, t_ts, px)
+                if pnl is not None:
+                    pnl_key.append(3 * i + stage); pnl_val.append(pnl)
+                    if stage == 2:
+                        main_chg[i] = True
+            if sig is not None:
+                rec, pnl = engine._apply_signal(symbol, t_ts, px, sig)
+                if pnl is not None:
+                    pnl_key.append(3 * i + stage); pnl_val.append(pnl)
+                if stage == 2:
+                    main_rec[i] = rec
+                    main_chg[i] = True
+        pos = engine.positions.get(symbol, Position())
+        sq[i] = pos.side * pos.qty
+        last = i + 1
+    if last < n:
+        sq[last:] = sq[last - 1] if last else 0
+
+    # mark-to-market：第 i 筆以「上一筆處理完的部位」× 價差；與損益依事件迴圈的相加順序排好後一次 cumsum
+    mtm = np.zeros(n, dtype="f8")
+    mtm[1:] = sq[:-1] * (price[1:] - price[:-1]) * mult
+    keys = np.concatenate([3 * np.arange(n, dtype="i8"), np.asarray(pnl_key, dtype="i8")])
+    vals = np.concatenate([mtm, np.asarray(pnl_val, dtype="f8")])
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    cum = np.cumsum(np.concatenate([[engine.start_cash], vals[order]]))
+    idx = np.arange(n, dtype="i8")
+    after_fill = cum[np.searchsorted(keys, 3 * idx + 1, side="right")]
+    after_main = cum[np.searchsorted(keys, 3 * idx + 2, side="right")]
+
+    # 依呼叫順序（成交呼叫 → 一般呼叫）交給 EquityRecorder；篩選規則與逐筆 record 相同
+    fi = np.fromiter(sorted(fills), dtype="i8", count=len(fills))
+    mi = np.flatnonzero(main_rec)
+    call_key = np.concatenate([2 * fi, 2 * mi + 1])
+    order = np.argsort(call_key, kind="stable")
+    engine.equity_rec.extend(
+        ns[np.concatenate([fi, mi])][order],
+        np.concatenate([after_fill[fi], after_main[mi]])[order],
+        np.concatenate([np.ones(len(fi), dtype=bool), main_chg[mi]])[order],
+    )
+    engine.equity = float(cum[-1])
+    engine.last_close[symbol] = float(price[-1])
+    return int(ns[-1])
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+True Range / ATR（Wilder）：第一根的 TR = h - l；ATR 前 length 根 TR 取算術平均為起點，
+之後 atr += (tr - atr) / length。
+"""
+import numpy as np
+
+from strategy.indicators.base import Indicator, NAN
+
+class ATR(Indicator):
+    __slots__ = ("length", "prev_c", "tr", "tr_sum", "_value")
+
+    def __init__(self, length: int = 14):
+        super().__init__()
+        if length < 1:
+            raise ValueError(f"length 需 >= 1: {length}")
+        self.length = int(length)
+        self.prev_c = NAN
+        self.tr = NAN
+        self.tr_sum = 0.0
+        self._value = NAN
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def update(self, h: float, l: float, c: float) -> float:
+        pc = self.prev_c
+        tr = h - l if self.n == 0 else max(h, pc) - min(l, pc)
+        self.tr, self.prev_c = tr, c
+        self.n += 1
+        if self.n < self.length:
+            self.tr_sum += tr
+        elif self.n == self.length:
+            self._value = (self.tr_sum + tr) / self.length
+        else:
+            self._value += (tr - self._value) / self.length
+        return self._value
+
+    def _bar(self, bar):
+        self.update(bar.h, bar.l, bar.c)
+
+def true_range_batch(h, l, c) -> np.ndarray:
+    h, l, c = (np.asarray(a, dtype="f8") for a in (h, l, c))
+    tr = h - l
+    if len(tr) > 1:
+        pc = c[:-1]
+        tr[1:] = np.maximum(h[1:], pc) - np.minimum(l[1:], pc)
+    return tr
+
+def atr_batch(h, l, c, length: int = 14) -> np.ndarray:
+    """TR 向量化；Wilder 平滑是遞迴，以區域變數迴圈跑（起點同串流版逐筆相加）。"""
+    tr = true_range_batch(h, l, c).tolist()
+    n = int(length)
+    out = np.full(len(tr), NAN)
+    if len(tr) < n:
+        return out
+    s = 0.0
+    for x in tr[:n - 1]:
+        s += x
+    v = (s + tr[n - 1]) / n
+    vals = [v]
+    for x in tr[n:]:
+        v += (x - v) / n
+        vals.append(v)
+    out[n - 1:] = vals
+    return out
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+SMA / EMA。
+SMA 以累積和的差計算（與 np.cumsum 同樣逐筆相加，串流與批次逐位元相同）；
+EMA 以第一筆為起點（同 MultiCharts XAverage），alpha = 2 / (length + 1)。
+"""
+from collections import deque
+import numpy as np
+
+from strategy.indicators.base import Indicator, NAN
+
+class SMA(Indicator):
+    __slots__ = ("length", "cs", "hist", "_value")
+
+    def __init__(self, length: int):
+        super().__init__()
+        if length < 1:
+            raise ValueError(f"length 需 >= 1: {length}")
+        self.length = int(length)
+        self.cs = 0.0
+        self.hist = deque([0.0], maxlen=self.length + 1)   # 最近 length+1 個累積和
+        self._value = NAN
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def update(self, x: float) -> float:
+        self.cs += x
+        self.hist.append(self.cs)
+        self.n += 1
+        if self.n >= self.length:
+            self._value = (self.cs - self.hist[0]) / self.length
+        return self._value
+
+    def _bar(self, bar):
+        self.update(bar.c)
+
+    def on_tick(self, tick):
+        return self.update(tick.price)
+
+def sma_batch(x, length: int) -> np.ndarray:
+    x = np.asarray(x, dtype="f8")
+    out = np.full(len(x), NAN)
+    if len(x) >= length:
+        cs = np.concatenate([[0.0], np.cumsum(x)])
+        out[length - 1:] = (cs[length:] - cs[:-length]) / length
+    return out
+
+class EMA(Indicator):
+    __slots__ = ("length", "alpha", "_value")
+
+    def __init__(self, length: int):
+        super().__init__()
+        if length < 1:
+            raise ValueError(f"length 需 >= 1: {length}")
+        self.length = int(length)
+        self.alpha = 2.0 / (self.length + 1)
+        self._value = NAN
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def update(self, x: float) -> float:
+        self._value = x if self.n == 0 else self._value + self.alpha * (x - self._value)
+        self.n += 1
+        return self._value
+
+    def _bar(self, bar):
+        self.update(bar.c)
+
+    def on_tick(self, tick):
+        return self.update(tick.price)
+
+def ema_batch(x, length: int) -> np.ndarray:
+    """遞迴無法不改運算順序地向量化：以區域變數迴圈跑 float list（不建物件）。"""
+    xs = np.asarray(x, dtype="f8").tolist()
+    if not xs:
+        return np.zeros(0)
+    a = 2.0 / (int(length) + 1)
+    v = xs[0]
+    out = [v]
+    for x in xs[1:]:
+        v = v + a * (x - v)
+        out.append(v)
+    return np.array(out)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+串流指標的共同介面：
+- update(...)：每筆 O(1)（rolling 類為攤銷 O(1)），value 為目前值，未就緒時為 nan
+- on_bar(bar) / on_tick(tick)：從事件取欄位再 update；on_bar 以 bar.ts 去重，多個策略共用同一個（hub）實例
+  各自餵同一根 bar 時只會更新一次。策略私有的實例直接呼叫 update（回測的暖機 bar 可能晚於回放的 bar）
+- snapshot() / restore(state)：__slots__ 狀態 ↔ dict（可直接交給 core.snapshot.dumps / pickle）
+每個指標另有同名的 *_batch 向量化版本（numpy；遞迴型以區域變數迴圈），同一串輸入逐位元相同。
+"""
+import copy
+import math
+from typing import Dict, Tuple
+import numpy as np
+
+NAN = math.nan
+_BAR_COLS = ("ts", "o", "h", "l", "c", "v")
+
+def bar_arrays(bars) -> Tuple[np.ndarray, ...]:
+    """BarBatch（直接取欄位）或 Bar 序列 → (ts, o, h, l, c, v) 陣列，給 *_batch / 暖機用。"""
+    data = getattr(bars, "data", None)
+    if data is not None:
+        return tuple(data[k] for k in _BAR_COLS)
+    bars = list(bars)
+    return tuple(np.fromiter((getattr(b, k) for b in bars), dtype="i8" if k in ("ts", "v") else "f8", count=len(bars))
+                 for k in _BAR_COLS)
+
+class Indicator:
+    __slots__ = ("n", "ts")
+
+    def __init__(self):
+        self.n = 0          # 已餵入筆數
+        self.ts = -1        # 最後一根 bar 的 ts（epoch ns），on_bar 去重用
+
+    @property
+    def value(self) -> float:
+        raise NotImplementedError
+
+    @property
+    def ready(self) -> bool:
+        return not math.isnan(self.value)
+
+    def _bar(self, bar):
+        raise NotImplementedError
+
+    def on_bar(self, bar) -> bool:
+        """回傳是否有更新（同一根或更早的 bar 不重複計算）。"""
+        if bar.ts <= self.ts:
+            return False
+        self.ts = bar.ts
+        self._bar(bar)
+        return True
+
+    def on_tick(self, tick):
+        raise TypeError(f"{type(self).__name__} 只接受 bar")
+
+    @classmethod
+    def _slot_names(cls) -> Tuple[str, ...]:
+        names = []
+        for k in reversed(cls.__mro__):
+            names.extend(k.__dict__.get("__slots__", ()))
+        return tuple(names)
+
+    def snapshot(self) -> Dict[str, object]:
+        return {k: copy.copy(getattr(self, k)) for k in self._slot_names()}
+
+    def restore(self, state: Dict[str, object]) -> "Indicator":
+        for k, v in state.items():
+            setattr(self, k, copy.copy(v))
+        return self
+
+    def __getstate__(self):
+        return self.snapshot()
+
+    def __setstate__(self, state):
+        self.restore(state)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(n={self.n}, value={self.value})"
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+滾動最高 / 最低（最近 length 筆，含本筆）：單調 deque，每筆攤銷 O(1)；未滿 length 筆為 nan。
+on_bar 時 RollingHigh 取 bar.h、RollingLow 取 bar.l。
+"""
+from collections import deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from strategy.indicators.base import Indicator, NAN
+
+class _Rolling(Indicator):
+    __slots__ = ("length", "q", "_value")
+    _sign = 1.0      # 1 = 最高，-1 = 最低
+
+    def __init__(self, length: int):
+        super().__init__()
+        if length < 1:
+            raise ValueError(f"length 需 >= 1: {length}")
+        self.length = int(length)
+        self.q = deque()     # (index, x)，x 單調（最高：遞減；最低：遞增）
+        self._value = NAN
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def update(self, x: float) -> float:
+        q, i = self.q, self.n
+        if self._sign > 0:
+            while q and q[-1][1] <= x:
+                q.pop()
+        else:
+            while q and q[-1][1] >= x:
+                q.pop()
+        q.append((i, x))
+        if q[0][0] <= i - self.length:
+            q.popleft()
+        self.n = i + 1
+        if self.n >= self.length:
+            self._value = q[0][1]
+        return self._value
+
+    def on_tick(self, tick):
+        return self.update(tick.price)
+
+class RollingHigh(_Rolling):
+    __slots__ = ()
+    _sign = 1.0
+
+    def _bar(self, bar):
+        self.update(bar.h)
+
+class RollingLow(_Rolling):
+    __slots__ = ()
+    _sign = -1.0
+
+    def _bar(self, bar):
+        self.update(bar.l)
+
+def _rolling_batch(x, length: int, fn) -> np.ndarray:
+    x = np.asarray(x, dtype="f8")
+    out = np.full(len(x), NAN)
+    if len(x) >= length:
+        out[length - 1:] = fn(sliding_window_view(x, length), axis=1)
+    return out
+
+def rolling_high_batch(x, length: int) -> np.ndarray:
+    return _rolling_batch(x, length, np.max)
+
+def rolling_low_batch(x, length: int) -> np.ndarray:
+    return _rolling_batch(x, length, np.min)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+IndicatorHub：同一個 (種類, 商品, frame, 參數) 只建一個指標實例，多個策略共用。
+- get("ema", "TXF", "1H", length=20)：取得（或建立）共用實例
+- on_bar(bar) / on_tick(tick)：主迴圈在策略之前呼叫一次，依 (bar.symbol, bar.frame) 更新對應指標；
+  frame="tick" 的指標吃 tick（只接受 bar 的種類如 atr / psar 在 get 時就拒絕）。策略自己再餵同一根 bar 也不會重複計算
+  （Indicator.on_bar 以 ts 去重）。
+- snapshot() / restore(state)：整個 hub 的狀態（實盤重啟 / checkpoint 用）
+"""
+from typing import Dict, List, Tuple
+
+from strategy.indicators.atr import ATR
+from strategy.indicators.averages import EMA, SMA
+from strategy.indicators.base import Indicator
+from strategy.indicators.extremes import RollingHigh, RollingLow
+from strategy.indicators.psar import PSAR
+from strategy.indicators.vwap import VWAP
+
+INDICATORS = {
+    "sma": SMA, "ema": EMA, "atr": ATR, "high": RollingHigh, "low": RollingLow, "psar": PSAR, "vwap": VWAP,
+}
+TICK_FRAME = "tick"
+
+Key = Tuple[str, str, str, Tuple[Tuple[str, object], ...]]
+
+class IndicatorHub:
+    def __init__(self):
+        self._ind: Dict[Key, Indicator] = {}
+        self._route: Dict[Tuple[str, str], List[Indicator]] = {}
+
+    @staticmethod
+    def key(kind: str, symbol: str, frame: str, **params) -> Key:
+        return kind.lower(), symbol, frame, tuple(sorted(params.items()))
+
+    def get(self, kind: str, symbol: str, frame: str = "", **params) -> Indicator:
+        k = self.key(kind, symbol, frame, **params)
+        ind = self._ind.get(k)
+        if ind is None:
+            cls = INDICATORS.get(k[0])
+            if cls is None:
+                raise KeyError(f"未知的指標: {kind}（可用：{', '.join(INDICATORS)}）")
+            if frame == TICK_FRAME and cls.on_tick is Indicator.on_tick:
+                raise TypeError(f"{kind} 只接受 bar，不能用 frame={TICK_FRAME!r}")
+            ind = self._add(k, cls(**params))
+        return ind
+
+    def _add(self, k: Key, ind: Indicator) -> Indicator:
+        self._ind[k] = ind
+        self._route.setdefault((k[1], k[2]), []).append(ind)
+        return ind
+
+    def on_bar(self, bar):
+        for ind in self._route.get((bar.symbol, bar.frame), ()):
+            ind.on_bar(bar)
+
+    def on_tick(self, tick):
+        for ind in self._route.get((tick.symbol, TICK_FRAME), ()):
+            ind.on_tick(tick)
+
+    def warmup(self, bars):
+        for b in bars:
+            self.on_bar(b)
+
+    def __len__(self):
+        return len(self._ind)
+
+    def snapshot(self) -> dict:
+        return {k: ind.snapshot() for k, ind in self._ind.items()}
+
+    def restore(self, state: dict) -> "IndicatorHub":
+        """已存在的實例就地還原（策略手上的參照仍有效），其餘新建。"""
+        for k, st in state.items():
+            ind = self._ind.get(k)
+            if ind is None:
+                ind = self._add(k, INDICATORS[k[0]](**dict(k[3])))
+            ind.restore(st)
+        return self
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Parabolic SAR（逐 bar）：第一根 bar 決定起始方向（c >= o 做多），之後每根 bar：
+sar_next = sar + af * (ep - sar)，並夾在前一根與本根的低點（多）/ 高點（空）之外；
+創新極值 af += af0（上限 af_max），價格穿越 sar 則反轉（sar = ep，ep = 本根極值，af = af0）。
+reverse(price) 為策略層的 tick 反轉（只改方向 / ep / af，sar 不變）；會改狀態的策略應自己持有實例，不放 hub 共用。
+"""
+import numpy as np
+
+from strategy.indicators.base import Indicator, NAN, bar_arrays
+
+class PSAR(Indicator):
+    __slots__ = ("af0", "afmax", "trend", "sar", "ep", "af", "ph", "pl")   # trend: 1=long, -1=short
+
+    def __init__(self, af: float = 0.02, af_max: float = 0.2):
+        super().__init__()
+        self.af0 = float(af)
+        self.afmax = float(af_max)
+        self.trend = 0
+        self.sar = self.ep = NAN
+        self.af = self.af0
+        self.ph = self.pl = NAN     # 前一根 bar 的高 / 低
+
+    @property
+    def value(self) -> float:
+        return self.sar
+
+    def seed(self, o: float, h: float, l: float, c: float):
+        self.trend = 1 if c >= o else -1
+        self.ep = h if self.trend > 0 else l
+        self.sar = l if self.trend > 0 else h
+        self.af = self.af0
+        self.ph, self.pl = h, l
+        self.n = 1
+
+    def update(self, h: float, l: float) -> bool:
+        """回傳這根 bar 是否反轉。"""
+        sar_next = self.sar + self.af * (self.ep - self.sar)
+        if self.trend > 0:
+            sar_next = min(sar_next, self.pl, l)
+            if h > self.ep:
+                self.ep = h
+                self.af = min(self.afmax, self.af + self.af0)
+            flipped = l <= sar_next
+            if flipped:
+                self.trend = -1
+                self.sar = self.ep
+                self.ep = l
+                self.af = self.af0
+            else:
+                self.sar = sar_next
+        else:
+            sar_next = max(sar_next, self.ph, h)
+            if l < self.ep:
+                self.ep = l
+                self.af = min(self.afmax, self.af + self.af0)
+            flipped = h >= sar_next
+            if flipped:
+                self.trend = 1
+                self.sar = self.ep
+                self.ep = h
+                self.af = self.af0
+            else:
+                self.sar = sar_next
+        self.ph, self.pl = h, l
+        self.n += 1
+        return flipped
+
+    def crossed(self, price: float) -> bool:
+        return (self.trend > 0 and price <= self.sar) or (self.trend < 0 and price >= self.sar)
+
+    def reverse(self, price: float):
+        self.trend = -self.trend
+        self.af = self.af0
+        self.ep = price
+
+    def warm(self, bars) -> "PSAR":
+        """整段歷史 bar（BarBatch 或 Bar 序列）一次跑批次 kernel，狀態等同逐根 on_bar；之後的 bar 接著串流更新。"""
+        ts, o, h, l, c, _ = bar_arrays(bars)
+        if not len(ts):
+            return self
+        _, _, st = _kernel(o, h, l, c, self.af0, self.afmax)
+        self.restore(st)
+        self.ts = int(ts[-1])
+        return self
+
+    def _bar(self, bar):
+        if self.n == 0:
+            self.seed(bar.o, bar.h, bar.l, bar.c)
+        else:
+            self.update(bar.h, bar.l)
+
+def _kernel(o, h, l, c, af0: float, afmax: float):
+    """逐根 PSAR 的區域變數迴圈（float list，不建 Bar / 指標物件）：回傳 (sar list, trend list, 最後狀態)。"""
+    o, h, l, c = (np.asarray(a, dtype="f8").tolist() for a in (o, h, l, c))
+    n = len(h)
+    if not n:
+        return [], [], None
+    trend = 1 if c[0] >= o[0] else -1
+    ep = h[0] if trend > 0 else l[0]
+    sar = l[0] if trend > 0 else h[0]
+    a = af0
+    ph, pl = h[0], l[0]
+    sars, trends = [sar], [trend]
+    for i in range(1, n):
+        hi, lo = h[i], l[i]
+        nxt = sar + a * (ep - sar)
+        if trend > 0:
+            nxt = min(nxt, pl, lo)
+            if hi > ep:
+                ep = hi
+                a = min(afmax, a + af0)
+            if lo <= nxt:
+                trend, sar, ep, a = -1, ep, lo, af0
+            else:
+                sar = nxt
+        else:
+            nxt = max(nxt, ph, hi)
+            if lo < ep:
+                ep = lo
+                a = min(afmax, a + af0)
+            if hi >= nxt:
+                trend, sar, ep, a = 1, ep, hi, af0
+            else:
+                sar = nxt
+        ph, pl = hi, lo
+        sars.append(sar)
+        trends.append(trend)
+    return sars, trends, {"trend": trend, "sar": sar, "ep": ep, "af": a, "ph": ph, "pl": pl, "n": n}
+
+def psar_batch(o, h, l, c, af: float = 0.02, af_max: float = 0.2):
+    """回傳 (sar, trend) 陣列（每根 bar 更新後的值）；與逐根 PSAR.on_bar 逐位元相同。"""
+    sars, trends, _ = _kernel(o, h, l, c, float(af), float(af_max))
+    return np.array(sars, dtype="f8"), np.array(trends, dtype="i1")
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+時段 VWAP：每個交易時段（交易日曆的 open_ns / close_ns；夜盤自成一段）開始時歸零。
+tick 以成交價、bar 以典型價 (h + l + c) / 3 加權；時段內尚無成交量時為 nan。
+時段外的 tick 歸到下一個時段（與 TradingCalendar.trading_date 相同規則）。
+"""
+import numpy as np
+
+from strategy.core.calendar import get_calendar
+from strategy.indicators.base import Indicator, NAN
+
+class VWAP(Indicator):
+    __slots__ = ("pv", "v", "close_ns")
+
+    def __init__(self):
+        super().__init__()
+        self.pv = 0.0
+        self.v = 0
+        self.close_ns = -1       # 目前時段的收盤（ns）；超過即換段
+
+    @property
+    def value(self) -> float:
+        return self.pv / self.v if self.v else NAN
+
+    def _roll(self, ns: int):
+        cal = get_calendar()
+        i = int(np.searchsorted(cal.close_ns, ns, side="left"))
+        self.close_ns = int(cal.close_ns[i]) if i < len(cal.close_ns) else 2**63 - 1
+        self.pv, self.v = 0.0, 0
+
+    def update(self, ns: int, price: float, vol: int) -> float:
+        if ns > self.close_ns:
+            self._roll(ns)
+        self.pv += price * vol
+        self.v += vol
+        self.n += 1
+        return self.value
+
+    def _bar(self, bar):
+        self.update(bar.ts, (bar.h + bar.l + bar.c) / 3.0, bar.v)
+
+    def on_tick(self, tick):
+        return self.update(tick.ts, tick.price, tick.vol)
+
+def vwap_batch(ns, price, vol) -> np.ndarray:
+    """每段各自 cumsum（從 0 逐筆相加，與串流版相同）。"""
+    ns = np.asarray(ns, dtype="i8")
+    pv = np.asarray(price, dtype="f8") * np.asarray(vol, dtype="i8")
+    vol = np.asarray(vol, dtype="i8")
+    out = np.full(len(ns), NAN)
+    if not len(ns):
+        return out
+    sess = np.searchsorted(get_calendar().close_ns, ns, side="left")
+    cuts = np.flatnonzero(sess[1:] != sess[:-1]) + 1
+    for a, b in zip(np.r_[0, cuts], np.r_[cuts, len(ns)]):
+        cv = np.cumsum(vol[a:b])
+        cpv = np.cumsum(pv[a:b])
+        ok = cv != 0
+        out[a:b][ok] = cpv[ok] / cv[ok]
+    return out
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+from datetime import time as dtime
+import pytz
+
+from strategy.config import TIMEZONE
+
+log = logging.getLogger("BarScheduler")
+_NS = 1_000_000_000
+_EPOCH = datetime(1970, 1, 1)
+
+def exchange_now_ns(tz=None) -> int:
+    """交易所當地時間（naive，與 tick.ts 同基準）的 epoch ns。"""
+    now = datetime.now(tz or pytz.timezone(TIMEZONE)).replace(tzinfo=None)
+    return (now - _EPOCH) // timedelta(microseconds=1) * 1000
+
+class BarCloseScheduler:
+    """
+    時鐘驅動的 bar 封口：
+    - 每個 bar 邊界（step）+ grace 觸發一次
+    - 交易時段結束（SESSION 的 end）+ grace 也觸發，讓收盤那根不必等下一個交易時段的 tick
+    fire() 回傳要交給 BarBuilder.pop_closed_bars 的 now_key（ns）。
+    """
+    def __init__(self, step_ns: int, grace_sec: float = 1.0, sessions: Sequence[Tuple[dtime, dtime]] = ()):
+        self.step = int(step_ns)
+        self.grace = int(grace_sec * _NS)
+        self.session_ends = [e.hour * 3600 * _NS + e.minute * 60 * _NS + e.second * _NS for _, e in sessions]
+        self.next_ns: Optional[int] = None
+        self.next_key: Optional[int] = None
+
+    def _plan(self, now_ns: int):
+        """找 now 之後最近的觸發點（bar 邊界或 session 結束）。"""
+        boundary = (now_ns - self.grace) // self.step * self.step + self.step
+        key, at = boundary, boundary
+        day = now_ns // (86400 * _NS) * (86400 * _NS)
+        for off in self.session_ends:
+            for d in (day - 86400 * _NS, day, day + 86400 * _NS):
+                end = d + off
+                if now_ns - self.grace < end < at:
+                    # session 結束時把 now_key 推到所在 bar 的結尾，整根封口
+                    key, at = -(-end // self.step) * self.step, end
+        self.next_ns, self.next_key = at + self.grace, key
+
+    def seconds_until_due(self, now_ns: int) -> float:
+        if self.next_ns is None:
+            self._plan(now_ns)
+        return max(0.0, (self.next_ns - now_ns) / _NS)
+
+    def fire(self, now_ns: int) -> Optional[int]:
+        """到點就回傳 now_key 並排下一次；未到點回傳 None。"""
+        if self.next_ns is None:
+            self._plan(now_ns)
+        if now_ns < self.next_ns:
+            return None
+        key = self.next_key
+        self._plan(now_ns)
+        return key
+
+def log_late_tick(tick, bar_key_ns: int):
+    """BarBuilder.on_late：所屬 bar 已被時鐘封口的 tick，明確記錄（策略的 tick 級邏輯已處理過這筆）。"""
+    log.warning("[LATE] %s ts=%s price=%s vol=%s 所屬 bar(%s) 已封口，未併入 bar",
+                tick.symbol, _EPOCH + timedelta(microseconds=tick.ts // 1000), tick.price, tick.vol,
+                _EPOCH + timedelta(microseconds=bar_key_ns // 1000))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+多策略宿主：config.STRATEGIES 的每一項以 registry.load_strategy 載入（各自的參數與商品），
+共用同一條 tick 串流、同一個 BarBuilder（各策略 frames 的聯集）與同一個 IndicatorHub。
+對 live_loop 而言 StrategyHost 就是一個策略：
+- on_tick：先更新 hub 的 tick 指標，再依商品分派給訂閱的策略
+- on_bar：先更新 hub，再依 (商品, frame) 分派
+- 回傳 None（無訊號）或訊號 list；訊號 note 前加 [策略 id]
+各策略在同一商品上的下單共用券商的淨部位（FLAT 依淨部位平倉），要分開管部位請用不同商品或不同帳戶。
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from strategy.config import BAR_FRAME, SYMBOLS
+from strategy.core.registry import load_strategy
+from strategy.indicators.hub import IndicatorHub
+
+class HostedStrategy:
+    __slots__ = ("id", "name", "strat", "symbols", "frames")
+
+    def __init__(self, id: str, name: str, strat, symbols: Sequence[str], frames: Sequence[str]):
+        self.id, self.name, self.strat = id, name, strat
+        self.symbols, self.frames = list(symbols), list(frames)
+
+def _tag(h: HostedStrategy, sig):
+    sig.note = f"[{h.id}] {sig.note}" if sig.note else f"[{h.id}]"
+    return sig
+
+class StrategyHost:
+    def __init__(self, specs: Sequence[dict], hub: Optional[IndicatorHub] = None):
+        if not specs:
+            raise ValueError("STRATEGIES 是空的")
+        self.hub = hub or IndicatorHub()
+        self.hosted: List[HostedStrategy] = []
+        for i, spec in enumerate(specs):
+            name = spec["name"]
+            sid = spec.get("id") or f"{name}#{i}"
+            if any(h.id == sid for h in self.hosted):
+                raise ValueError(f"策略 id 重複: {sid}")
+            strat = load_strategy(name, dict(spec.get("params") or {}))
+            strat.hub = self.hub
+            self.hosted.append(HostedStrategy(sid, name, strat, spec.get("symbols") or SYMBOLS,
+                                              strat.frames or [BAR_FRAME]))
+        self.symbols: List[str] = list(dict.fromkeys(s for h in self.hosted for s in h.symbols))
+        self.frames: List[str] = list(dict.fromkeys(f for h in self.hosted for f in h.frames))
+        self._tick_route: Dict[str, List[HostedStrategy]] = {
+            s: [h for h in self.hosted if s in h.symbols] for s in self.symbols}
+        self._bar_route: Dict[Tuple[str, str], List[HostedStrategy]] = {
+            (s, f): [h for h in self.hosted if s in h.symbols and f in h.frames] for s in self.symbols for f in self.frames}
+
+    def on_start(self, symbols: List[str], warmup_bars) -> None:
+        for h in self.hosted:
+            h.strat.on_start(h.symbols, {s: warmup_bars.get(s, []) for s in h.symbols})
+        # 策略 on_start 時向 hub 要的指標，沒被策略自己餵過的在這裡補暖機（已餵過的 bar 會被去重）
+        if len(self.hub):
+            for s in self.symbols:
+                self.hub.warmup(warmup_bars.get(s, []))
+
+    def on_tick(self, tick) -> Optional[list]:
+        self.hub.on_tick(tick)
+        out = None
+        for h in self._tick_route.get(tick.symbol, ()):
+            sig = h.strat.on_tick(tick)
+            if sig:
+                out = out or []
+                out.append(_tag(h, sig))
+        return out
+
+    def on_bar(self, bar) -> Optional[list]:
+        self.hub.on_bar(bar)
+        out = None
+        for h in self._bar_route.get((bar.symbol, bar.frame), ()):
+            sig = h.strat.on_bar(bar)
+            if sig:
+                out = out or []
+                out.append(_tag(h, sig))
+        return out
+
+    def sync_positions(self, net: Dict[str, int], price: Dict[str, float]) -> None:
+        """net / price：各商品券商淨部位與現價；同商品的策略共用淨部位（見模組說明）。"""
+        for h in self.hosted:
+            for s in h.symbols:
+                if s in net and s in price:
+                    h.strat.sync_position(s, net[s], price[s])
+
+    def on_stop(self) -> None:
+        for h in self.hosted:
+            h.strat.on_stop()
+
+    def describe(self) -> str:
+        return "; ".join(f"{h.id}={h.name}({','.join(h.symbols)} / {','.join(h.frames)})" for h in self.hosted)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+實盤狀態快照（重啟時不必重新暖機）：
+- 內容：策略物件（PSAR / 風控的 entry、peak、trough…）、BarBuilder（未封口的 bar 與 ring）、主迴圈的
+  pending_orders / 分鐘首筆紀錄，以及最後處理的 tick 時間（另記每商品最後 ts 與該 ts 已處理筆數，
+  補播時同一 ts 的其餘 tick 不會被略過）；格式同 core.snapshot（帶版本的 zlib(pickle)）
+- 熱路徑只做 pickle（每 LIVE_SNAPSHOT_EVERY_SEC 秒一次），壓縮與寫入在背景 thread；寫入中又有新快照時只留最新的
+- 存放：本機檔案（原子 rename）或 Redis key
+"""
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import redis
+
+from strategy.config import REDIS_HOST, REDIS_PORT, REDIS_DB
+from strategy.core.snapshot import SnapshotError, capture, loads, pack, write_file
+
+log = logging.getLogger("LiveState")
+
+class FileBackend:
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def save(self, blob: bytes):
+        write_file(self.path, blob)
+
+    def load(self) -> Optional[bytes]:
+        return self.path.read_bytes() if self.path.exists() else None
+
+    def __str__(self):
+        return str(self.path)
+
+class RedisBackend:
+    def __init__(self, key: str, client=None):
+        self.key = key
+        self.r = client or redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+
+    def save(self, blob: bytes):
+        self.r.set(self.key, blob)
+
+    def load(self) -> Optional[bytes]:
+        return self.r.get(self.key)
+
+    def __str__(self):
+        return f"redis:{self.key}"
+
+def open_backend(kind: str, path: str, redis_key: str):
+    """kind：'file' / 'redis'；空字串 = 不做快照。"""
+    if not kind:
+        return None
+    if kind == "file":
+        return FileBackend(path)
+    if kind == "redis":
+        return RedisBackend(redis_key)
+    raise ValueError(f"不支援的快照存放方式: {kind}")
+
+def load_latest(backend, key: str) -> Optional[Dict[str, Any]]:
+    """讀最新快照；沒有、讀不出來或設定（key）不同都回傳 None，呼叫端改走一般暖機。"""
+    if backend is None:
+        return None
+    try:
+        blob = backend.load()
+        if blob is None:
+            return None
+        state = loads(blob)
+    except (OSError, redis.RedisError, SnapshotError) as e:
+        log.warning("快照讀取失敗（%s）：%s", backend, e)
+        return None
+    if state.get("key") != key:
+        log.warning("快照設定不同（%s != %s），不還原", state.get("key"), key)
+        return None
+    return state
+
+Position = Dict[str, Tuple[int, int]]
+
+def advance(pos: Position, t):
+    """pos[symbol] = (最後處理的 tick ts, 該 ts 已處理筆數)。"""
+    p = pos.get(t.symbol)
+    pos[t.symbol] = (t.ts, p[1] + 1 if p is not None and p[0] == t.ts else 1)
+
+class SnapshotWriter:
+    """
+    每 every_sec 秒把 objs（策略 / BarBuilder / 迴圈狀態）連同最後 tick 時間與各商品位置（pos）拍一次快照。
+    on_tick(t) 當 live_loop 的 on_tick_done；close() 停止前再同步寫一次。
+    pos：還原 + 補播後的各商品位置（catch_up 的回傳值），之後的快照接著記。
+    """
+    def __init__(self, backend, key: str, objs: Dict[str, Any], every_sec: float = 5.0, pos: Optional[Position] = None):
+        self.backend, self.key, self.objs = backend, key, objs
+        self.every = float(every_sec)
+        self.next_due = time.monotonic() + self.every
+        self.pos: Position = dict(pos or {})
+        self.last_ts: Optional[int] = max((p[0] for p in self.pos.values()), default=None)
+        self.saved = 0
+        self._raw: Optional[bytes] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+        self._thread.start()
+
+    def capture(self):
+        raw = capture({"key": self.key, "ts": self.last_ts, "pos": dict(self.pos), "saved_at": time.time(), **self.objs})
+        with self._lock:
+            self._raw = raw
+        self._wake.set()
+
+    def on_tick(self, t):
+        self.last_ts = t.ts
+        advance(self.pos, t)
+        now = time.monotonic()
+        if now >= self.next_due:
+            self.next_due = now + self.every
+            self.capture()
+
+    def _write_pending(self):
+        with self._lock:
+            raw, self._raw = self._raw, None
+        if raw is None:
+            return
+        try:
+            self.backend.save(pack(raw))
+            self.saved += 1
+        except Exception as e:
+            log.warning("快照寫入失敗（%s）：%s", self.backend, e)
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait()
+            self._wake.clear()
+            self._write_pending()
+
+    def close(self):
+        if self.last_ts is not None:
+            self.capture()
+        self._stop = True
+        self._wake.set()
+        self._thread.join(timeout=10)
+        self._write_pending()
@@ -1,31 +1,32 @@
 # -*- coding: utf-8 -*-
 from pathlib import Path
+from typing import Iterator, Optional
 import argparse
+import cProfile
+import heapq
+import itertools
+import pstats
+import numpy as np
 import pandas as pd
 
-from strategy.config import SYMBOLS, STRATEGY, STRATEGY_PARAMS, FEED_FRAME, BAR_FRAME
+from strategy.config import SYMBOLS, STRATEGY, STRATEGY_PARAMS, FEED_FRAME, BAR_FRAME, WARMUP_HOURS
 from strategy.core.registry import load_strategy
-from strategy.core.events import Tick
+from strategy.core.events import Tick, Signal, TickBatch, BarBatch
 from strategy.core.barbuilder import BarBuilder
 from strategy.core.backtester import BacktestEngine
-from strategy.storage.mysql import load_history, load_hourly_from_ticks
-
-# ---- 本檔內部補一個最基本的 Bar 類別（避免 NameError；簽名需與現有呼叫一致）----
-class Bar:
-    def __init__(self, symbol, ts, o, h, l, c, v=0):
-        self.symbol = symbol  # 商品代號：MXF / TXF
-        self.ts = ts          # pandas.Timestamp
-        self.o = float(o)     # 開
-        self.h = float(h)     # 高
-        self.l = float(l)     # 低
-        self.c = float(c)     # 收
-        self.v = int(v)       # 量
-
-    def __repr__(self):
-        return f"Bar({self.symbol}, {self.ts}, O:{self.o}, H:{self.h}, L:{self.l}, C:{self.c}, V:{self.v})"
-# -------------------------------------------------------------------------
+from strategy.core.contracts import contract_spec
+from strategy.core.equity import RESOLUTIONS
+from strategy.core.montecarlo import METHODS as MC_METHODS, report as mc_report
+from strategy.core.profiling import StageProfiler, stage
+from strategy.core.snapshot import CheckpointStore, config_key
+from strategy.core.vector_engine import run_psar_vectorized
+from strategy.storage.bar_cache import load_recent
+from strategy.storage.mysql import load_history, iter_history
+from strategy.storage.tick_cache import iter_tick_batches
 
 OUT_DIR = Path("backtest_out")
+_NS_PER_MIN = 60 * 1_000_000_000
+_NS_PER_HOUR = 60 * _NS_PER_MIN
 
 # MultiCharts 同步：bar 訊號於下一小時「第一分鐘的 open tick」成交
 MC_NEXT_BAR_FILL = True
@@ -33,124 +34,200 @@ MC_NEXT_BAR_FILL = True
 def is_first_minute_open_tick(tick: Tick) -> bool:
     """此回測中，我們以「雙 tick（open→close）」近似 intrabar；
     其中 open tick 由 Tick.is_open=True 標示（在 events.Tick 已新增 is_open）。"""
-    return getattr(tick, "is_open", False) and tick.ts.minute == 0
+    return tick.is_open and tick.ts // _NS_PER_MIN % 60 == 0
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--symbol", default="MXF", help="個別商品（TXF 或 MXF），預設 MXF")
-    parser.add_argument("--limit", type=int, default=120000, help="每商品讀取 1min 筆數上限")
-    parser.add_argument("--start", type=str, default=None, help="回測開始時間，例如 2025-07-01 08:45")
-    parser.add_argument("--end", type=str, default=None, help="回測結束時間，例如 2025-08-01 13:45")
-    args = parser.parse_args()
-    single_symbol = args.symbol.upper()
-    global SYMBOLS
-    SYMBOLS = [single_symbol]
-    global OUT_DIR
-    OUT_DIR = OUT_DIR / single_symbol.lower()
-    if args.start or args.end:
-        def _san(s):
-            return (s or "NA").replace(":", "").replace(" ", "").replace("-", "")
-        OUT_DIR = OUT_DIR / f"{_san(args.start)}_{_san(args.end)}"
-    print(f"[BT] 回測標的: {single_symbol} | 期間: {args.start or '(未指定)'} → {args.end or '(未指定)'}")
-
-    # 讀 1 分鐘 K（近似 tick；可在 storage 設 only_day=True 過濾日盤）
-    data_1m = {s: load_history(s, limit_bars=args.limit, frame=FEED_FRAME, start_ts=args.start, end_ts=args.end) for s in SYMBOLS}
-
-    # 策略 + 回測引擎
-    strat = load_strategy(STRATEGY, STRATEGY_PARAMS)
-    engine = BacktestEngine(start_cash=1_000_000)
-
-    # 小時K聚合器
-    hour_builder = BarBuilder(frame=BAR_FRAME)
-    last_key = {}
-
-    # ---- 暖機：最近 200 根 1H Bars，餵給策略初始化（PSAR 需要歷史序列）----
-    warmup_1h = {s: [] for s in SYMBOLS}
-    for s in SYMBOLS:
-        _dfh = load_hourly_from_ticks(s, hours=200)
-        warmup_1h[s] = [Bar(s, r.ts, r.o, r.h, r.l, r.c, int(getattr(r, 'v', 0))) for r in _dfh.itertuples()]
-    strat.on_start(SYMBOLS, warmup_1h)
-    # -----------------------------------------------------------------------
-
-    # 準備 tick 串列（雙 tick：先 minute open，再 minute close），較貼近 MC 的 intrabar 行為
-    ticks = []
-    for s, df in data_1m.items():
-        for r in df.itertuples():
-            # 先 minute open
-            ticks.append(Tick(s, r.ts, float(r.o), int(getattr(r, 'v', 0)), is_open=True))
-            # 再 minute close
-            ticks.append(Tick(s, r.ts, float(r.c), int(getattr(r, 'v', 0)), is_open=False))
-    # 保證 open tick 先於 close tick
-    ticks.sort(key=lambda t: (t.ts, t.symbol, 0 if getattr(t, "is_open", False) else 1))
-
-    # MC 模式：儲存「待成交的 bar 訊號」
-    # pending_orders[symbol] = {"side": "BUY"/"SELL", "qty": int, "activate_key": hour_key}
-    pending_orders = {s: None for s in SYMBOLS}
+def load_warmup(symbols, end_ts: Optional[str], hours: int = WARMUP_HOURS):
+    """暖機：回測起點 end_ts 之前最近 hours 根 1H K（0 = 全部歷史；經 bar_cache 快取），以 BarBatch 餵給策略初始化（PSAR 需要歷史序列）。
+    只取 end_ts 之前的 bar，不偷看回測區間；end_ts=None 時回測從資料開頭回放、沒有更早的歷史，
+    照舊取最新的 hours 根（會與回測區間重疊，要避免請指定 --start）。"""
+    return {s: BarBatch.from_df(s, load_recent(s, BAR_FRAME, hours, end_ts=end_ts), BAR_FRAME) for s in symbols}
+
+def minute_ticks(symbol: str, src) -> Iterator[Tick]:
+    """
+    單一商品 1 分鐘 K → 雙 tick 串流（先 minute open，再 minute close），較貼近 MC 的 intrabar 行為。
+    src 可為整段 DataFrame，或依時間遞增的 DataFrame 分段（storage.mysql.iter_history）；逐筆產生，不建整包 list。
+    分段也可以是原始逐筆的 TickBatch（storage.tick_cache.iter_tick_batches），此時直接回放真實 tick。
+    """
+    for df in ([src] if isinstance(src, pd.DataFrame) else src):
+        if isinstance(df, TickBatch):
+            yield from df
+            continue
+        if df is None or df.empty:
+            continue
+        if not df["ts"].is_monotonic_increasing:
+            df = df.sort_values("ts", kind="stable")
+        yield from TickBatch.from_minutes(symbol, df)
+
+def rows_from(src, ts: pd.Timestamp):
+    """1min K（整段 DataFrame 或分段 iterator）只留 ts 之後（含）的列；續跑時略過 checkpoint 之前的資料。"""
+    if isinstance(src, pd.DataFrame):
+        return src[src["ts"] >= ts]
+    return (df[df["ts"] >= ts] for df in src)
+
+def tick_order(t: Tick):
+    """合併串流的排序鍵（同 ts：依商品、open 先於 close）；checkpoint 也以此記錄續跑位置。"""
+    return (t.ts, t.symbol, 0 if t.is_open else 1)
+
+def merged_ticks(data_1m, prof: Optional[StageProfiler] = None) -> Iterator[Tick]:
+    """多商品 tick 串流合併：各自已排序，heapq.merge 為 O(n log k)，不必整包 sort。
+    prof：分段計時（延遲讀取的資料分段 → sql、tick 建立 → ticks、合併 → merge）。"""
+    if prof is not None:
+        data_1m = {s: src if src is None or isinstance(src, pd.DataFrame) else prof.iterate(src, "sql")
+                   for s, src in data_1m.items()}
+    streams = [minute_ticks(s, src) for s, src in data_1m.items() if src is not None]
+    if prof is not None:
+        streams = [prof.iterate(st, "ticks") for st in streams]
+    merged = streams[0] if len(streams) == 1 else heapq.merge(*streams, key=tick_order)
+    return prof.iterate(merged, "merge") if prof is not None else merged
+
+def replay(strat, engine, data_1m, ckpt: Optional[CheckpointStore] = None, ckpt_every: int = 0,
+           resume: Optional[dict] = None, prof: Optional[StageProfiler] = None):
+    """
+    逐「近似 tick」事件迴圈回放；回傳最後一筆 tick 的時間（無資料回傳 None）。
+    ckpt / ckpt_every：每 ckpt_every 根 bar（最小 frame）在跨入新 bar 的 tick 處理前存一份 checkpoint；
+    resume：CheckpointStore.latest() 的內容（strat / engine 由呼叫端取出），從記錄的 tick 接著回放。
+    prof：--profile 時把策略 / 引擎 / BarBuilder 呼叫與 tick 串流各自計時。
+    """
+    if resume is None:
+        # 小時K聚合器（策略可訂閱多個 frame；每個 tick 只處理一次，封口 bar 以 Bar.frame 標記）
+        hour_builder = BarBuilder(frames=list(strat.frames or [BAR_FRAME]))
+        # MC 模式：儲存「待成交的 bar 訊號」
+        # pending_orders[symbol] = {"side": "BUY"/"SELL", "qty": int, "activate_key": hour_key}
+        pending_orders = {s: None for s in data_1m}
+        n_bars = 0
+    else:
+        hour_builder, pending_orders, n_bars = resume["builder"], resume["pending"], resume["bars"]
+
+    # 各商品已依時間排序的雙 tick 串流，以 heap 做 k-way merge（同 ts：依商品、open 先於 close）
+    ticks = merged_ticks(data_1m, prof)
+    if resume is not None:
+        pos = resume["pos"]
+        ticks = itertools.dropwhile(lambda t: tick_order(t) < pos, ticks)
+
+    step = hour_builder.step or _NS_PER_HOUR
+    bucket = None
+    # 同 StrategyHost：只把策略訂閱的 frame 送進 on_bar（還原的 BarBuilder 可能多聚合別的 frame）
+    route = frozenset(strat.frames or [BAR_FRAME])
+
+    strat_on_tick, strat_on_bar, builder_on_tick = strat.on_tick, strat.on_bar, hour_builder.on_tick
+    engine_on_tick, engine_on_bar_signal = engine.on_tick, engine.on_bar_signal
+    if prof is not None:
+        strat_on_tick, strat_on_bar = prof.wrap(strat_on_tick, "strategy"), prof.wrap(strat_on_bar, "strategy_bar")
+        builder_on_tick = prof.wrap(builder_on_tick, "barbuilder")
+        engine_on_tick, engine_on_bar_signal = prof.wrap(engine_on_tick, "engine"), prof.wrap(engine_on_bar_signal, "engine")
 
     # 逐「近似 tick」回放
+    t = None
     for t in ticks:
+        # --- checkpoint：此 tick 跨入新 bar，之前的 tick 都屬於較早的 bar（ts 較小），狀態可從這裡接續 ---
+        if ckpt is not None and t.ts // step != bucket:
+            if bucket is not None:
+                n_bars += 1
+                if n_bars % ckpt_every == 0:
+                    ckpt.save(t.ts, {"strat": strat, "engine": engine, "builder": hour_builder,
+                                     "pending": pending_orders, "bars": n_bars, "pos": tick_order(t),
+                                     "from_ns": t.ts // step * step})
+            bucket = t.ts // step
+
         # --- 先處理 MC 的「下一小時第一分鐘 open」成交 ---
         if MC_NEXT_BAR_FILL:
-            key_first_min_of_hour = t.ts.replace(minute=0, second=0, microsecond=0)
+            key_first_min_of_hour = t.ts // _NS_PER_HOUR * _NS_PER_HOUR
             po = pending_orders.get(t.symbol)
             if po is not None and po.get("activate_key") == key_first_min_of_hour and is_first_minute_open_tick(t):
                 side = po["side"]
                 qty = int(po["qty"] or 1)
-                from strategy.core.events import Signal
                 sig = Signal(t.symbol, side, qty, note="MC next-bar OPEN fill")
-                engine.on_tick(t, sig)   # 以此 open tick 價成交
+                engine_on_tick(t, sig)   # 以此 open tick 價成交
                 pending_orders[t.symbol] = None  # 清空待成交
 
         # --- tick 級：即時判斷（PSAR flip/tick 等） ---
-        sig_tick = strat.on_tick(t)
-        engine.on_tick(t, sig_tick)
-
-        # --- 小時聚合：封口才做 on_bar（PSAR flip/bar） ---
-        hour_builder.on_tick(t)
-        key = t.ts.replace(minute=0, second=0, microsecond=0)
-        last = last_key.get(t.symbol)
-
-        if last is not None and key > last:
-            # 代表上一小時剛封口：取出上一小時的 bar
-            closed = hour_builder.pop_closed_bars(t.symbol, key)
-            for b in closed:
-                sig_bar = strat.on_bar(b)
-                if MC_NEXT_BAR_FILL and sig_bar:
-                    # 安排到「下一小時第一分鐘 open」成交（activate_key = 新小時 key）
-                    pending_orders[t.symbol] = {
-                        "side": sig_bar.side,
-                        "qty": int(sig_bar.qty or 1),
-                        "activate_key": key
-                    }
-                else:
-                    # 非 MC 模式：直接用 bar 收盤成交
-                    engine.on_bar_signal(b, sig_bar)
-
-        last_key[t.symbol] = key
+        sig_tick = strat_on_tick(t)
+        engine_on_tick(t, sig_tick)
+
+        # --- 小時聚合：封口才做 on_bar（PSAR flip/bar）；此 tick 跨入新小時時 builder 立即回傳上一小時 bar ---
+        for b in builder_on_tick(t):
+            if b.frame not in route:
+                continue
+            sig_bar = strat_on_bar(b)
+            if MC_NEXT_BAR_FILL and sig_bar:
+                # 安排到「下一小時第一分鐘 open」成交（activate_key = 新小時 key）
+                pending_orders[t.symbol] = {
+                    "side": sig_bar.side,
+                    "qty": int(sig_bar.qty or 1),
+                    "activate_key": t.ts // _NS_PER_HOUR * _NS_PER_HOUR
+                }
+            else:
+                # 非 MC 模式：直接用 bar 收盤成交
+                engine_on_bar_signal(b, sig_bar)
 
+    if prof is not None:
+        prof.count("ticks", prof.calls.get("merge", 1) - 1)
+        prof.count("bars", prof.calls.get("strategy_bar", 0))
+    return t.ts if t is not None else None
+
+def run_engine(mode: str, data_1m, warmup_1h, params, ckpt: Optional[CheckpointStore] = None, ckpt_every: int = 0,
+               resume: Optional[dict] = None, prof: Optional[StageProfiler] = None, **engine_kw) -> dict:
+    """建立策略 + 回測引擎，以 event 或 vector 模式跑完並結算，回傳 BacktestEngine.results()。
+    engine_kw 直接傳給 BacktestEngine（equity_resolution / equity_max_rows / equity_spill_dir）。
+    ckpt / ckpt_every / resume 見 replay（僅 event 模式）；resume 時策略與引擎直接取自 checkpoint。
+    prof：分段計時（replay / vector / results）。"""
+    if mode == "vector" and (ckpt is not None or resume is not None):
+        raise ValueError("checkpoint 僅支援 event 引擎")
+    if resume is not None:
+        strat, engine = resume["strat"], resume["engine"]
+    else:
+        strat = load_strategy(STRATEGY, params)
+        engine = BacktestEngine(start_cash=1_000_000, **engine_kw)
+        strat.on_start(list(data_1m), warmup_1h)
+    if mode == "vector":
+        if len(data_1m) != 1 or not MC_NEXT_BAR_FILL:
+            raise ValueError("vector 引擎僅支援單一商品 + MC_NEXT_BAR_FILL")
+        (s, df), = data_1m.items()
+        with stage(prof, "replay"):
+            last_ts = run_psar_vectorized(strat, engine, s, df, frame=BAR_FRAME)
+        if prof is not None:
+            prof.count("ticks", 2 * len(df))
+    else:
+        with stage(prof, "replay"):
+            last_ts = replay(strat, engine, data_1m, ckpt, ckpt_every, resume, prof)
     # 收尾：把未平倉部位結算
-    if ticks:
-        engine.close_all(ticks[-1].ts)
+    if last_ts is not None:
+        engine.close_all(last_ts)
+    with stage(prof, "results"):
+        res = engine.results()
+    engine.equity_rec.cleanup()
+    return res
 
-    # 結果與輸出
-    res = engine.results()
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
-    res["trades_df"].to_csv(OUT_DIR / "trades.csv", index=False, encoding="utf-8-sig")
-    res["equity_df"].to_csv(OUT_DIR / "equity.csv", index=False, encoding="utf-8-sig")
+def check_parity(a: dict, b: dict):
+    """兩次回測結果必須完全一致（trades_df / equity_df / 摘要數字）。"""
+    pd.testing.assert_frame_equal(a["trades_df"], b["trades_df"])
+    pd.testing.assert_frame_equal(a["equity_df"], b["equity_df"])
+    for k, v in a.items():
+        if not isinstance(v, pd.DataFrame) and v != b[k] and not (v != v and b[k] != b[k]):
+            raise AssertionError(f"{k}: {v} != {b[k]}")
 
-    print("=== 回測摘要（整體） ===")
-    print(f"初始資金        : {res['start_cash']:.2f}")
-    print(f"最終資產        : {res['end_equity']:.2f}")
-    print(f"總報酬率        : {res['total_return']*100:.2f}%")
-    print(f"夏普比率(日)    : {res['sharpe_daily']:.3f}")
-    print(f"最大回撤        : {res['max_drawdown']*100:.2f}%")
-    print(f"交易次數        : {res['num_trades']}")
-    print(f"勝率            : {res['win_rate']*100:.2f}%")
-    print(f"平均單筆損益    : {res['avg_trade_pnl']:.2f}")
-    print(f"總交易損益      : {res['total_trade_pnl']:.2f}")
-    print(f"檔案已儲存      : {OUT_DIR/'trades.csv'}, {OUT_DIR/'equity.csv'}")
+def per_symbol_metrics(res: dict, symbols) -> pd.DataFrame:
+    """組合回測的個別商品指標（依已平倉交易；共用資金下的損益貢獻與平倉權益回撤）。"""
+    tr = res["trades_df"]
+    total = float(tr["pnl"].sum()) if len(tr) else 0.0
+    rows = []
+    for s in symbols:
+        sub = tr[tr["symbol"].astype(str).str.startswith(s)].dropna(subset=["exit_ts"]) if len(tr) else tr
+        pnl = sub["pnl"].to_numpy("f8") if len(sub) else np.zeros(0)
+        if len(pnl):
+            pnl = pnl[np.argsort(pd.to_datetime(sub["exit_ts"]).to_numpy(), kind="stable")]
+        eq = res["start_cash"] + np.cumsum(pnl)
+        dd = float((eq / np.maximum.accumulate(eq) - 1.0).min()) if len(eq) else 0.0
+        rows.append({"symbol": s, "num_trades": int(len(pnl)),
+                     "win_rate": float((pnl > 0).mean()) if len(pnl) else 0.0,
+                     "avg_trade_pnl": float(pnl.mean()) if len(pnl) else 0.0,
+                     "total_trade_pnl": float(pnl.sum()),
+                     "pnl_share": float(pnl.sum() / total) if total else 0.0,
+                     "max_drawdown": dd})
+    return pd.DataFrame(rows)
 
-    # 個別商品平倉權益曲線（預設 MXF，可用 --symbol 切換 TXF）
+def export_symbol(res: dict, single_symbol: str):
+    """個別商品平倉權益曲線（預設 MXF，可用 --symbol 切換 TXF；組合回測時每個商品各一份）。"""
     trades_df_all = res["trades_df"].copy()
     if trades_df_all.empty:
         print("沒有任何交易紀錄，無法產出個別商品結果。")
@@ -185,5 +262,161 @@ def main():
     except Exception:
         print(f"已輸出 {single_symbol} 個別結果：{out_trades_csv}、{out_eq_csv}（如需 PNG，請安裝 matplotlib）")
 
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbol", default="MXF", help="個別商品（TXF 或 MXF），預設 MXF")
+    parser.add_argument("--limit", type=int, default=120000, help="每商品讀取 1min 筆數上限")
+    parser.add_argument("--start", type=str, default=None, help="回測開始時間，例如 2025-07-01 08:45")
+    parser.add_argument("--end", type=str, default=None, help="回測結束時間，例如 2025-08-01 13:45")
+    parser.add_argument("--engine", choices=("event", "vector"), default="event",
+                        help="event=逐 tick 事件迴圈；vector=PSAR 向量化引擎（結果與 event 相同，適合長區間/調參）")
+    parser.add_argument("--check-parity", action="store_true", help="兩種引擎都跑一次並比對 trades/equity")
+    parser.add_argument("--equity-resolution", choices=RESOLUTIONS, default="tick",
+                        help="equity 曲線記錄頻率：tick / minute / bar / change（僅部位變動時）")
+    parser.add_argument("--equity-max-rows", type=int, default=None, help="equity 記憶體內最多列數，超過 spill 到磁碟")
+    parser.add_argument("--equity-spill-dir", type=str, default=None, help="equity spill 目錄（預設系統暫存）")
+    parser.add_argument("--portfolio", action="store_true",
+                        help="組合回測：config.SYMBOLS（或 --symbols）全部商品共用同一個 BacktestEngine / 資金")
+    parser.add_argument("--symbols", type=str, default=None, help="組合回測的商品，逗號分隔，例如 TXF,MXF")
+    parser.add_argument("--chunk-rows", type=int, default=0,
+                        help="event 引擎分段讀 1min K（每段筆數）；回放邊讀邊跑，記憶體不隨區間長度成長")
+    parser.add_argument("--ticks", action="store_true",
+                        help="逐筆回放：直接讀 ticks_* 原始 tick（逐日分段 + 本機快取），取代 1min 雙 tick 近似；需 --start/--end")
+    parser.add_argument("--no-tick-cache", action="store_true", help="--ticks 不讀寫本機 tick 快取")
+    parser.add_argument("--refresh-tick-cache", action="store_true", help="--ticks 重新從 MySQL 讀取並覆寫快取")
+    parser.add_argument("--checkpoint-every", type=int, default=0,
+                        help="每 N 根 bar（最小 frame）存一份 checkpoint（0=不存）；同設定延長 --end 時可 --resume")
+    parser.add_argument("--checkpoint-dir", type=str, default="backtest_out/checkpoints", help="checkpoint 目錄")
+    parser.add_argument("--checkpoint-keep", type=int, default=5, help="每組設定保留最新幾份 checkpoint（0=全留）")
+    parser.add_argument("--resume", action="store_true",
+                        help="從同設定（參數 / 商品 / --start）不晚於 --end 的最新 checkpoint 接著回放")
+    parser.add_argument("--mc-sims", type=int, default=0,
+                        help="回測後對 trades 跑 Monte Carlo 重抽樣（每種方法的路徑數，0=不跑）；分位數表寫在 trades.csv 旁")
+    parser.add_argument("--mc-method", choices=MC_METHODS + ("all",), default="all")
+    parser.add_argument("--mc-seed", type=int, default=0)
+    parser.add_argument("--profile", action="store_true",
+                        help="分段計時（SQL / tick 建立 / 合併 / 策略 / 引擎 / 結算 / 輸出），報表寫到輸出目錄的 profile.json")
+    parser.add_argument("--profile-memory", action="store_true", help="--profile 時另以 tracemalloc 記各階段記憶體峰值（較慢）")
+    parser.add_argument("--profile-cprofile", action="store_true", help="--profile 時以 cProfile 包住回放（profile.prof / profile_cprofile.txt）")
+    args = parser.parse_args()
+    global SYMBOLS
+    SYMBOLS = [s.strip().upper() for s in (args.symbols.split(",") if args.symbols else SYMBOLS)] if args.portfolio \
+        else [args.symbol.upper()]
+    global OUT_DIR
+    OUT_DIR = OUT_DIR / ("portfolio" if args.portfolio else SYMBOLS[0].lower())
+    if args.start or args.end:
+        def _san(s):
+            return (s or "NA").replace(":", "").replace(" ", "").replace("-", "")
+        OUT_DIR = OUT_DIR / f"{_san(args.start)}_{_san(args.end)}"
+    print(f"[BT] 回測標的: {', '.join(SYMBOLS)} | 期間: {args.start or '(未指定)'} → {args.end or '(未指定)'}")
+    if args.portfolio and args.engine == "vector" and len(SYMBOLS) > 1:
+        parser.error("組合回測（多商品）僅支援 --engine event")
+
+    if (args.chunk_rows or args.ticks) and (args.engine == "vector" or args.check_parity):
+        parser.error("--chunk-rows / --ticks 僅適用 --engine event（且不搭配 --check-parity）")
+    if args.ticks and not (args.start and args.end):
+        parser.error("--ticks 需指定 --start 與 --end")
+    if (args.checkpoint_every or args.resume) and (args.engine == "vector" or args.check_parity):
+        parser.error("--checkpoint-every / --resume 僅適用 --engine event（且不搭配 --check-parity）")
+
+    # checkpoint：以「設定 + 資料起點」為鍵；結束時間不入鍵，延長 --end 時取不晚於新 end 的最新一份
+    ckpt, resume = None, None
+    if args.checkpoint_every or args.resume:
+        key = config_key(strategy=STRATEGY, params=STRATEGY_PARAMS, symbols=SYMBOLS, start=args.start,
+                         limit=args.limit, bar_frame=BAR_FRAME, feed_frame=FEED_FRAME, ticks=args.ticks,
+                         mc=MC_NEXT_BAR_FILL, equity_resolution=args.equity_resolution,
+                         specs=[contract_spec(s) for s in SYMBOLS])
+        store = CheckpointStore(Path(args.checkpoint_dir), key, keep=args.checkpoint_keep)
+        ckpt = store if args.checkpoint_every else None
+        if args.resume:
+            resume = store.latest(pd.Timestamp(args.end).value if args.end else None)
+            if resume is None:
+                print("[CKPT] 沒有可用的 checkpoint，從頭回放")
+            else:
+                print(f"[CKPT] 從 {pd.Timestamp(resume['pos'][0])} 接續回放（已處理 {resume['bars']} 根 bar）")
+    # 續跑：--ticks 只讀 checkpoint 所在 bar 起的資料；1min K 的 --limit 從 --start 起算，仍以原本的起點讀
+    # （資料區間才與從頭跑相同），再丟掉 checkpoint 之前的列。bar 內已處理的 tick 由 replay 依排序鍵略過
+    data_start = pd.Timestamp(resume["from_ns"]).strftime("%Y-%m-%d %H:%M:%S") if resume and args.ticks else args.start
+
+    # 讀 1 分鐘 K（近似 tick；可在 storage 設 only_day=True 過濾日盤）；--chunk-rows 時為延遲讀取的分段
+    prof = StageProfiler(memory=args.profile_memory) if args.profile else None
+    with stage(prof, "sql"):
+        if args.ticks:
+            data_1m = {s: iter_tick_batches(s, data_start, args.end, refresh=args.refresh_tick_cache,
+                                            use_cache=not args.no_tick_cache) for s in SYMBOLS}
+        elif args.chunk_rows:
+            data_1m = {s: iter_history(s, chunk_rows=args.chunk_rows, start_ts=data_start, end_ts=args.end,
+                                       limit_bars=args.limit) for s in SYMBOLS}
+        else:
+            data_1m = {s: load_history(s, limit_bars=args.limit, frame=FEED_FRAME, start_ts=data_start, end_ts=args.end) for s in SYMBOLS}
+        if resume is not None and not args.ticks:
+            data_1m = {s: rows_from(src, pd.Timestamp(resume["from_ns"])) for s, src in data_1m.items()}
+        warmup_1h = load_warmup(SYMBOLS, args.start) if resume is None else None
+
+    engine_kw = dict(equity_resolution=args.equity_resolution, equity_max_rows=args.equity_max_rows,
+                     equity_spill_dir=args.equity_spill_dir)
+    run_kw = dict(ckpt=ckpt, ckpt_every=args.checkpoint_every, resume=resume, prof=prof, **engine_kw)
+    cprof = cProfile.Profile() if prof is not None and args.profile_cprofile else None
+    if cprof is not None:
+        res = cprof.runcall(run_engine, args.engine, data_1m, warmup_1h, STRATEGY_PARAMS, **run_kw)
+    else:
+        res = run_engine(args.engine, data_1m, warmup_1h, STRATEGY_PARAMS, **run_kw)
+    if args.check_parity:
+        other = run_engine("vector" if args.engine == "event" else "event", data_1m, warmup_1h, STRATEGY_PARAMS, **engine_kw)
+        check_parity(res, other)
+        print("[BT] 引擎一致性檢查通過：event 與 vector 的 trades/equity 完全相同")
+
+    # 結果與輸出
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    with stage(prof, "csv"):
+        res["trades_df"].to_csv(OUT_DIR / "trades.csv", index=False, encoding="utf-8-sig")
+        res["equity_df"].to_csv(OUT_DIR / "equity.csv", index=False, encoding="utf-8-sig")
+
+    print("=== 回測摘要（整體） ===")
+    print(f"初始資金        : {res['start_cash']:.2f}")
+    print(f"最終資產        : {res['end_equity']:.2f}")
+    print(f"總報酬率        : {res['total_return']*100:.2f}%")
+    print(f"夏普比率(日)    : {res['sharpe_daily']:.3f}")
+    print(f"索提諾比率(日)  : {res['sortino_daily']:.3f}")
+    print(f"最大回撤        : {res['max_drawdown']*100:.2f}%（最長 {res['max_dd_days']:.1f} 天未創高）")
+    print(f"交易次數        : {res['num_trades']}")
+    print(f"勝率            : {res['win_rate']*100:.2f}%")
+    print(f"獲利因子        : {res['profit_factor']:.3f}")
+    print(f"持倉時間比例    : {res['exposure']*100:.2f}%")
+    print(f"平均單筆損益    : {res['avg_trade_pnl']:.2f}")
+    print(f"總交易損益      : {res['total_trade_pnl']:.2f}")
+    print(f"檔案已儲存      : {OUT_DIR/'trades.csv'}, {OUT_DIR/'equity.csv'}")
+
+    if args.mc_sims:
+        methods = MC_METHODS if args.mc_method == "all" else (args.mc_method,)
+        with stage(prof, "montecarlo"):
+            tabs = mc_report(res["trades_df"], OUT_DIR, args.mc_sims, methods, args.mc_seed, res["start_cash"])
+        for m, tab in tabs.items():
+            print(f"=== Monte Carlo（{m}，{args.mc_sims} 條路徑） ===")
+            print(tab.to_string(index=False) if len(tab) else "沒有已平倉交易")
+
+    if args.portfolio:
+        per = per_symbol_metrics(res, SYMBOLS)
+        per.to_csv(OUT_DIR / "per_symbol.csv", index=False, encoding="utf-8-sig")
+        print("=== 個別商品 ===")
+        print(per.to_string(index=False))
+    with stage(prof, "export"):
+        for s in SYMBOLS:
+            export_symbol(res, s)
+
+    if prof is not None:
+        summary = prof.write(OUT_DIR / "profile.json", engine=args.engine, symbols=SYMBOLS, start=args.start, end=args.end,
+                         ticks_mode=args.ticks, chunk_rows=args.chunk_rows)
+        print("=== Profile（exclusive 秒數） ===")
+        for k, v in summary["stages"].items():
+            print(f"{k:<14}: {v['seconds']:9.3f}s {v['share']*100:5.1f}%  ({v['calls']} 次)")
+        for k, v in summary["rates"].items():
+            print(f"{k:<14}: {v:,.0f}")
+        if cprof is not None:
+            cprof.dump_stats(str(OUT_DIR / "profile.prof"))
+            with open(OUT_DIR / "profile_cprofile.txt", "w", encoding="utf-8") as f:
+                pstats.Stats(cprof, stream=f).sort_stats("cumulative").print_stats(40)
+        print(f"Profile 報表    : {OUT_DIR / 'profile.json'}")
+
 if __name__ == "__main__":
     main()
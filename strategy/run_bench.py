@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark：以合成行情（storage.synthetic，固定 seed）量測熱路徑，不需要 MySQL / Redis。
+每項取 --repeat 次中最快的一次，記 ns/op；結果附上 git commit 逐行寫入 results.jsonl，
+並與上一個不同 commit 的紀錄比較，變慢超過 --threshold 標示 REGRESSION。
+
+  python -m strategy.run_bench
+  python -m strategy.run_bench --only barbuilder_on_tick,engine_on_tick --repeat 7 --fail-on-regression
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from strategy.core.backtester import BacktestEngine
+from strategy.core.barbuilder import BarBuilder, aggregate, bars_from_df
+from strategy.core.calendar import is_third_wed_1329
+from strategy.core.codec import decode_tick, encode_tick
+from strategy.core.events import Signal
+from strategy.storage.synthetic import synthetic_batch, synthetic_minutes
+from strategy.strategies.sar_psar_hourly import PSARHourly, RiskWrappedPSARHourly
+
+DEFAULT_OUT = Path("backtest_out") / "bench" / "results.jsonl"
+_EPOCH = datetime(1970, 1, 1)
+
+class Bench:
+    """一個 benchmark：setup() 建立狀態（不計時），run(state) 為量測本體，ops = 每次 run 的操作數。"""
+    def __init__(self, name: str, setup: Callable[[], object], run: Callable[[object], None], ops: int):
+        self.name, self.setup, self.run, self.ops = name, setup, run, ops
+
+    def measure(self, repeat: int) -> dict:
+        best = float("inf")
+        for _ in range(repeat):
+            state = self.setup()
+            t0 = time.perf_counter()
+            self.run(state)
+            best = min(best, time.perf_counter() - t0)
+        return {"ns_per_op": best / self.ops * 1e9, "ops_per_sec": self.ops / best if best else None, "ops": self.ops}
+
+def build_suite(symbol: str, days: int, seed: int) -> List[Bench]:
+    batch = synthetic_batch(symbol, days=days, seed=seed)
+    ticks = list(batch)
+    minutes = synthetic_minutes(symbol, days=days, seed=seed)
+    hours = bars_from_df(aggregate(minutes["ts"], minutes["c"], minutes["v"], "1H",
+                                   minutes["o"], minutes["h"], minutes["l"]), symbol, "1H")
+    hours = hours * max(1, 20_000 // max(len(hours), 1))   # bar 數太少時重複，計時才穩
+    minute_ticks = [t for t in ticks if t.is_open]
+    raw = [encode_tick(t) for t in ticks]
+    dts = [_EPOCH + timedelta(microseconds=t.ts // 1000) for t in ticks[::10]]
+
+    def run_builder(b):
+        on_tick = b.on_tick
+        for t in ticks:
+            on_tick(t)
+
+    def run_pop(b):
+        on_tick, pop = b.on_tick, b.pop_closed_bars
+        for t in minute_ticks:
+            on_tick(t)
+            pop(symbol, t.ts + 60_000_000_000)
+
+    def setup_psar():
+        st = PSARHourly()
+        st.on_start([symbol], {symbol: hours[:1]})
+        return st
+
+    def run_psar(st):
+        update = st.state[symbol].update
+        for b in hours[1:]:
+            update(b.h, b.l)
+
+    def setup_risk():
+        # 停損 / 停利設到碰不到，部位一直存在，量的是風控每筆都要走的路徑
+        st = RiskWrappedPSARHourly(sl_points=10**9, trail_trigger=10**9)
+        st.on_start([symbol], {symbol: hours[:24]})
+        st._update_pos_from_signal(Signal(symbol, "BUY", 1), ticks[0].price)
+        return st
+
+    def run_risk(st):
+        on_tick = st.on_tick
+        for t in ticks:
+            on_tick(t)
+
+    def setup_engine():
+        e = BacktestEngine()
+        e.on_tick(ticks[0], Signal(symbol, "BUY", 1))
+        return e
+
+    def run_engine_ticks(e):
+        on_tick = e.on_tick
+        for t in ticks[1:]:
+            on_tick(t, None)
+
+    def setup_results():
+        e = setup_engine()
+        run_engine_ticks(e)
+        return e
+
+    def run_decode(_):
+        for r in raw:
+            decode_tick(r)
+
+    def run_encode(_):
+        for t in ticks:
+            encode_tick(t)
+
+    def run_third_wed(_):
+        for d in dts:
+            is_third_wed_1329(d)
+
+    return [
+        Bench("barbuilder_on_tick", lambda: BarBuilder(frames=["1min", "1H"]), run_builder, len(ticks)),
+        Bench("barbuilder_pop_closed_bars", lambda: BarBuilder(frames=["1min", "1H"]), run_pop, len(minute_ticks)),
+        Bench("psar_update", setup_psar, run_psar, len(hours) - 1),
+        Bench("risk_psar_on_tick", setup_risk, run_risk, len(ticks)),
+        Bench("engine_on_tick", setup_engine, run_engine_ticks, len(ticks) - 1),
+        Bench("engine_results", setup_results, lambda e: e.results(), 1),
+        Bench("codec_decode", lambda: None, run_decode, len(raw)),
+        Bench("codec_encode", lambda: None, run_encode, len(ticks)),
+        Bench("is_third_wed_1329", lambda: None, run_third_wed, len(dts)),
+    ]
+
+def git_commit() -> Tuple[str, bool]:
+    repo = Path(__file__).resolve().parent
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo, capture_output=True, text=True,
+                              check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo,
+                                    capture_output=True, text=True).stdout.strip())
+        return head, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+def load_history(path: Path) -> List[dict]:
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def baseline(history: List[dict], commit: str, cfg: dict) -> Optional[dict]:
+    """同設定（商品 / 天數 / seed）下，最近一筆不同 commit 的紀錄。"""
+    for rec in reversed(history):
+        if rec.get("commit") != commit and all(rec.get(k) == v for k, v in cfg.items()):
+            return rec
+    return None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbol", default="MXF")
+    parser.add_argument("--days", type=int, default=3, help="合成行情的交易日數")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="每項重跑次數（取最快）")
+    parser.add_argument("--only", type=str, default=None, help="只跑這些項目，逗號分隔")
+    parser.add_argument("--out", type=str, default=str(DEFAULT_OUT), help="結果紀錄（JSON lines）")
+    parser.add_argument("--threshold", type=float, default=0.15, help="比基準慢超過此比例視為退步")
+    parser.add_argument("--no-save", action="store_true", help="只比較，不寫入紀錄")
+    parser.add_argument("--fail-on-regression", action="store_true", help="有退步時 exit code 1（給 CI 用）")
+    args = parser.parse_args()
+
+    cfg = {"symbol": args.symbol.upper(), "days": args.days, "seed": args.seed}
+    t0 = time.perf_counter()
+    suite = build_suite(cfg["symbol"], args.days, args.seed)
+    print(f"[BENCH] 合成行情 {cfg['symbol']} {args.days} 天（seed={args.seed}），準備 {time.perf_counter() - t0:.1f}s")
+    only = {s.strip() for s in args.only.split(",")} if args.only else None
+    results: Dict[str, dict] = {}
+    for b in suite:
+        if only and b.name not in only:
+            continue
+        results[b.name] = b.measure(args.repeat)
+
+    commit, dirty = git_commit()
+    out = Path(args.out)
+    base = baseline(load_history(out), commit, cfg)
+    rows, regressed = [], []
+    for name, r in results.items():
+        row = {"benchmark": name, "ns_per_op": round(r["ns_per_op"], 1), "ops": r["ops"]}
+        old = (base or {}).get("results", {}).get(name)
+        if old:
+            chg = r["ns_per_op"] / old["ns_per_op"] - 1.0
+            row["base_ns_per_op"] = round(old["ns_per_op"], 1)
+            row["change"] = f"{chg * 100:+.1f}%"
+            if chg > args.threshold:
+                row["change"] += " REGRESSION"
+                regressed.append(name)
+        rows.append(row)
+    print(pd.DataFrame(rows).to_string(index=False))
+    if base:
+        print(f"[BENCH] 基準：{base['commit']}（{base['time']}）")
+
+    if not args.no_save:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        rec = {"time": datetime.now().isoformat(timespec="seconds"), "commit": commit, "dirty": dirty, **cfg,
+               "repeat": args.repeat, "python": platform.python_version(), "numpy": np.__version__,
+               "pandas": pd.__version__, "results": results}
+        with open(out, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        print(f"[BENCH] 已寫入 {out}")
+    if regressed and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
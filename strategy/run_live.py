@@ -1,16 +1,23 @@
 # -*- coding: utf-8 -*-
 import signal, time
 from datetime import datetime, time as dtime
+import numpy as np
 import pytz
 
-from strategy.config import SYMBOLS, STRATEGY, STRATEGY_PARAMS, SESSION, TIMEZONE
-from strategy.core.registry import load_strategy
+from strategy.config import (STRATEGIES, SESSION, TIMEZONE, BAR_FRAME, BAR_CLOSE_GRACE_SEC, WARMUP_HOURS,
+                             LIVE_SNAPSHOT, LIVE_SNAPSHOT_PATH, LIVE_SNAPSHOT_REDIS_KEY, LIVE_SNAPSHOT_EVERY_SEC)
 from strategy.core.barbuilder import BarBuilder
-from strategy.core.datafeed import RedisTickStream
-from strategy.core.calendar import is_third_wed_1329
-from strategy.storage.mysql import load_hourly_from_ticks
-from strategy.core.events import Bar
+from strategy.core.codec import ns_to_iso
+from strategy.core.events import BarBatch, Signal, TickBatch
+from strategy.core.snapshot import config_key
+from strategy.core.datafeed import BufferedTickStream, RedisTickStream
+from strategy.core.calendar import get_calendar, local_ns
+from strategy.storage.bar_cache import load_recent
+from strategy.storage.mysql import load_ticks
 from strategy.broker.shioaji_broker import ShioajiBroker
+from strategy.live.bar_scheduler import BarCloseScheduler, exchange_now_ns, log_late_tick
+from strategy.live.host import StrategyHost
+from strategy.live.state_store import Position, SnapshotWriter, advance, load_latest, open_backend
 from strategy.logging_setup import setup_logging
 from dotenv import load_dotenv
 setup_logging(app_name="live")
@@ -108,20 +115,16 @@ def _market_type_now() -> str:
     return "Night" if (now_t >= dtime(15, 0) or now_t < dtime(5, 0)) else "Day"
 
 def in_session(now_local: datetime) -> bool:
-    """是否在交易時段；支援跨午夜（例 15:00–05:00）。"""
-    t = now_local.time()
-    for s, e in SESSION:
-        if s <= e:
-            if s <= t <= e: return True
-        else:
-            if t >= s or t <= e: return True
-    return False
+    """是否在交易時段（交易日曆：排除週末 / 休市日；支援跨午夜，例 15:00–05:00）。"""
+    return get_calendar().in_session(local_ns(now_local))
+
+_NS_PER_MIN = 60 * 1_000_000_000
 
-def _minute_key(ts):
-    return ts.replace(second=0, microsecond=0)
+def _minute_key(ts: int) -> int:
+    return ts // _NS_PER_MIN * _NS_PER_MIN
 
-def _hour_key(ts):
-    return ts.replace(minute=0, second=0, microsecond=0)
+def _hour_key(ts: int) -> int:
+    return ts // (60 * _NS_PER_MIN) * (60 * _NS_PER_MIN)
 
 def _is_first_minute_open_tick(symbol, ts, seen_dict):
     mk = _minute_key(ts)
@@ -130,70 +133,170 @@ def _is_first_minute_open_tick(symbol, ts, seen_dict):
         return True
     return False
 
-def main():
-    strat = load_strategy(STRATEGY, STRATEGY_PARAMS)
-    # 啟動前暖機最近 200 根 1H Bars
-    warmup_1h = {s: [] for s in SYMBOLS}
-    for s in SYMBOLS:
-        _dfh = load_hourly_from_ticks(s, hours=200)
-        warmup_1h[s] = [Bar(s, r.ts, r.o, r.h, r.l, r.c, int(getattr(r,'v',0))) for r in _dfh.itertuples()]
-    strat.on_start(SYMBOLS, warmup_1h)
-    broker = ShioajiBroker()
-    broker.login()
+class LoopState:
+    """主迴圈自己的狀態（快照 / 還原用）：MC 待成交單、已見過首筆的分鐘。"""
+    __slots__ = ("pending_orders", "seen_minute_first_tick")
+
+    def __init__(self, symbols):
+        self.pending_orders = {s: None for s in symbols}
+        self.seen_minute_first_tick = {s: set() for s in symbols}  # 記錄(YYYY-mm-dd HH:MM)是否已見第一筆
+
+    def __getstate__(self):
+        return self.pending_orders, self.seen_minute_first_tick
+
+    def __setstate__(self, st):
+        self.pending_orders, self.seen_minute_first_tick = st
+
+def _emit(sig, submit):
+    """策略回傳單一訊號；多策略宿主回傳 list。"""
+    if sig.__class__ is list:
+        for s in sig:
+            submit(s)
+    else:
+        submit(sig)
+
+def handle_tick(t, strat, hour_builder, st: LoopState, submit):
+    """單筆 tick：MC 下一棒成交 → 策略 on_tick → BarBuilder 封口 → on_bar；訊號交給 submit(sig)。"""
+    # 先處理 MC 的下一小時第一分鐘 open 成交
+    po = st.pending_orders.get(t.symbol)
+    if po is not None:
+        act_key = po.get('activate_key')
+        # 條件：這筆 tick 是該小時第一分鐘（:00）的第一筆
+        if _hour_key(t.ts) == act_key and t.ts // _NS_PER_MIN % 60 == 0 and _is_first_minute_open_tick(t.symbol, t.ts, st.seen_minute_first_tick):
+            side, qty = po['side'], int(po['qty'] or 1)
+            submit(Signal(t.symbol, side, qty, note='MC next-bar OPEN fill'))
+            st.pending_orders[t.symbol] = None
+
+    # tick 級先跑風控/反轉
+    sig_tick = strat.on_tick(t)
+    if sig_tick:
+        _emit(sig_tick, submit)
 
-    hour_builder = BarBuilder(frame="1H")
-    last_key = {}
-    stream = RedisTickStream()
-    print("[LIVE] 啟動：PSAR 小時K決策 + tick 即時反轉 (MC next-bar 成交)")
+    # 聚合出 1H bar；若時鐘還沒封口，跨桶的這筆 tick 會立即封口上一根
+    for b in hour_builder.on_tick(t):
+        sig_bar = strat.on_bar(b)
+        if sig_bar:
+            _emit(sig_bar, submit)
 
-    # MultiCharts 同步：bar 訊號於下一小時第一分鐘 open 成交
-    MC_NEXT_BAR_FILL = True
-    pending_orders = {s: None for s in SYMBOLS}
-    seen_minute_first_tick = {s: set() for s in SYMBOLS}  # 記錄(YYYY-mm-dd HH:MM)是否已見第一筆
+def live_loop(strat, broker, stream, symbols, hour_builder, closer=None, session_check: bool = True,
+              should_stop=None, on_tick_done=None, state: LoopState = None):
+    """
+    實盤主迴圈：tick → MC 下一棒成交 / 策略 on_tick / BarBuilder 封口 → submit_signal。
+    closer=None 時只靠 tick 跨桶封口；session_check=False 不看牆上時鐘的交易時段（回放壓測用）；
+    should_stop() 為 True 時結束（預設看 SIGINT / SIGTERM）；on_tick_done(tick) 在每筆 tick 處理完後呼叫；
+    state：還原的 LoopState（預設新建）。
+    """
+    should_stop = should_stop or (lambda: STOP)
+    state = state or LoopState(symbols)
 
-    while not STOP:
+    def submit(sig):
+        submit_signal(broker, sig)
+
+    while not should_stop():
         try:
-            now_local = datetime.now(tz)
-            if not in_session(now_local):
-                time.sleep(1); continue
-
-            try:
-                t = next(iter(stream))
-            except StopIteration:
-                time.sleep(0.1); continue
-
-            # 先處理 MC 的下一小時第一分鐘 open 成交
-            if MC_NEXT_BAR_FILL:
-                po = pending_orders.get(t.symbol)
-                if po is not None:
-                    act_key = po.get('activate_key')
-                    # 條件：這筆 tick 是該小時第一分鐘（:00）的第一筆
-                    if _hour_key(t.ts) == act_key and t.ts.minute == 0 and _is_first_minute_open_tick(t.symbol, t.ts, seen_minute_first_tick):
-                        side, qty = po['side'], int(po['qty'] or 1)
-                        from strategy.core.events import Signal
-                        submit_signal(broker, Signal(t.symbol, side, qty, note='MC next-bar OPEN fill'))
-                        pending_orders[t.symbol] = None
-
-            # tick 級先跑風控/反轉
-            sig_tick = strat.on_tick(t)
-            if sig_tick:
-                submit_signal(broker, sig_tick)
-
-            # 聚合出 1H bar，封口時產生 on_bar 訊號
-            hour_builder.on_tick(t)
-            key = t.ts.replace(minute=0, second=0, microsecond=0)
-            last = last_key.get(t.symbol)
-            if last is not None and key > last:
-                for b in hour_builder.pop_closed_bars(t.symbol, key):
-                    sig_bar = strat.on_bar(b)
-                    if sig_bar:
-                        submit_signal(broker, sig_bar)
-            last_key[t.symbol] = key
+            poll_sec = 1.0
+            if closer is not None:
+                now_ns = exchange_now_ns(tz)
+                now_key = closer.fire(now_ns)
+                if now_key is not None:
+                    for s in symbols:
+                        for b in hour_builder.pop_closed_bars(s, now_key):
+                            sig_bar = strat.on_bar(b)
+                            if sig_bar:
+                                _emit(sig_bar, submit)
+                poll_sec = min(poll_sec, closer.seconds_until_due(now_ns))
+
+            if session_check:
+                now_local = datetime.now(tz)
+                if not in_session(now_local):
+                    time.sleep(min(1.0, poll_sec)); continue
+
+            t = stream.poll(poll_sec)
+            if t is None:
+                continue
+            handle_tick(t, strat, hour_builder, state, submit)
+            if on_tick_done is not None:
+                on_tick_done(t)
 
         except Exception as e:
             print(f"[LIVE][ERROR] {e}")
             time.sleep(1)
 
+def state_key(host: StrategyHost) -> str:
+    """快照只在策略組合（id / 策略 / 參數 / 商品）與 frame 都相同時還原。"""
+    return config_key(strategies=STRATEGIES, symbols=host.symbols, frames=host.frames)
+
+def catch_up(strat, hour_builder, st: LoopState, symbols, since_ns: int, pos: Position = None):
+    """
+    補播快照之後進 ticks_* 的 tick，讓策略 / BarBuilder 追上現在；期間的訊號只記錄不下單
+    （停機時沒送出的單不補送，部位以券商為準）。
+    pos：快照的各商品位置 (最後 ts, 該 ts 已處理筆數)，同一 ts 只略過已處理的筆數；沒有位置的商品從 ts > since_ns 起。
+    回傳 (補播筆數, 補播後的 pos, 各商品補播的最後價格)；策略自己記的部位之後要以券商校正（StrategyHost.sync_positions）。
+    """
+    pos = dict(pos or {})
+    skipped, batches = [], []
+    for s in symbols:
+        ts0, done = pos.get(s, (since_ns, None))
+        b = TickBatch.from_ticks(s, load_ticks(s, start_ts=ns_to_iso(ts0).replace("T", " ")))
+        ts = b.data["ts"]
+        i = int(np.searchsorted(ts, ts0, side="right")) if done is None else int(np.searchsorted(ts, ts0, side="left")) + done
+        batches.append(b[i:])
+    ticks = sorted((t for b in batches for t in b), key=lambda t: t.ts)
+    last = {}
+    for t in ticks:
+        handle_tick(t, strat, hour_builder, st, skipped.append)
+        advance(pos, t)
+        last[t.symbol] = t.price
+    for sig in skipped:
+        print(f"[RESTORE] 補播期間訊號（未下單）：{sig}")
+    return len(ticks), pos, last
+
+def main():
+    strat = StrategyHost(STRATEGIES)
+    symbols = strat.symbols
+    # 先訂閱：補播 / 暖機 / 登入期間發佈的 tick 先進佇列，之後接著處理（已補播過的由 skip_through 丟掉）
+    stream = BufferedTickStream(RedisTickStream())
+    t0 = time.perf_counter()
+    key = state_key(strat)
+    backend = open_backend(LIVE_SNAPSHOT, LIVE_SNAPSHOT_PATH, LIVE_SNAPSHOT_REDIS_KEY)
+    snap = load_latest(backend, key)
+    if snap is not None and snap.get("ts") is not None:
+        # 從快照還原：不重新暖機，只補播快照之後的 tick
+        strat, hour_builder, loop_state = snap["strat"], snap["builder"], snap["loop"]
+        hour_builder.on_late = log_late_tick
+        n, pos, last_px = catch_up(strat, hour_builder, loop_state, symbols, snap["ts"], snap.get("pos"))
+        stream.skip_through(pos)
+        print(f"[LIVE] 由快照還原（{backend}，{ns_to_iso(snap['ts'])}），補播 {n} 筆 tick，{time.perf_counter() - t0:.2f}s")
+    else:
+        # 啟動前暖機：最近 WARMUP_HOURS 根 1H K（0 = 全部歷史），BarBatch 直接交給策略的批次 kernel
+        warmup_1h = {s: BarBatch.from_df(s, load_recent(s, BAR_FRAME, WARMUP_HOURS), BAR_FRAME) for s in symbols}
+        strat.on_start(symbols, warmup_1h)
+        hour_builder = BarBuilder(frames=strat.frames, on_late=log_late_tick)
+        loop_state = LoopState(symbols)
+        pos = {}
+        print(f"[LIVE] 暖機 {', '.join(f'{s}={len(b)}' for s, b in warmup_1h.items())} 根 1H，{time.perf_counter() - t0:.2f}s")
+    broker = ShioajiBroker()
+    broker.login()
+    if snap is not None and snap.get("ts") is not None:
+        # 補播期間的訊號沒下單：策略記的部位以券商淨部位為準（沒補播到 tick 的商品沿用快照）
+        net = {s: _net_position(broker, s) for s in last_px}
+        strat.sync_positions(net, last_px)
+        print(f"[RESTORE] 券商淨部位：{net}")
+
+    # 時鐘封口：bar 邊界 / 收盤 + grace 到點就 pop_closed_bars，不必等下一筆 tick
+    closer = BarCloseScheduler(hour_builder.step, BAR_CLOSE_GRACE_SEC, SESSION) if hour_builder.step else None
+    writer = None
+    if backend is not None:
+        writer = SnapshotWriter(backend, key, {"strat": strat, "builder": hour_builder, "loop": loop_state},
+                                LIVE_SNAPSHOT_EVERY_SEC, pos=pos)
+    print(f"[LIVE] 啟動：{strat.describe()}")
+
+    live_loop(strat, broker, stream, symbols, hour_builder, closer, state=loop_state,
+              on_tick_done=writer.on_tick if writer is not None else None)
+
+    stream.close()
+    if writer is not None:
+        writer.close()
     strat.on_stop()
     try:
         broker.logout()
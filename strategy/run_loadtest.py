@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+run_live 回放壓測：把錄好的 tick（ticks_* / capture 檔 / 合成行情）以真實速度、N 倍速或全速發佈到本機 Redis，
+同一台機器上跑 run_live 的主迴圈（live_loop）+ 模擬券商，量：
+- 持續處理量（ticks/s）與來源 1 倍速下的每秒峰值筆數 → headroom 倍數
+- queue lag：發佈 → 訂閱端收到（含 Redis 與主迴圈忙碌時的排隊）
+- 處理時間：收到 → 策略 / BarBuilder / 下單都跑完
+- tick-to-signal：觸發訊號那筆 tick 的發佈 → 模擬券商收到委託
+發佈端在另一個 process（不和主迴圈搶 GIL），訊息多帶 sent_ns（time.time_ns）。
+
+  python -m strategy.run_loadtest --synthetic-days 1 --speed 0
+  python -m strategy.run_loadtest --mysql --start 2025-07-16 --end 2025-07-17 --speed 10
+  python -m strategy.run_loadtest --capture ticks.jsonl --speed 1
+"""
+import argparse
+import json
+import multiprocessing as mp
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+import redis
+
+from strategy.config import STRATEGIES, BAR_FRAME, WARMUP_HOURS, REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_CHANNEL_PREFIX
+from strategy.core.barbuilder import BarBuilder
+from strategy.core.codec import encode_tick, tick_from_dict
+from strategy.core.datafeed import RedisTickStream
+from strategy.core.events import BarBatch, Tick, TICK_DTYPE
+from strategy.broker.shioaji_broker import FutOrderResp
+from strategy.live.host import StrategyHost
+
+END_CHANNEL = f"{REDIS_CHANNEL_PREFIX}__END__"
+PCTS = (50, 90, 99, 99.9)
+
+# ---- 來源：合併成 (ts, 商品 index, price, vol)，依時間排序 ----
+def _merge(symbols: List[str], arrays: Dict[str, np.ndarray]):
+    parts = [(k, arrays[s]) for k, s in enumerate(symbols) if s in arrays and len(arrays[s])]
+    ts = np.concatenate([a["ts"] for _, a in parts]) if parts else np.zeros(0, "i8")
+    sym = np.concatenate([np.full(len(a), k, "i4") for k, a in parts]) if parts else np.zeros(0, "i4")
+    price = np.concatenate([a["price"] for _, a in parts]) if parts else np.zeros(0)
+    vol = np.concatenate([a["vol"] for _, a in parts]) if parts else np.zeros(0, "i8")
+    order = np.argsort(ts, kind="stable")
+    return ts[order], sym[order], price[order], vol[order]
+
+def load_mysql(symbols, start, end, use_cache=True):
+    from strategy.storage.tick_cache import iter_tick_batches
+    return {s: np.concatenate([b.data for b in iter_tick_batches(s, start, end, use_cache=use_cache)] or
+                              [np.zeros(0, TICK_DTYPE)]) for s in symbols}
+
+def load_capture(path, symbols):
+    """capture 檔：一行一個 Redis tick 訊息（JSON，格式同 datafeed）。"""
+    rows: Dict[str, list] = {s: [] for s in symbols}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                t = tick_from_dict(json.loads(line))
+                if t.symbol in rows:
+                    rows[t.symbol].append((t.ts, t.price, t.vol, False))
+    return {s: np.array(sorted(r), dtype=TICK_DTYPE) for s, r in rows.items()}
+
+def load_synthetic(symbols, start, days, seed):
+    from strategy.storage.synthetic import synthetic_batch
+    return {s: synthetic_batch(s, start, days, seed).data for s in symbols}
+
+def replay_offsets(ts: np.ndarray, speed: float, max_gap: float) -> np.ndarray:
+    """每筆 tick 相對開始的發佈時刻（秒）；speed<=0 全速（全為 0）；時段之間等超過 max_gap 秒的空檔壓成 max_gap。"""
+    if speed <= 0 or not len(ts):
+        return np.zeros(len(ts))
+    d = np.diff(ts, prepend=ts[0]) / 1e9 / speed
+    return np.cumsum(np.minimum(d, max_gap))
+
+# ---- 發佈端（獨立 process） ----
+def publish(ts, sym, price, vol, offsets, symbols, batch, out_q):
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+    pipe = r.pipeline(transaction=False)
+    chans = [f"{REDIS_CHANNEL_PREFIX}{s}" for s in symbols]
+    queued = 0
+    t0 = time.perf_counter()
+    for i in range(len(ts)):
+        wait = offsets[i] - (time.perf_counter() - t0)
+        if wait > 0:
+            if queued:
+                pipe.execute(); queued = 0
+            time.sleep(wait)
+        k = int(sym[i])
+        t = Tick(symbols[k], int(ts[i]), float(price[i]), int(vol[i]))
+        pipe.publish(chans[k], encode_tick(t, sent_ns=time.time_ns()))
+        queued += 1
+        if queued >= batch:
+            pipe.execute(); queued = 0
+    if queued:
+        pipe.execute()
+    elapsed = time.perf_counter() - t0
+    r.publish(END_CHANNEL, json.dumps({"end": True}))
+    out_q.put({"published": int(len(ts)), "publish_seconds": elapsed})
+
+# ---- 訂閱端 ----
+class TimedTickStream(RedisTickStream):
+    """RedisTickStream + 發佈時間戳：記每筆的 queue lag，收到結束訊號後 done=True。"""
+    def __init__(self, timeout: float = 1.0):
+        super().__init__(timeout)
+        self.done = False
+        self.cur_sent = self.cur_recv = 0
+        self.first_recv = None
+        self.lag: List[int] = []
+
+    def poll(self, timeout: float):
+        msg = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if not msg:
+            return None
+        recv = time.time_ns()
+        d = json.loads(msg["data"])
+        if d.get("end"):
+            self.done = True
+            return None
+        self.cur_sent, self.cur_recv = int(d["sent_ns"]), recv
+        if self.first_recv is None:
+            self.first_recv = recv
+        self.lag.append(recv - self.cur_sent)
+        return tick_from_dict(d)
+
+class StubBroker:
+    """模擬券商：委託立即成交並記部位（FLAT 查得到淨部位），記錄觸發 tick 發佈 → 收到委託的延遲。"""
+    def __init__(self, stream: TimedTickStream):
+        self.stream = stream
+        self.pos: Dict[str, int] = {}
+        self.latency: List[int] = []
+
+    def login(self): return {}
+    def logout(self): pass
+
+    def place_order_futures(self, symbol, code=None, action="Buy", qty=1, **_):
+        self.latency.append(time.time_ns() - self.stream.cur_sent)
+        self.pos[symbol] = self.pos.get(symbol, 0) + (qty if action == "Buy" else -qty)
+        return FutOrderResp(ok=True, order={"symbol": symbol, "action": action, "qty": qty})
+
+    def list_positions(self):
+        return [{"code": s, "qty": abs(q), "direction": "Buy" if q > 0 else "Sell"} for s, q in self.pos.items() if q]
+
+def _pct_ms(ns: List[int]) -> dict:
+    if not ns:
+        return {}
+    a = np.asarray(ns, dtype="f8") / 1e6
+    return {**{f"p{q:g}": round(float(np.percentile(a, q)), 3) for q in PCTS},
+            "max": round(float(a.max()), 3), "mean": round(float(a.mean()), 3), "n": int(len(a))}
+
+def run(strat, symbols, data, speed, max_gap, batch, warmup) -> dict:
+    from strategy import run_live   # 延遲 import：spawn 的發佈端 process 不需要 run_live 的 signal / logging 設定
+
+    ts, sym, price, vol = _merge(symbols, data)
+    if not len(ts):
+        raise SystemExit("[LOAD] 沒有 tick 可回放")
+    sec = ts // 1_000_000_000
+    peak_1x = int(np.bincount(sec - sec.min()).max())
+    offsets = replay_offsets(ts, speed, max_gap)
+
+    strat.on_start(strat.symbols, warmup)
+    builder = BarBuilder(frames=strat.frames)
+    stream = TimedTickStream()
+    stream.pubsub.get_message(timeout=1.0)       # 等 psubscribe 生效再開始發佈
+    broker = StubBroker(stream)
+    proc_ns: List[int] = []
+    done = [0, 0]
+
+    def on_tick_done(_t):
+        now = time.time_ns()
+        proc_ns.append(now - stream.cur_recv)
+        done[0] += 1
+        done[1] = now
+
+    q = mp.Queue()
+    pub = mp.Process(target=publish, args=(ts, sym, price, vol, offsets, symbols, batch, q), daemon=True)
+    print(f"[LOAD] 回放 {len(ts):,} 筆（{', '.join(symbols)}），速度 {'全速' if speed <= 0 else f'{speed:g}x'}，"
+          f"來源 1x 每秒峰值 {peak_1x:,} 筆")
+    pub.start()
+    run_live.live_loop(strat, broker, stream, strat.symbols, builder, closer=None, session_check=False,
+                       should_stop=lambda: stream.done or run_live.STOP, on_tick_done=on_tick_done)
+    strat.on_stop()
+    pub_stats = q.get(timeout=30) if not run_live.STOP else {}
+    pub.join(timeout=5)
+
+    span = (done[1] - stream.first_recv) / 1e9 if done[0] > 1 else 0.0
+    sustained = done[0] / span if span else 0.0
+    return {
+        "symbols": symbols, "speed": speed, "max_gap": max_gap, "source_ticks": int(len(ts)), "source_peak_1x_per_sec": peak_1x,
+        **pub_stats, "processed": done[0], "dropped": int(len(ts) - done[0]),
+        "sustained_ticks_per_sec": round(sustained, 1),
+        "headroom_x": round(sustained / peak_1x, 2) if peak_1x else None,
+        "signals": len(broker.latency),
+        "queue_lag_ms": _pct_ms(stream.lag), "processing_ms": _pct_ms(proc_ns), "tick_to_signal_ms": _pct_ms(broker.latency),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--mysql", action="store_true", help="從 ticks_*（經 tick 快取）讀 --start/--end 的 tick")
+    src.add_argument("--capture", type=str, help="capture 檔：一行一個 Redis tick 訊息（JSON）")
+    src.add_argument("--synthetic-days", type=int, help="合成行情的交易日數（storage.synthetic）")
+    parser.add_argument("--symbols", type=str, default=None, help="逗號分隔，預設 STRATEGIES 各策略商品的聯集")
+    parser.add_argument("--start", type=str, default=None)
+    parser.add_argument("--end", type=str, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--speed", type=float, default=1.0, help="1=真實速度，N=N 倍速，0=全速")
+    parser.add_argument("--max-gap", type=float, default=2.0, help="回放時兩筆 tick 之間最多等幾秒（壓掉收盤 / 夜間空檔）")
+    parser.add_argument("--batch", type=int, default=256, help="發佈端 pipeline 批次（落後排程時才會累積）")
+    parser.add_argument("--mysql-warmup", action="store_true", help="和 run_live 一樣從 MySQL 取 WARMUP_HOURS 根 1H 暖機")
+    parser.add_argument("--out", type=str, default=None, help="報表 JSON（預設 backtest_out/loadtest/loadtest_<時間>.json）")
+    args = parser.parse_args()
+
+    strat = StrategyHost(STRATEGIES)
+    symbols = [s.strip().upper() for s in args.symbols.split(",")] if args.symbols else strat.symbols
+    if args.mysql:
+        if not (args.start and args.end):
+            parser.error("--mysql 需指定 --start 與 --end")
+        data = load_mysql(symbols, args.start, args.end)
+    elif args.capture:
+        data = load_capture(args.capture, symbols)
+    else:
+        data = load_synthetic(symbols, args.start or "2025-07-16", args.synthetic_days, args.seed)
+    warmup = {s: [] for s in strat.symbols}
+    if args.mysql_warmup:
+        from strategy.storage.bar_cache import load_recent
+        warmup = {s: BarBatch.from_df(s, load_recent(s, BAR_FRAME, WARMUP_HOURS), BAR_FRAME) for s in strat.symbols}
+
+    rep = run(strat, symbols, data, args.speed, args.max_gap, args.batch, warmup)
+    out = Path(args.out) if args.out else Path("backtest_out") / "loadtest" / f"loadtest_{datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(rep, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print("=== 回放壓測 ===")
+    published = f"{rep['published']:,}" if "published" in rep else "?（中斷）"
+    print(f"發佈 / 處理      : {published} / {rep['processed']:,}（遺失 {rep['dropped']:,}）")
+    print(f"持續處理量      : {rep['sustained_ticks_per_sec']:,.0f} ticks/s（來源 1x 峰值 {rep['source_peak_1x_per_sec']:,}/s，"
+          f"headroom {rep['headroom_x']}x）")
+    for k in ("queue_lag_ms", "processing_ms", "tick_to_signal_ms"):
+        v = rep[k]
+        print(f"{k:<16}: " + (", ".join(f"{q}={v[q]}" for q in ("p50", "p90", "p99", "p99.9", "max")) if v else "（無）"))
+    print(f"訊號數          : {rep['signals']}")
+    print(f"報表            : {out}")
+
+if __name__ == "__main__":
+    main()
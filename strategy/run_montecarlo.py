@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+對既有回測的 trades.csv 跑 Monte Carlo 交易重抽樣，分位數表寫在同一個目錄（montecarlo_bootstrap.csv / montecarlo_shuffle.csv）。
+
+  python -m strategy.run_montecarlo backtest_out/mxf/trades.csv --sims 20000 --seed 7
+"""
+import argparse
+from pathlib import Path
+import pandas as pd
+
+from strategy.core.montecarlo import METHODS, report
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trades", type=str, help="run_backtest 輸出的 trades.csv")
+    parser.add_argument("--sims", type=int, default=10_000, help="每種方法的模擬路徑數")
+    parser.add_argument("--method", choices=METHODS + ("all",), default="all")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start-cash", type=float, default=1_000_000.0)
+    parser.add_argument("--workers", type=int, default=None, help="process 數（預設：量大時自動用全部核心）")
+    args = parser.parse_args()
+
+    path = Path(args.trades)
+    trades_df = pd.read_csv(path, encoding="utf-8-sig")
+    methods = METHODS if args.method == "all" else (args.method,)
+    tabs = report(trades_df, path.parent, args.sims, methods, args.seed, args.start_cash, args.workers)
+    for m, tab in tabs.items():
+        print(f"=== Monte Carlo（{m}，{args.sims} 條路徑） ===")
+        print(tab.to_string(index=False) if len(tab) else "沒有已平倉交易")
+    print(f"檔案已儲存      : {', '.join(str(path.parent / f'montecarlo_{m}.csv') for m in methods)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+參數掃描：資料只從 MySQL 讀一次，存成 .npy 後各 worker 以 memmap 唯讀共用；
+每組參數交給 ProcessPoolExecutor（預設 = CPU 核心數）跑 vector 引擎，摘要逐筆寫入 results.csv。
+--resume 會略過 results.csv 裡已完成的 run_id（參數雜湊），中斷後可接著跑；資料區間 / 引擎設定記在旁邊的
+results.settings.json，與這次不同時拒絕續跑（避免混用不同資料算出的列）。
+
+  python -m strategy.run_sweep --symbol MXF --start "2025-01-01" --end "2025-07-01" \
+      --af 0.01,0.02,0.03 --af-max 0.2,0.3 --sl-points 100,200 --resume
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+from strategy.config import STRATEGY, STRATEGY_PARAMS, FEED_FRAME, BAR_FRAME, WARMUP_HOURS
+from strategy.core.barbuilder import _frame_ns, aggregate
+from strategy.core.contracts import contract_spec
+from strategy.core.events import BarBatch
+from strategy.core.equity import RESOLUTIONS
+from strategy.run_backtest import MC_NEXT_BAR_FILL, run_engine, load_warmup
+from strategy.storage.mysql import load_history
+
+SWEEP_KEYS = ("af", "af_max", "sl_points", "trail_trigger", "trail_retrace")
+_COLS = ("ts", "o", "h", "l", "c", "v")
+
+def run_id(params: dict) -> str:
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+def sweep_settings(symbol: str, df: pd.DataFrame, mode: str, **cfg) -> dict:
+    """結果表對應的資料與引擎設定（實際讀到的資料範圍 + 命令列區間 / 上限 + frame / 引擎）；--resume 時必須相同。"""
+    ts = df["ts"]
+    settings = {"symbol": symbol, "strategy": STRATEGY, "rows": int(len(df)),
+                "first_ts": str(ts.iloc[0]) if len(df) else None, "last_ts": str(ts.iloc[-1]) if len(df) else None,
+                "engine": mode, "feed_frame": FEED_FRAME, "bar_frame": BAR_FRAME, "mc_next_bar_fill": MC_NEXT_BAR_FILL,
+                "warmup_hours": WARMUP_HOURS, "spec": contract_spec(symbol), **cfg}
+    return json.loads(json.dumps(settings, sort_keys=True, default=str))
+
+def expand_grid(grid: Dict[str, list]) -> List[dict]:
+    """{"af": [..], "sl_points": [..]} → 所有組合（未列出的參數用 config.STRATEGY_PARAMS）。"""
+    keys = list(grid)
+    return [{**STRATEGY_PARAMS, **dict(zip(keys, vals))} for vals in itertools.product(*(grid[k] for k in keys))]
+
+def save_shared(data_dir: Path, df: pd.DataFrame):
+    """1 分鐘 K 存成各欄一個 .npy（ts 為 int64 ns），給 worker memmap。"""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    cols = {"ts": pd.DatetimeIndex(df["ts"]).as_unit("ns").asi8, "o": df["o"].to_numpy("f8"), "h": df["h"].to_numpy("f8"),
+            "l": df["l"].to_numpy("f8"), "c": df["c"].to_numpy("f8"), "v": df["v"].to_numpy("i8")}
+    for k, a in cols.items():
+        np.save(data_dir / f"{k}.npy", a)
+
+def load_shared(data_dir: Path) -> pd.DataFrame:
+    z = {k: np.load(data_dir / f"{k}.npy", mmap_mode="r") for k in _COLS}
+    return pd.DataFrame({"ts": pd.to_datetime(np.asarray(z["ts"])), **{k: z[k] for k in _COLS[1:]}}, copy=False)
+
+# ---- worker（每個 process 初始化一次） ----
+_W: dict = {}
+
+def _init_worker(symbol: str, data_dir: str, warmup, mode: str, engine_kw: dict):
+    _W.update(symbol=symbol, df=load_shared(Path(data_dir)), warmup=warmup, mode=mode, engine_kw=engine_kw)
+
+def warmup_before(lo: int) -> dict:
+    """worker 內：第 lo 列起回測的暖機 = 全域暖機（資料起點之前）+ 共用資料在 lo 之前已收完的 BAR_FRAME K（依 lo 快取）。"""
+    if lo == 0:
+        return _W["warmup"]
+    cache = _W.setdefault("warm_cache", {})
+    w = cache.get(lo)
+    if w is None:
+        s, ns = _W["symbol"], pd.DatetimeIndex(_W["df"]["ts"]).as_unit("ns").asi8
+        step = _frame_ns(BAR_FRAME)
+        df = _W["df"].iloc[:int(np.searchsorted(ns, ns[lo] // step * step))]   # lo 所在那根還沒收完，不算暖機
+        prefix = aggregate(df["ts"], df["c"], df["v"], BAR_FRAME, df["o"], df["h"], df["l"])
+        data = BarBatch.from_df(s, prefix, BAR_FRAME).data
+        base = getattr(_W["warmup"].get(s), "data", None)
+        if base is not None:
+            # 未指定 --start 時全域暖機是最新的 K（晚於資料），接在前段之前只留早於資料起點的
+            data = np.concatenate([base[base["ts"] < ns[0]], data])
+        w = cache[lo] = {s: BarBatch(s, data, BAR_FRAME)}
+    return w
+
+def run_slice(params: dict, lo: int = 0, hi: int = None) -> dict:
+    """worker 內：以共用資料的第 [lo, hi) 列跑一次回測（暖機見 warmup_before），回傳 BacktestEngine.results()。"""
+    df = _W["df"] if lo == 0 and hi is None else _W["df"].iloc[lo:hi]
+    return run_engine(_W["mode"], {_W["symbol"]: df}, warmup_before(lo), params, **_W["engine_kw"])
+
+def _run_one(params: dict, lo: int = 0, hi: int = None) -> dict:
+    t0 = time.perf_counter()
+    res = run_slice(params, lo, hi)
+    row = {"run_id": run_id(params), **{k: params.get(k) for k in SWEEP_KEYS}}
+    row.update({k: v for k, v in res.items() if not isinstance(v, pd.DataFrame)})
+    row["seconds"] = round(time.perf_counter() - t0, 3)
+    return row
+
+def make_pool(symbol: str, df: pd.DataFrame, warmup, data_dir: Path, workers: int = 0, mode: str = "vector",
+              **engine_kw) -> ProcessPoolExecutor:
+    """資料寫成 .npy 後開 process pool；每個 worker 啟動時 memmap 一次。"""
+    save_shared(data_dir, df)
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_init_worker,
+                               initargs=(symbol, str(data_dir), warmup, mode, engine_kw))
+
+def sweep(symbol: str, df: pd.DataFrame, warmup, combos: List[dict], out_csv: Path, workers: int = 0,
+          mode: str = "vector", resume: bool = False, settings: Optional[dict] = None, **engine_kw) -> pd.DataFrame:
+    """跑完 combos（resume 時略過 out_csv 已有的 run_id），回傳完整結果表。
+    settings：sweep_settings() 的內容，寫在 out_csv 旁；resume 時與既有的不同就 ValueError。"""
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    settings = settings if settings is not None else sweep_settings(symbol, df, mode, **engine_kw)
+    meta = out_csv.with_name(out_csv.stem + ".settings.json")
+    done = set()
+    if out_csv.exists():
+        if resume:
+            prev = json.loads(meta.read_text(encoding="utf-8")) if meta.exists() else None
+            if prev != settings:
+                diff = sorted(k for k in set(settings) | set(prev or {}) if (prev or {}).get(k) != settings.get(k))
+                raise ValueError(f"{out_csv} 是以不同的資料 / 引擎設定算出的（{', '.join(diff)}），"
+                                 f"不能 --resume；請換 --out 或去掉 --resume 重跑")
+            done = set(pd.read_csv(out_csv, usecols=["run_id"], dtype=str)["run_id"])
+        else:
+            out_csv.unlink()
+    meta.write_text(json.dumps(settings, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    todo = [p for p in combos if run_id(p) not in done]
+    print(f"[SWEEP] {symbol} 共 {len(combos)} 組，已完成 {len(combos) - len(todo)}，待跑 {len(todo)}")
+    if todo:
+        workers = min(workers or os.cpu_count() or 1, len(todo))
+        t0 = time.perf_counter()
+        with make_pool(symbol, df, warmup, out_csv.parent / "data", workers, mode, **engine_kw) as ex:
+            futs = [ex.submit(_run_one, p) for p in todo]
+            for n, f in enumerate(as_completed(futs), 1):
+                row = f.result()
+                pd.DataFrame([row]).to_csv(out_csv, mode="a", header=not out_csv.exists(), index=False, encoding="utf-8-sig")
+                print(f"[SWEEP] {n}/{len(todo)} {row['run_id']} return={row['total_return']*100:.2f}% "
+                      f"trades={row['num_trades']} ({row['seconds']}s)")
+        print(f"[SWEEP] 完成 {len(todo)} 組，{time.perf_counter() - t0:.1f}s（{workers} workers）")
+    return pd.read_csv(out_csv, encoding="utf-8-sig") if out_csv.exists() else pd.DataFrame()
+
+def _num(s: str):
+    return int(s) if s.lstrip("-").isdigit() else float(s)
+
+def parse_grid(args) -> Dict[str, list]:
+    grid = {}
+    if args.grid:
+        grid.update(json.loads(Path(args.grid).read_text(encoding="utf-8") if os.path.exists(args.grid) else args.grid))
+    for k in SWEEP_KEYS:
+        v = getattr(args, k)
+        if v:
+            grid[k] = [_num(x) for x in v.split(",") if x.strip()]
+    return grid
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbol", default="MXF")
+    parser.add_argument("--limit", type=int, default=120000, help="1min 筆數上限")
+    parser.add_argument("--start", type=str, default=None)
+    parser.add_argument("--end", type=str, default=None)
+    parser.add_argument("--grid", type=str, default=None, help='JSON 字串或檔案，例：{"af":[0.02,0.03],"sl_points":[100,200]}')
+    for k in SWEEP_KEYS:
+        parser.add_argument(f"--{k.replace('_', '-')}", dest=k, type=str, default=None, help=f"{k} 候選值，逗號分隔")
+    parser.add_argument("--workers", type=int, default=0, help="process 數（預設 CPU 核心數）")
+    parser.add_argument("--engine", choices=("event", "vector"), default="vector")
+    parser.add_argument("--equity-resolution", choices=RESOLUTIONS, default="tick")
+    parser.add_argument("--out", type=str, default=None, help="結果 CSV（預設 backtest_out/sweep/<symbol>/results.csv）")
+    parser.add_argument("--resume", action="store_true", help="略過結果表中已完成的組合")
+    parser.add_argument("--sort", default="total_return", help="排序欄位")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    symbol = args.symbol.upper()
+    grid = parse_grid(args)
+    if not grid:
+        parser.error("請以 --grid 或 --af/--af-max/--sl-points/--trail-trigger/--trail-retrace 指定參數")
+    out_csv = Path(args.out) if args.out else Path("backtest_out") / "sweep" / symbol.lower() / "results.csv"
+
+    df = load_history(symbol, limit_bars=args.limit, frame=FEED_FRAME, start_ts=args.start, end_ts=args.end)
+    warmup = load_warmup([symbol], args.start)
+    settings = sweep_settings(symbol, df, args.engine, start=args.start, end=args.end, limit=args.limit,
+                              equity_resolution=args.equity_resolution)
+    try:
+        table = sweep(symbol, df, warmup, expand_grid(grid), out_csv, workers=args.workers, mode=args.engine,
+                      resume=args.resume, settings=settings, equity_resolution=args.equity_resolution)
+    except ValueError as e:
+        parser.error(str(e))
+    if table.empty:
+        return
+    print(f"=== 前 {args.top} 名（依 {args.sort}） ===")
+    print(table.sort_values(args.sort, ascending=False).head(args.top).to_string(index=False))
+    print(f"結果表：{out_csv}")
+
+if __name__ == "__main__":
+    main()
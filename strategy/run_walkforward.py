@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Walk-forward：把歷史切成 in-sample / out-of-sample 視窗（rolling 或 anchored，單位 = 交易日），
+IS 內掃參數選最佳，OOS 以該組參數回測後把各窗 OOS 權益接成一條曲線。
+- 資料只讀一次，所有視窗 × 參數組共用一個 process pool（run_sweep.make_pool，memmap 共用）
+- 各視窗彼此獨立，IS 掃描與 OOS 回測都同時丟進 pool
+- IS / OOS 都以視窗起點之前的全部 K（--start 之前的暖機 + 資料內較早的列）暖機 PSAR，回測引擎從視窗起點空手開始，
+  OOS 的交易與權益都只含視窗內進場的部位，兩者一致
+
+  python -m strategy.run_walkforward --symbol MXF --start 2024-01-01 --end 2025-07-01 \
+      --is-days 60 --oos-days 20 --af 0.01,0.02,0.03 --sl-points 100,200
+"""
+import argparse
+import time
+from concurrent.futures import as_completed
+from pathlib import Path
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+
+from strategy.config import FEED_FRAME
+from strategy.core.backtester import summarize
+from strategy.core.equity import RESOLUTIONS
+from strategy.run_backtest import load_warmup
+from strategy.run_sweep import SWEEP_KEYS, expand_grid, make_pool, parse_grid, run_id, run_slice, _run_one
+from strategy.storage.mysql import load_history
+
+START_CASH = 1_000_000.0
+
+def make_windows(ts: pd.Series, is_days: int, oos_days: int, anchored: bool = False,
+                 step_days: int = 0) -> List[Tuple[int, int, int]]:
+    """依交易日切窗，回傳 [(is_lo, oos_lo, oos_hi)]（資料列 index）；anchored 時 IS 一律從第 0 列開始。
+    step_days < oos_days 時各窗 OOS 截到下一窗的 OOS 起點，串接的 OOS 不重疊（不重複計入損益 / 時間不倒退）。"""
+    ns = pd.DatetimeIndex(ts).as_unit("ns").asi8
+    days = np.unique(ns - ns % (86400 * 1_000_000_000))
+    step = step_days or oos_days
+    out = []
+    i = 0
+    while i + is_days < len(days):
+        d_is = days[0] if anchored else days[i]
+        d_oos = days[i + is_days]
+        d_end = days[i + is_days + oos_days] if i + is_days + oos_days < len(days) else None
+        lo, mid = np.searchsorted(ns, [d_is, d_oos])
+        hi = len(ns) if d_end is None else int(np.searchsorted(ns, d_end))
+        out.append((int(lo), int(mid), hi))
+        i += step
+    return [(lo, mid, min(hi, nxt[1])) for (lo, mid, hi), nxt in zip(out, out[1:])] + out[-1:]
+
+def run_oos(params: dict, lo: int, hi: int) -> dict:
+    """worker 內：OOS 段 [lo, hi) 回測（策略以 lo 之前的 K 暖機，引擎空手起跑、視窗結束平倉）。"""
+    res = run_slice(params, lo, hi)
+    return {"base": res["start_cash"], "equity_df": res["equity_df"][["ts", "equity"]], "trades_df": res["trades_df"]}
+
+def stitch(parts: List[dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """各窗 OOS 權益改成「相對視窗起點的增減」，依序累加成一條從 START_CASH 出發的曲線。"""
+    eqs, trs, offset = [], [], START_CASH
+    for p in parts:
+        eq = p["equity_df"]
+        if len(eq):
+            eqs.append(pd.DataFrame({"ts": eq["ts"], "equity": eq["equity"].to_numpy() - p["base"] + offset}))
+            offset = float(eqs[-1]["equity"].iloc[-1])
+        if len(p["trades_df"]):
+            trs.append(p["trades_df"])
+    eq = pd.concat(eqs, ignore_index=True) if eqs else pd.DataFrame(columns=["ts", "equity"])
+    tr = pd.concat(trs, ignore_index=True) if trs else pd.DataFrame()
+    return eq, tr
+
+def walkforward(symbol: str, df: pd.DataFrame, combos: List[dict], windows: List[Tuple[int, int, int]],
+                warmup, metric: str, out_dir: Path, workers: int = 0, mode: str = "vector", **engine_kw):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rows, parts = [], {}
+    t0 = time.perf_counter()
+    with make_pool(symbol, df, warmup, out_dir / "data", workers, mode, **engine_kw) as ex:
+        # 1) 所有視窗的 IS 掃描一起丟進 pool
+        futs = {ex.submit(_run_one, p, lo, mid): w for w, (lo, mid, _) in enumerate(windows) for p in combos}
+        is_rows = []
+        for f in as_completed(futs):
+            is_rows.append({"window": futs[f], **f.result()})
+        is_tab = pd.DataFrame(is_rows).sort_values(["window", metric], ascending=[True, False])
+        is_tab.to_csv(out_dir / "in_sample.csv", index=False, encoding="utf-8-sig")
+        best = is_tab.groupby("window", sort=True).head(1).set_index("window")
+        print(f"[WF] IS 掃描完成：{len(windows)} 窗 × {len(combos)} 組，{time.perf_counter() - t0:.1f}s")
+
+        # 2) OOS：各窗以 IS 最佳參數回測，互相獨立、同時跑
+        by_id = {run_id(p): p for p in combos}
+        futs = {ex.submit(run_oos, by_id[best.loc[w, "run_id"]], mid, hi): w for w, (lo, mid, hi) in enumerate(windows)}
+        for f in as_completed(futs):
+            parts[futs[f]] = f.result()
+
+    for w, (lo, mid, hi) in enumerate(windows):
+        p, b = parts[w], best.loc[w]
+        eq = p["equity_df"]
+        oos_ret = float(eq["equity"].iloc[-1] / p["base"] - 1.0) if len(eq) else 0.0
+        rows.append({"window": w, "is_start": df["ts"].iloc[lo], "oos_start": df["ts"].iloc[mid],
+                     "oos_end": df["ts"].iloc[hi - 1], "run_id": b["run_id"],
+                     **{k: b[k] for k in SWEEP_KEYS}, f"is_{metric}": b[metric],
+                     "oos_return": oos_ret, "oos_trades": len(p["trades_df"])})
+    win_tab = pd.DataFrame(rows)
+    eq, tr = stitch([parts[w] for w in range(len(windows))])
+    res = summarize(START_CASH, eq.set_index("ts"), tr)
+    win_tab.to_csv(out_dir / "windows.csv", index=False, encoding="utf-8-sig")
+    res["equity_df"].to_csv(out_dir / "equity_oos.csv", index=False, encoding="utf-8-sig")
+    tr.to_csv(out_dir / "trades_oos.csv", index=False, encoding="utf-8-sig")
+    return win_tab, res
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbol", default="MXF")
+    parser.add_argument("--limit", type=int, default=10**9, help="1min 筆數上限")
+    parser.add_argument("--start", type=str, default=None)
+    parser.add_argument("--end", type=str, default=None)
+    parser.add_argument("--is-days", type=int, default=60, help="in-sample 交易日數")
+    parser.add_argument("--oos-days", type=int, default=20, help="out-of-sample 交易日數")
+    parser.add_argument("--step-days", type=int, default=0, help="視窗前進交易日數（預設 = oos-days；較小時各窗 OOS 截到下一窗的 OOS 起點）")
+    parser.add_argument("--anchored", action="store_true", help="IS 起點固定在資料開頭（預設 rolling）")
+    parser.add_argument("--metric", default="sharpe_daily", help="IS 選參數的指標（results 的欄位）")
+    parser.add_argument("--grid", type=str, default=None, help='JSON 字串或檔案，例：{"af":[0.02,0.03]}')
+    for k in SWEEP_KEYS:
+        parser.add_argument(f"--{k.replace('_', '-')}", dest=k, type=str, default=None, help=f"{k} 候選值，逗號分隔")
+    parser.add_argument("--workers", type=int, default=0, help="process 數（預設 CPU 核心數）")
+    parser.add_argument("--engine", choices=("event", "vector"), default="vector")
+    parser.add_argument("--equity-resolution", choices=RESOLUTIONS, default="tick")
+    parser.add_argument("--out", type=str, default=None, help="輸出目錄（預設 backtest_out/walkforward/<symbol>）")
+    args = parser.parse_args()
+
+    symbol = args.symbol.upper()
+    grid = parse_grid(args)
+    if not grid:
+        parser.error("請以 --grid 或 --af/--af-max/--sl-points/--trail-trigger/--trail-retrace 指定參數")
+    out_dir = Path(args.out) if args.out else Path("backtest_out") / "walkforward" / symbol.lower()
+
+    df = load_history(symbol, limit_bars=args.limit, frame=FEED_FRAME, start_ts=args.start, end_ts=args.end)
+    df = df.sort_values("ts", kind="stable").reset_index(drop=True)
+    windows = make_windows(df["ts"], args.is_days, args.oos_days, args.anchored, args.step_days)
+    if not windows:
+        print(f"[WF] 資料不足：需要超過 {args.is_days} 個交易日")
+        return
+    print(f"[WF] {symbol} {'anchored' if args.anchored else 'rolling'}：{len(windows)} 窗，IS {args.is_days} / OOS {args.oos_days} 交易日")
+    warmup = load_warmup([symbol], args.start)
+    win_tab, res = walkforward(symbol, df, expand_grid(grid), windows, warmup, args.metric, out_dir,
+                               workers=args.workers, mode=args.engine, equity_resolution=args.equity_resolution)
+
+    print(win_tab.to_string(index=False))
+    print("=== Walk-forward OOS 摘要 ===")
+    print(f"最終資產        : {res['end_equity']:.2f}")
+    print(f"總報酬率        : {res['total_return']*100:.2f}%")
+    print(f"夏普比率(日)    : {res['sharpe_daily']:.3f}")
+    print(f"最大回撤        : {res['max_drawdown']*100:.2f}%")
+    print(f"交易次數        : {res['num_trades']}")
+    print(f"勝率            : {res['win_rate']*100:.2f}%")
+    print(f"檔案已儲存      : {out_dir}")
+
+if __name__ == "__main__":
+    main()
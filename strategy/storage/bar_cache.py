@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Rollup cache：把聚合好的 K 棒存成 .npz，下次同 (商品, frame, 期間) 直接讀檔。
+- 時間 frame：由 1min K（load_history）rollup
+- 活動量 frame（vol:N / tick:N / range:R）：必須由原始 tick（load_ticks）聚合
+- 只快取已收完的日子（end_ts 不晚於今天 00:00）；含今天的區間，今天之前走快取、今天起每次重新聚合
+"""
+import math
+import os
+import re
+from datetime import date
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from strategy.core.barbuilder import _frame_ns, aggregate, is_activity_frame
+from strategy.core.calendar import get_calendar
+from strategy.storage.mysql import load_history, load_ticks
+
+CACHE_DIR = Path(os.getenv("BAR_CACHE_DIR", "bar_cache"))
+
+def _slug(s) -> str:
+    return re.sub(r"[^0-9A-Za-z.]+", "", str(s or "NA"))
+
+def cache_path(symbol: str, frame: str, start_ts: str | None, end_ts: str | None) -> Path:
+    return CACHE_DIR / symbol.upper() / f"{_slug(frame)}_{_slug(start_ts)}_{_slug(end_ts)}.npz"
+
+def _read(path: Path) -> pd.DataFrame:
+    with np.load(path) as z:
+        return pd.DataFrame({"ts": pd.to_datetime(z["ts"]), "o": z["o"], "h": z["h"], "l": z["l"], "c": z["c"], "v": z["v"]})
+
+def _write(path: Path, df: pd.DataFrame):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, ts=df["ts"].to_numpy("datetime64[ns]").view("i8"),
+             **{k: df[k].to_numpy() for k in ("o", "h", "l", "c", "v")})
+    os.replace(tmp, path)
+
+def build_bars(symbol: str, frame: str, start_ts: str | None = None, end_ts: str | None = None,
+               only_day: bool = True) -> pd.DataFrame:
+    """不經 cache 直接從 MySQL 聚合。"""
+    if is_activity_frame(frame):
+        t = load_ticks(symbol, start_ts=start_ts, end_ts=end_ts, only_day=only_day)
+        return aggregate(t["ts"], t["price"], t["vol"], frame)
+    m = load_history(symbol, limit_bars=10**9, frame="1min", start_ts=start_ts, end_ts=end_ts, only_day=only_day)
+    return aggregate(m["ts"], m["c"], m["v"], frame, o=m["o"], h=m["h"], l=m["l"])
+
+def load_bars(symbol: str, frame: str, start_ts: str | None = None, end_ts: str | None = None,
+              only_day: bool = True, refresh: bool = False) -> pd.DataFrame:
+    """讀 (symbol, frame, 期間) 的 K 棒；cache 命中就不碰 MySQL。"""
+    today = pd.Timestamp(date.today())
+    if end_ts is None or pd.Timestamp(end_ts) > today:
+        # 今天還沒收完：活動量 frame 的分桶依累計量、不能在午夜切開，整段不快取
+        if is_activity_frame(frame) or (start_ts is not None and pd.Timestamp(start_ts) >= today):
+            return build_bars(symbol, frame, start_ts=start_ts, end_ts=end_ts, only_day=only_day)
+        cut = f"{today:%Y-%m-%d}"
+        done = load_bars(symbol, frame, start_ts, cut, only_day, refresh)
+        live = build_bars(symbol, frame, start_ts=cut, end_ts=end_ts, only_day=only_day)
+        return pd.concat([done, live], ignore_index=True) if len(live) else done
+    path = cache_path(symbol, frame if only_day else f"{frame}_all", start_ts, end_ts)
+    if path.exists() and not refresh:
+        return _read(path)
+    df = build_bars(symbol, frame, start_ts=start_ts, end_ts=end_ts, only_day=only_day)
+    if not df.empty:
+        _write(path, df)
+    return df
+
+def load_recent(symbol: str, frame: str, bars: int, end_ts: str | None = None, only_day: bool = True) -> pd.DataFrame:
+    """
+    end_ts（None = 到現在）之前最近 bars 根 K（0 = 全部歷史），經 load_bars 快取。
+    時間 frame 依交易日曆往回推足夠的交易日當查詢下界（以日盤長度估每天根數，只會多取）；活動量 frame 不設下界。
+    """
+    start_ts = None
+    if bars and not is_activity_frame(frame):
+        cal = get_calendar()
+        s, e = cal.day_session() or (None, None)
+        per_day = 1 if s is None else max(1, ((e.hour - s.hour) * 3600 + (e.minute - s.minute) * 60) * 10**9 // _frame_ns(frame))
+        end_ns = pd.Timestamp(end_ts).value if end_ts else pd.Timestamp(date.today()).value
+        i = int(np.searchsorted(cal.days, end_ns)) - math.ceil(bars / per_day) - 1
+        if i > 0:
+            start_ts = f"{pd.Timestamp(int(cal.days[i])):%Y-%m-%d}"
+    df = load_bars(symbol, frame, start_ts=start_ts, end_ts=end_ts, only_day=only_day)
+    return df.tail(int(bars)).reset_index(drop=True) if bars else df
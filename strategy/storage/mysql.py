@@ -1,15 +1,20 @@
 # -*- coding: utf-8 -*-
+from typing import Iterator
 import pandas as pd
 from sqlalchemy import create_engine, text
 from strategy.config import MYSQL_URL
+from strategy.core.contracts import contract_spec
+from strategy.core.calendar import get_calendar
 
 def _table_from_symbol(symbol_prefix: str) -> str:
-    s = symbol_prefix.upper()
-    if s.startswith("TXF"):
-        return "ticks_TXF"
-    if s.startswith("MXF"):
-        return "ticks_MXF"
-    return f"ticks_{s}"
+    return contract_spec(symbol_prefix).table
+
+def _day_session_sql() -> str:
+    """only_day 過濾條件；時段取自交易日曆（config.SESSION 的日盤）。SESSION 沒有日盤時不能只取日盤，直接報錯。"""
+    s, e = get_calendar().day_session() or (None, None)
+    if s is None:
+        raise ValueError("config.SESSION 沒有不跨午夜的日盤時段，無法 only_day 過濾；請設定日盤或改用 only_day=False")
+    return f"TIME(`timestamp`) BETWEEN '{s:%H:%M:%S}' AND '{e:%H:%M:%S}'"
 
 def load_history(symbol_prefix: str,
                  limit_bars: int = 100_000,
@@ -31,7 +36,7 @@ def load_history(symbol_prefix: str,
         where_parts.append("`timestamp` < :end_ts")
         params["end_ts"] = end_ts
     if only_day:
-        where_parts.append("TIME(`timestamp`) BETWEEN '08:45:00' AND '13:45:00'")
+        where_parts.append(_day_session_sql())
     where_sql = ("WHERE " + " AND ".join(where_parts)) if where_parts else ""
 
     sql = text(f"""
@@ -60,6 +65,26 @@ def load_history(symbol_prefix: str,
 
     return df
 
+def iter_history(symbol_prefix: str,
+                 chunk_rows: int = 50_000,
+                 start_ts: str | None = None,
+                 end_ts: str | None = None,
+                 only_day: bool = True,
+                 limit_bars: int | None = None) -> Iterator[pd.DataFrame]:
+    """分段讀 1min K（每段 chunk_rows 根、依時間遞增）；以上一段最後一分鐘 +1min 當下一段起點。"""
+    cursor, left = start_ts, limit_bars
+    while left is None or left > 0:
+        n = chunk_rows if left is None else min(chunk_rows, left)
+        df = load_history(symbol_prefix, limit_bars=n, start_ts=cursor, end_ts=end_ts, only_day=only_day)
+        if df.empty:
+            return
+        yield df
+        if len(df) < n:
+            return
+        if left is not None:
+            left -= len(df)
+        cursor = (df["ts"].iloc[-1] + pd.Timedelta(minutes=1)).strftime("%Y-%m-%d %H:%M:%S")
+
 
 from sqlalchemy import create_engine, text  # ensure symbols available in this scope
 
@@ -68,7 +93,7 @@ def load_hourly_from_ticks(symbol_prefix: str,
                            start_ts: str | None = None,
                            end_ts: str | None = None,
                            only_day: bool = True) -> pd.DataFrame:
-    """從 ticks_* 聚合成 1H K（ts,o,h,l,c,v）。"""
+    """從 ticks_* 聚合成 1H K（ts,o,h,l,c,v）。hours：未給 start_ts 時只留最後 hours 根（0 = 全部）。"""
     table = _table_from_symbol(symbol_prefix)
     eng = create_engine(MYSQL_URL)
 
@@ -78,7 +103,7 @@ def load_hourly_from_ticks(symbol_prefix: str,
     if end_ts:
         where_parts.append("`timestamp` < :end_ts"); params["end_ts"] = end_ts
     if only_day:
-        where_parts.append("TIME(`timestamp`) BETWEEN '08:45:00' AND '13:45:00'")
+        where_parts.append(_day_session_sql())
     where_sql = ("WHERE " + " AND ".join(where_parts)) if where_parts else ""
 
     sql = text(f"""
@@ -108,7 +133,7 @@ def load_hourly_from_ticks(symbol_prefix: str,
     with eng.begin() as conn:
         df = pd.read_sql(sql, conn, params=params)
 
-    if hours and not (start_ts or end_ts):
+    if hours and not start_ts:
         df = df.tail(int(hours))
 
     if not df.empty:
@@ -117,3 +142,36 @@ def load_hourly_from_ticks(symbol_prefix: str,
             df[col] = pd.to_numeric(df[col], errors="coerce")
         df["v"] = pd.to_numeric(df["v"], errors="coerce").fillna(0).astype("int64")
     return df
+
+
+def load_ticks(symbol_prefix: str,
+               start_ts: str | None = None,
+               end_ts: str | None = None,
+               only_day: bool = True) -> pd.DataFrame:
+    """從 ticks_* 讀原始逐筆（ts, price, vol），依時間排序；price 取 close。"""
+    table = _table_from_symbol(symbol_prefix)
+    eng = create_engine(MYSQL_URL)
+
+    where_parts, params = [], {}
+    if start_ts:
+        where_parts.append("`timestamp` >= :start_ts"); params["start_ts"] = start_ts
+    if end_ts:
+        where_parts.append("`timestamp` < :end_ts"); params["end_ts"] = end_ts
+    if only_day:
+        where_parts.append(_day_session_sql())
+    where_sql = ("WHERE " + " AND ".join(where_parts)) if where_parts else ""
+
+    sql = text(f"""
+        SELECT `timestamp` AS ts, `close` AS price, `volume` AS vol
+        FROM {table}
+        {where_sql}
+        ORDER BY `timestamp` ASC
+    """)
+    with eng.begin() as conn:
+        df = pd.read_sql(sql, conn, params=params)
+
+    if not df.empty:
+        df["ts"] = pd.to_datetime(df["ts"])
+        df["price"] = pd.to_numeric(df["price"], errors="coerce")
+        df["vol"] = pd.to_numeric(df["vol"], errors="coerce").fillna(0).astype("int64")
+    return df
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+合成 TAIFEX 行情（不需要 MySQL）：benchmark、壓測與離線驗證用，同一個 seed 產生的資料逐位元相同。
+- 只在交易日曆的交易時段內產生 tick（SESSION / 休市日 / 夜盤歸屬都跟 get_calendar() 一致）
+- 價格：所有商品共用一條以秒為單位的指數路徑（日波動率逐日變動、開收盤波動較大、跨時段有跳空），
+  各商品在自己的成交時刻取樣並加上微結構雜訊，依 tick_size 取整；TXF / MXF 因此高度相關但不完全相同
+- 成交頻率：每秒 Poisson，盤中呈 U 形；結算日 13:20–13:30 另外放大（模擬結算前的爆量）
+輸出欄位與 MySQL loader 相同：synthetic_ticks → ts, price, vol（= load_ticks）；synthetic_minutes → ts,o,h,l,c,v（= load_history）。
+"""
+import zlib
+from typing import Dict, Tuple
+import numpy as np
+import pandas as pd
+
+from strategy.core.barbuilder import aggregate
+from strategy.core.calendar import get_calendar
+from strategy.core.contracts import contract_spec
+from strategy.core.events import TickBatch
+
+BASE_PRICE: Dict[str, float] = {"TXF": 22000.0, "MXF": 22000.0}
+TICK_RATE: Dict[str, float] = {"TXF": 4.0, "MXF": 6.0}   # 盤中平靜時每秒平均筆數
+LOT_MEAN: Dict[str, float] = {"TXF": 2.0, "MXF": 4.0}    # 每筆平均口數（幾何分布）
+DAILY_VOL = 0.012          # 日報酬標準差
+GAP_VOL = 0.004            # 時段之間的跳空標準差
+SETTLE_BURST = 5.0         # 結算日 13:20–13:30 成交頻率倍率
+NOISE_TICKS = 0.8          # 各商品相對共同路徑的雜訊（tick 數）
+
+_SEC = 1_000_000_000
+_MIN = 60 * _SEC
+_DAY = 1440 * _MIN
+
+def _sessions(start, days: int) -> Tuple[np.ndarray, np.ndarray]:
+    """start 起前 days 個交易日所屬的交易時段（open_ns, close_ns）。"""
+    cal = get_calendar()
+    i = int(np.searchsorted(cal.days, pd.Timestamp(start).normalize().value))
+    sel = cal.days[i:i + days]
+    m = np.isin(cal.session_day, sel)
+    return cal.open_ns[m], cal.close_ns[m]
+
+def _seconds(start, days: int):
+    """所有交易時段的逐秒格點，與每秒的時段內位置（秒）/ 時段長度 / 時段編號。"""
+    opens, closes = _sessions(start, days)
+    lens = ((closes - opens) // _SEC).astype("i8")
+    sess = np.repeat(np.arange(len(opens)), lens)
+    off = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens)
+    return opens[sess] + off * _SEC, off, lens[sess], sess
+
+def _intraday_shape(off: np.ndarray, length: np.ndarray) -> np.ndarray:
+    """U 形：開盤後、收盤前 10 分鐘左右最活躍。"""
+    return 1.0 + 2.0 * np.exp(-off / 600.0) + 1.5 * np.exp(-(length - off) / 600.0)
+
+def common_path(start="2025-07-01", days: int = 5, seed: int = 0):
+    """共同指數路徑（每秒一點，相對報酬倍數，起點 1.0）：回傳 (秒 ns, 倍數)。"""
+    rng = np.random.default_rng(seed)
+    sec, off, length, sess = _seconds(start, days)
+    if not len(sec):
+        return sec, np.zeros(0)
+    day_of = (sec - sec % _DAY) // _DAY
+    _, day_idx = np.unique(day_of, return_inverse=True)
+    day_vol = DAILY_VOL * np.exp(rng.normal(0.0, 0.3, day_idx.max() + 1))     # 波動叢聚：日波動率逐日變動
+    per_day_secs = np.bincount(day_idx)
+    shape = _intraday_shape(off, length)
+    sigma = day_vol[day_idx] / np.sqrt(per_day_secs[day_idx]) * np.sqrt(shape / shape.mean())
+    step = rng.normal(0.0, 1.0, len(sec)) * sigma
+    first = np.r_[True, sess[1:] != sess[:-1]]
+    step[first] = rng.normal(0.0, GAP_VOL, int(first.sum()))
+    step[0] = 0.0
+    return sec, np.exp(np.cumsum(step))
+
+def _symbol_rng(symbol: str, seed: int) -> np.random.Generator:
+    return np.random.default_rng([seed, zlib.crc32(symbol.upper().encode())])
+
+def synthetic_ticks(symbol: str, start="2025-07-01", days: int = 5, seed: int = 0, rate: float = None) -> pd.DataFrame:
+    """逐筆 tick（ts, price, vol），依時間排序；rate 覆寫每秒平均筆數。"""
+    root = contract_spec(symbol).root
+    sec, level = common_path(start, days, seed)
+    rng = _symbol_rng(root, seed)
+    _, off, length, _ = _seconds(start, days)
+    lam = (rate or TICK_RATE.get(root, 3.0)) * _intraday_shape(off, length)
+    tod = sec % _DAY
+    settle = get_calendar().settle_days
+    burst = np.isin(sec - tod, settle) & (tod >= (13 * 60 + 20) * _MIN) & (tod < (13 * 60 + 30) * _MIN)
+    lam[burst] *= SETTLE_BURST
+    cnt = rng.poisson(lam)
+    idx = np.repeat(np.arange(len(sec)), cnt)
+    ts = np.sort(sec[idx] + rng.integers(0, _SEC, len(idx)))
+    idx = np.searchsorted(sec, ts, side="right") - 1
+    tick = contract_spec(symbol).tick_size
+    base = BASE_PRICE.get(root, 20000.0)
+    px = base * level[idx] + rng.normal(0.0, NOISE_TICKS * tick, len(idx))
+    price = np.round(px / tick) * tick
+    vol = rng.geometric(1.0 / LOT_MEAN.get(root, 2.0), len(idx)).astype("i8")
+    return pd.DataFrame({"ts": pd.to_datetime(ts), "price": price, "vol": vol})
+
+def synthetic_minutes(symbol: str, start="2025-07-01", days: int = 5, seed: int = 0, rate: float = None) -> pd.DataFrame:
+    """1 分鐘 K（ts,o,h,l,c,v），由 synthetic_ticks 聚合。"""
+    t = synthetic_ticks(symbol, start, days, seed, rate)
+    return aggregate(t["ts"], t["price"], t["vol"], "1min")
+
+def synthetic_batch(symbol: str, start="2025-07-01", days: int = 5, seed: int = 0, rate: float = None) -> TickBatch:
+    return TickBatch.from_ticks(symbol, synthetic_ticks(symbol, start, days, seed, rate))
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+原始 tick 快取：ticks_* 依日切塊，每天一個 .npy（events.TICK_DTYPE），下次直接 memmap 讀檔。
+逐日讀取 / 回放，記憶體只到一天的 tick；當天（尚未收完）不寫快取。
+"""
+import os
+from datetime import date
+from pathlib import Path
+from typing import Iterator
+import numpy as np
+import pandas as pd
+from strategy.core.calendar import get_calendar
+from strategy.core.events import TICK_DTYPE, TickBatch
+from strategy.storage.mysql import load_ticks
+
+CACHE_DIR = Path(os.getenv("TICK_CACHE_DIR", "tick_cache"))
+_DAY = 86400 * 1_000_000_000
+
+def cache_path(symbol: str, day: pd.Timestamp, only_day: bool = True) -> Path:
+    return CACHE_DIR / symbol.upper() / f"{day:%Y%m%d}{'' if only_day else '_all'}.npy"
+
+def _fetch_day(symbol: str, day: pd.Timestamp, only_day: bool) -> np.ndarray:
+    df = load_ticks(symbol, start_ts=f"{day:%Y-%m-%d}", end_ts=f"{day + pd.Timedelta(days=1):%Y-%m-%d}", only_day=only_day)
+    return TickBatch.from_ticks(symbol, df).data
+
+def load_day(symbol: str, day: pd.Timestamp, only_day: bool = True, refresh: bool = False, use_cache: bool = True) -> np.ndarray:
+    """某一天的 tick 陣列；快取命中就不碰 MySQL。"""
+    path = cache_path(symbol, day, only_day)
+    if use_cache and path.exists() and not refresh:
+        return np.load(path, mmap_mode="r")
+    a = _fetch_day(symbol, day, only_day)
+    if use_cache and day.date() < date.today():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npy")
+        np.save(tmp, a)
+        os.replace(tmp, path)
+    return a
+
+def iter_tick_batches(symbol: str, start_ts: str, end_ts: str, only_day: bool = True,
+                      refresh: bool = False, use_cache: bool = True) -> Iterator[TickBatch]:
+    """[start_ts, end_ts) 的 tick，逐日產生 TickBatch（only_day 時只走交易日，否則含夜盤跨過的週六凌晨）。"""
+    lo, hi = pd.Timestamp(start_ts).value, pd.Timestamp(end_ts).value
+    days = np.arange(lo - lo % _DAY, hi, _DAY)
+    if only_day:
+        days = days[np.isin(days, get_calendar().days)]
+    for d in days:
+        a = load_day(symbol, pd.Timestamp(int(d)), only_day, refresh, use_cache)
+        if int(d) < lo or int(d) + _DAY > hi:
+            a = a[np.searchsorted(a["ts"], lo):np.searchsorted(a["ts"], hi)]
+        if len(a):
+            yield TickBatch(symbol, a)
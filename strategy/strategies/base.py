@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence
 from strategy.core.events import Bar, Tick, Signal
 
 class Strategy:
+    # 訂閱的 bar 週期；空 = config.BAR_FRAME。on_bar 只會收到這些 frame 的 bar（Bar.frame）
+    frames: Sequence[str] = ()
+    # 共用指標（indicators.hub.IndicatorHub）；由多策略宿主在 on_start 前指定，單獨執行時為 None
+    hub = None
     def on_start(self, symbols: List[str], warmup_bars: Dict[str, List[Bar]]) -> None: ...
     def on_bar(self, bar: Bar) -> Optional[Signal]: ...
     def on_tick(self, tick: Tick) -> Optional[Signal]: return None
     def on_stop(self) -> None: ...
+    # 快照還原補播後以券商淨部位校正策略自己記的部位（補播期間的訊號沒下單）；不記部位的策略不必實作
+    def sync_position(self, symbol: str, net: int, price: float) -> None: ...
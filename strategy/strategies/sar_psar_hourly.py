@@ -1,92 +1,60 @@
 # -*- coding: utf-8 -*-
 from typing import Dict, List, Optional
+from strategy.config import BAR_FRAME
 from strategy.strategies.base import Strategy
 from strategy.core.events import Bar, Tick, Signal
-
-class PSARState:
-    __slots__ = ("trend","sar","ep","af","prev_bar")  # trend: 1=long, -1=short
+from strategy.indicators.psar import PSAR
 
 class PSARHourly(Strategy):
     def __init__(self, qty: int = 1, af: float = 0.02, af_max: float = 0.2, **_):
         self.qty = int(qty)
         self.af0 = float(af)
         self.afmax = float(af_max)
-        self.state: Dict[str, PSARState] = {}
+        # 每商品自己的 PSAR（tick 反轉會改狀態，不放 IndicatorHub 共用）；
+        # 私有實例直接 seed / update，不走 Indicator.on_bar 的 ts 去重（暖機 bar 可能晚於回測區間）
+        self.state: Dict[str, PSAR] = {}
         self.cur_sar: Dict[str, float] = {}
 
     def _init_symbol(self, symbol: str, first_bar: Bar):
-        st = PSARState()
-        st.trend = 1 if first_bar.c >= first_bar.o else -1
-        st.ep = first_bar.h if st.trend > 0 else first_bar.l
-        st.sar = first_bar.l if st.trend > 0 else first_bar.h
-        st.af = self.af0
-        st.prev_bar = first_bar
+        st = PSAR(self.af0, self.afmax)
+        st.seed(first_bar.o, first_bar.h, first_bar.l, first_bar.c)
         self.state[symbol] = st
         self.cur_sar[symbol] = st.sar
 
-    def _update_psar(self, st: PSARState, prev_bar: Bar, bar: Bar):
-        sar_next = st.sar + st.af * (st.ep - st.sar)
-        if st.trend > 0:
-            sar_next = min(sar_next, prev_bar.l, bar.l)
-            if bar.h > st.ep:
-                st.ep = bar.h
-                st.af = min(self.afmax, st.af + self.af0)
-            flipped = bar.l <= sar_next
-            if flipped:
-                st.trend = -1
-                st.sar = st.ep
-                st.ep = bar.l
-                st.af = self.af0
-            else:
-                st.sar = sar_next
-        else:
-            sar_next = max(sar_next, prev_bar.h, bar.h)
-            if bar.l < st.ep:
-                st.ep = bar.l
-                st.af = min(self.afmax, st.af + self.af0)
-            flipped = bar.h >= sar_next
-            if flipped:
-                st.trend = 1
-                st.sar = st.ep
-                st.ep = bar.h
-                st.af = self.af0
-            else:
-                st.sar = sar_next
+    def _update_psar(self, st: PSAR, bar: Bar) -> bool:
+        trend = st.trend
+        st.update(bar.h, bar.l)
         self.cur_sar[bar.symbol] = st.sar
-        st.prev_bar = bar
-        return flipped
+        return st.trend != trend
 
     def on_start(self, symbols: List[str], warmup_bars: Dict[str, List[Bar]]) -> None:
         for s in symbols:
-            bars = warmup_bars.get(s) or []
-            if bars:
-                self._init_symbol(s, bars[-1])
+            bars = warmup_bars.get(s)
+            if bars is not None and len(bars):
+                # 整段暖機序列跑批次 kernel（狀態等同從第一根逐根 on_bar），不只取最後一根
+                st = PSAR(self.af0, self.afmax).warm(bars)
+                self.state[s] = st
+                self.cur_sar[s] = st.sar
 
     def on_bar(self, bar: Bar) -> Optional[Signal]:
+        if bar.frame and bar.frame != BAR_FRAME:
+            return None     # 多訂閱的其他 frame 不更新 PSAR（PSAR 只跑 BAR_FRAME）
         st = self.state.get(bar.symbol)
         if not st:
             self._init_symbol(bar.symbol, bar)
             return None
-        flipped = self._update_psar(st, st.prev_bar, bar)
+        flipped = self._update_psar(st, bar)
         if flipped:
             side = "BUY" if st.trend > 0 else "SELL"
             return Signal(bar.symbol, side, self.qty, "PSAR flip (bar)")
         return None
 
     def on_tick(self, tick: Tick) -> Optional[Signal]:
-        sar = self.cur_sar.get(tick.symbol)
         st = self.state.get(tick.symbol)
-        if sar is None or st is None:
+        if st is None or not st.crossed(tick.price):
             return None
-        if st.trend > 0 and tick.price <= sar:
-            st.trend = -1; st.af = self.af0; st.ep = tick.price; st.sar = sar
-            self.cur_sar[tick.symbol] = sar
-            return Signal(tick.symbol, "SELL", self.qty, "PSAR flip (tick)")
-        if st.trend < 0 and tick.price >= sar:
-            st.trend = 1; st.af = self.af0; st.ep = tick.price; st.sar = sar
-            self.cur_sar[tick.symbol] = sar
-            return Signal(tick.symbol, "BUY", self.qty, "PSAR flip (tick)")
-        return None
+        st.reverse(tick.price)
+        return Signal(tick.symbol, "BUY" if st.trend > 0 else "SELL", self.qty, "PSAR flip (tick)")
 
     def on_stop(self) -> None:
         pass
@@ -155,6 +123,13 @@ class RiskWrappedPSARHourly(Strategy):
         if sig: self._update_pos_from_signal(sig, bar.c)
         return sig
 
+    def sync_position(self, symbol, net, price):
+        """依券商淨部位校正方向；方向不同時以現價當進場價，停損 / 移動停利從現價重新起算。"""
+        side = (net > 0) - (net < 0)
+        if side == self.pos.get(symbol, 0): return
+        self.pos[symbol] = side; self.triggered[symbol] = False
+        if side: self.entry[symbol] = self.peak[symbol] = self.trough[symbol] = float(price)
+
     def on_stop(self): self.inner.on_stop()
 
 StrategyClass = RiskWrappedPSARHourly
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+回測 / 指標的一致性與回歸測試（合成行情，不需 MySQL）：
+- event 與 vector 引擎結果完全相同，交易清單固定（暖機 bar 早於或晚於回測區間都要照常更新 PSAR）
+- 串流指標與 *_batch、BarBuilder 與 aggregate()、analytics.summarize_runs 與 BacktestEngine.results() 一致
+- 回放只把策略訂閱的 frame 送進 on_bar；IndicatorHub 的 tick frame 不收只接受 bar 的指標
+執行：python -m pytest -q tests
+"""
+import hashlib
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import strategy.run_backtest as rb
+from strategy.core.analytics import summarize_runs
+from strategy.core.barbuilder import BarBuilder, aggregate
+from strategy.core.events import BarBatch, Tick
+from strategy.indicators.atr import ATR, atr_batch
+from strategy.indicators.averages import EMA, SMA, ema_batch, sma_batch
+from strategy.indicators.extremes import RollingHigh, RollingLow, rolling_high_batch, rolling_low_batch
+from strategy.indicators.hub import TICK_FRAME, IndicatorHub
+from strategy.indicators.psar import PSAR, psar_batch
+from strategy.indicators.vwap import VWAP, vwap_batch
+from strategy.storage.synthetic import synthetic_minutes
+
+SYMBOL = "TXF"
+
+def _hourly(df: pd.DataFrame) -> BarBatch:
+    return BarBatch.from_df(SYMBOL, aggregate(df.ts, df.c, df.v, "1H", df.o, df.h, df.l), "1H")
+
+def _fingerprint(trades: pd.DataFrame):
+    """(筆數, 總損益, 交易清單雜湊)：清單取方向 / 進出場時間與價格。"""
+    rows = [(r.side, str(r.entry_ts), r.entry_price, str(r.exit_ts), r.exit_price) for r in trades.itertuples()]
+    return len(rows), float(trades["pnl"].sum()), hashlib.sha1(repr(rows).encode()).hexdigest()[:12]
+
+@pytest.fixture(scope="module")
+def minutes():
+    return synthetic_minutes(SYMBOL, "2025-07-01", 10, seed=3)
+
+# 暖機序列在回測區間之前 / 之後（後者模擬 load_warmup 未限制結束時間時讀到的最新資料）
+WARMUP_CASES = {
+    "before": ("2025-06-02", (53, -6800.0, "0e6ea34551cf")),
+    "after": ("2025-08-01", (39, -101400.0, "76a0edc1d3c1")),
+}
+
+@pytest.mark.parametrize("case", sorted(WARMUP_CASES))
+def test_psar_trades_pinned(minutes, case):
+    start, expected = WARMUP_CASES[case]
+    warmup = {SYMBOL: _hourly(synthetic_minutes(SYMBOL, start, 5, seed=4 if case == "before" else 5))}
+    ev = rb.run_engine("event", {SYMBOL: minutes}, warmup, rb.STRATEGY_PARAMS)
+    vec = rb.run_engine("vector", {SYMBOL: minutes}, warmup, rb.STRATEGY_PARAMS)
+    rb.check_parity(ev, vec)
+    assert _fingerprint(ev["trades_df"]) == expected
+
+def test_psar_warm_continues_on_older_bars(minutes):
+    """策略私有的 PSAR 暖機後，之後餵的 bar 即使 ts 較早也要更新（不可被 on_bar 的 ts 去重擋掉）。"""
+    bars = _hourly(minutes)
+    late = _hourly(synthetic_minutes(SYMBOL, "2025-08-01", 2, seed=5))
+    strat = rb.load_strategy(rb.STRATEGY, rb.STRATEGY_PARAMS)
+    strat.on_start([SYMBOL], {SYMBOL: late})
+    st = strat.inner.state[SYMBOL]
+    n0 = st.n
+    for b in bars:
+        strat.on_bar(b)
+    assert st.n == n0 + len(bars)
+
+def test_replay_routes_bars_by_frame(minutes, monkeypatch):
+    """策略多訂閱 5min 時 BarBuilder 產出兩種 frame，PSAR 仍只吃 1H bar，交易與只訂 1H 相同。"""
+    ref = rb.run_engine("event", {SYMBOL: minutes}, {SYMBOL: []}, rb.STRATEGY_PARAMS)
+    made, load = [], rb.load_strategy
+    def two_frames(name, params):
+        strat = load(name, params)
+        strat.frames = ["1H", "5min"]
+        made.append(strat)
+        return strat
+    monkeypatch.setattr(rb, "load_strategy", two_frames)
+    got = rb.run_engine("event", {SYMBOL: minutes}, {SYMBOL: []}, rb.STRATEGY_PARAMS)
+    rb.check_parity(ref, got)
+    assert made[0].inner.state[SYMBOL].n == len(_hourly(minutes)) - 1
+
+def test_indicators_stream_matches_batch(minutes):
+    bars = _hourly(minutes)
+    o, h, l, c = (bars.data[k] for k in "ohlc")
+    cases = [
+        (SMA(10), sma_batch(c, 10)),
+        (EMA(10), ema_batch(c, 10)),
+        (ATR(14), atr_batch(h, l, c, 14)),
+        (RollingHigh(7), rolling_high_batch(h, 7)),
+        (RollingLow(7), rolling_low_batch(l, 7)),
+        (PSAR(0.02, 0.2), psar_batch(o, h, l, c, 0.02, 0.2)[0]),
+        (VWAP(), vwap_batch(bars.data["ts"], (h + l + c) / 3.0, bars.data["v"])),
+    ]
+    for ind, want in cases:
+        got = []
+        for i, b in enumerate(bars):
+            if i == len(bars) // 2:
+                ind = pickle.loads(pickle.dumps(ind))
+            ind.on_bar(b)
+            ind.on_bar(b)        # 同一根重複餵不重算
+            got.append(ind.value)
+        np.testing.assert_array_equal(np.array(got), want, err_msg=type(ind).__name__)
+
+def test_vwap_ticks_match_batch(minutes):
+    """VWAP 的 tick 路徑（成交價加權、跨時段歸零）與 vwap_batch 相同。"""
+    ns = pd.DatetimeIndex(minutes.ts).as_unit("ns").asi8
+    ind, got = VWAP(), []
+    for i, (t, p, v) in enumerate(zip(ns, minutes.c, minutes.v)):
+        if i == len(ns) // 2:
+            ind = pickle.loads(pickle.dumps(ind))
+        got.append(ind.on_tick(Tick(SYMBOL, int(t), p, v)))
+    np.testing.assert_array_equal(np.array(got), vwap_batch(ns, minutes.c, minutes.v))
+
+def test_hub_rejects_bar_only_on_tick_frame():
+    hub = IndicatorHub()
+    for kind in ("atr", "psar"):
+        with pytest.raises(TypeError):
+            hub.get(kind, SYMBOL, TICK_FRAME)
+    assert hub.get("vwap", SYMBOL, TICK_FRAME) is hub.get("vwap", SYMBOL, TICK_FRAME)
+    assert len(hub) == 1
+
+def test_aggregate_matches_barbuilder(minutes):
+    df = minutes
+    b = BarBuilder(frame="1H")
+    out = []
+    for r in df.itertuples():
+        for t in (Tick(SYMBOL, r.ts.value, r.o, r.v, True), Tick(SYMBOL, r.ts.value, r.c, r.v)):
+            out += b.on_tick(t)
+    out += b.pop_closed_bars(SYMBOL, pd.Timestamp("2030-01-01"))
+    stream = pd.DataFrame({k: [getattr(x, k) for x in out] for k in ("ts", "o", "h", "l", "c", "v")})
+    stream["ts"] = pd.to_datetime(stream["ts"])
+    ns = np.repeat(df.ts.values, 2)
+    price = np.column_stack([df.o, df.c]).ravel()
+    vol = np.repeat(df.v.values, 2)
+    pd.testing.assert_frame_equal(aggregate(ns, price, vol, "1H"), stream, check_dtype=False)
+
+def test_summarize_runs_matches_results(minutes):
+    runs = [rb.run_engine("vector", {SYMBOL: minutes}, {SYMBOL: []}, dict(rb.STRATEGY_PARAMS, sl_points=sl))
+            for sl in (50, 100, 200)]
+    curves = [(pd.DatetimeIndex(r["equity_df"].ts).as_unit("ns").asi8, r["equity_df"].equity.to_numpy()) for r in runs]
+    for got, r in zip(summarize_runs(1_000_000, curves, [r["trades_df"] for r in runs]), runs):
+        for k, v in got.items():
+            assert v == pytest.approx(r[k], rel=1e-9, abs=1e-9), k
+
+@pytest.mark.parametrize("resolution", ["minute", "bar", "change"])
+def test_equity_resolution_keeps_end_point(minutes, resolution):
+    """較粗的 equity 取樣只影響曲線列數，終點（end_equity / total_return）與 tick 相同。"""
+    warmup = {SYMBOL: []}
+    ref = rb.run_engine("event", {SYMBOL: minutes}, warmup, rb.STRATEGY_PARAMS)
+    ev = rb.run_engine("event", {SYMBOL: minutes}, warmup, rb.STRATEGY_PARAMS, equity_resolution=resolution)
+    vec = rb.run_engine("vector", {SYMBOL: minutes}, warmup, rb.STRATEGY_PARAMS, equity_resolution=resolution)
+    rb.check_parity(ev, vec)
+    assert len(ev["equity_df"]) <= len(ref["equity_df"])
+    assert (ev["end_equity"], ev["total_return"]) == (ref["end_equity"], ref["total_return"])
+    assert ev["equity_df"]["ts"].iloc[-1] == ref["equity_df"]["ts"].iloc[-1]